@@ -0,0 +1,50 @@
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+import streamlit as st
+
+APP_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(APP_DIR))  # pacote vialeve
+from vialeve import funnel, questionnaire, rules
+
+# Painel do funil: lê só os contadores pré-agregados (vialeve/funnel.py), então
+# carrega no mesmo tempo com um dia ou com anos de histórico.
+#   streamlit run analytics.py
+
+st.set_page_config(page_title="ViaLeve - Funil", page_icon="📊", layout="wide")
+
+LAST_STEP_NAME = {"v0.9": "Revisar & confirmar"}
+
+def step_names(version):
+    return [s.title for s in questionnaire.compile_form(version).steps] + [LAST_STEP_NAME.get(version, "Seu resultado")]
+
+def pct(v): return f"{v:.1%}" if v is not None else "—"
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load(since, until, version):
+    return funnel.report(funnel.DB_PATH, since, until, version)
+
+st.title("📊 Funil do questionário")
+c1,c2=st.columns([1,2])
+with c1: version=st.selectbox("Versão", rules.VERSIONS)
+with c2: periodo=st.date_input("Período (UTC)", value=(date.today()-timedelta(days=30), date.today()), format="DD/MM/YYYY")
+since, until = (periodo if len(periodo)==2 else (periodo[0], periodo[0]))
+
+r=load(since, until, version)
+m1,m2,m3,m4,m5=st.columns(5)
+m1.metric("Inícios", r["starts"])
+m5.metric("Retornos (e-mail já visto)", r["returning"])
+m2.metric("Resultados", sum(r["results"].values()))
+m3.metric("Conclusão", pct(r["completion_rate"]))
+m4.metric("Potencialmente elegíveis", pct(r["eligibility_ratio"]))
+
+names=step_names(version)
+# Tabela em markdown e barras de progresso: nada de dataframe/Arrow, o painel fica leve.
+st.subheader("Por etapa")
+base=max(r["starts"], 1)
+for s in r["steps"]:
+    st.progress(min(1.0, s["reached"]/base), text=f"{s['step']+1}. {names[s['step']]} — {s['reached']} chegaram")
+linhas=["| Etapa | Chegaram | Concluíram | Abandonaram | Abandono | Tempo médio (s) |", "|---|---:|---:|---:|---:|---:|"]
+linhas+=[f"| {s['step']+1}. {names[s['step']]} | {s['reached']} | {s['completed']} | {s['dropoff']} | {pct(s['dropoff_rate'])} | {s['avg_seconds'] if s['avg_seconds'] is not None else '—'} |" for s in r["steps"]]
+st.markdown("\n".join(linhas))
+st.caption(f"Contadores atualizados a cada {funnel.FLUSH_INTERVAL:g} s pelos apps; cache do painel de 30 s.")
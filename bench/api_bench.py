@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import json
+import time
+
+# Gerador de carga para vialeve.api: C conexões keep-alive, cada uma
+# enviando requisições em sequência. Ex.:
+#   python -m vialeve.api --port 8080 &
+#   python bench/api_bench.py --port 8080 -c 32 -n 20000
+
+PAYLOAD = {
+    "answers": {
+        "data_nascimento": "1988-04-12", "peso": 92, "altura": 1.68, "tem_comorbidades": "sim",
+        "gravidez": "nao", "amamentando": "nao", "insuf_renal": "normal", "insuf_hepatica": "normal",
+        "alergias_componentes": ["Não tenho alergia a esses componentes"],
+    },
+}
+
+
+async def _worker(host, port, body, n, lat):
+    reader, writer = await asyncio.open_connection(host, port)
+    req = (
+        f"POST /v1/evaluate HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+    for _ in range(n):
+        t = time.perf_counter()
+        writer.write(req)
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+        lat.append(time.perf_counter() - t)
+    writer.close()
+
+
+async def run(host, port, conns, total):
+    body = json.dumps(PAYLOAD).encode()
+    lat = []
+    t = time.perf_counter()
+    await asyncio.gather(*(_worker(host, port, body, total // conns, lat) for _ in range(conns)))
+    dt = time.perf_counter() - t
+    lat.sort()
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+    print(json.dumps({
+        "requests": len(lat), "seconds": round(dt, 3), "req_per_s": round(len(lat) / dt),
+        "p50_ms": round(pct(0.50), 3), "p99_ms": round(pct(0.99), 3),
+    }))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("-c", "--connections", type=int, default=32)
+    p.add_argument("-n", "--requests", type=int, default=20000)
+    a = p.parse_args()
+    asyncio.run(run(a.host, a.port, a.connections, a.requests))
@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+# Carga com sessões simultâneas via streamlit.testing.v1.AppTest: cada sessão
+# percorre as 6 etapas de um app com respostas sintéticas e mede o rerun de
+# cada clique. Ex.:
+#   python bench/apptest_load.py -n 64 -c 8 -o bench/results.json
+#   python bench/apptest_load.py --apps v0.9 --baseline bench/results.json   # falha se regredir
+#
+# Um processo por sessão (ProcessPool com max_tasks_per_child=1): o AppTest
+# usa um Runtime global por processo, então sessões em threads do mesmo
+# processo derrubam umas às outras. Assim CPU e pico de RSS são da sessão
+# (o RSS inclui interpretador + Streamlit, medido à parte em baseline_rss_mb).
+
+ROOT = Path(__file__).resolve().parent.parent
+APPS = {
+    "v0.9": ROOT / "app.py",
+    "v0.6": ROOT / "vialeve-v0_2-cloud" / "app.py",
+    "v0.4": ROOT / "vialeve-v0_5-cloud" / "app.py",
+}
+NEXT = ("Continuar", "Revisar", "Ver meu")
+NOMES = ("Ana", "Bruno", "Carla", "Diego", "Eva", "Felipe", "Gabi", "Hugo")
+
+
+def _rss_mb() -> float:
+    # ru_maxrss é KiB no Linux, bytes no macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _pick(rng: random.Random, options, p_first: float = 0.85):
+    # Maioria responde a primeira opção ("Não"/"nao"/"Normal") para termos elegíveis e excluídos.
+    return options[0] if rng.random() < p_first or len(options) == 1 else rng.choice(options[1:])
+
+
+def _fill(at, rng: random.Random, version: str):
+    for w in at.text_input:
+        if w.key == "w_nome":
+            w.input(f"{rng.choice(NOMES)} Teste")
+        elif w.key == "w_email":
+            w.input(f"carga{rng.randrange(10**6)}@exemplo.com")
+        elif w.key:
+            w.input("")
+    for w in at.selectbox:
+        if w.key == "w_dia":
+            w.set_value(rng.randint(1, 28))
+        elif w.key == "w_mes":
+            w.set_value(rng.randint(1, 12))
+        elif w.key == "w_ano":
+            w.set_value(rng.randint(1950, date.today().year - 10))
+        elif w.key:
+            w.set_value(_pick(rng, w.options))
+    for w in at.radio:
+        if w.key:
+            w.set_value(_pick(rng, w.options))
+    for w in at.date_input:
+        if w.key:
+            w.set_value(date(rng.randint(1950, date.today().year - 10), rng.randint(1, 12), rng.randint(1, 28)))
+    for w in at.number_input:
+        if w.key == "w_peso":
+            w.set_value(rng.randint(50, 160))
+        elif w.key == "w_altura":
+            w.set_value(round(rng.uniform(1.45, 1.95), 2))
+    # Componente "previa" (form.CLIENT_PREVIEW): o AppTest não roda o iframe, então o
+    # valor vai direto na key, no formato que o navegador mandaria com o envio.
+    d = date(rng.randint(1950, date.today().year - 10), rng.randint(1, 12), rng.randint(1, 28))
+    at.session_state[f"w_previa_{at.session_state['step']}"] = {
+        "peso": rng.randint(50, 160), "altura": round(rng.uniform(1.45, 1.95), 2),
+        "data_nascimento": [d.year, d.month, d.day] if version == "v0.4" else d.isoformat(),
+    }
+    for w in at.multiselect:
+        if w.key:
+            w.set_value(rng.sample(w.options, k=rng.choice((0, 0, 0, 1))))
+    for w in at.slider:
+        if w.key:
+            w.set_value(rng.randint(0, 10))
+
+
+def _click(at, prefix, timeout):
+    btn = next(b for b in at.button if b.label.startswith(prefix))
+    btn.click()
+    t = time.perf_counter()
+    at.run(timeout=timeout)
+    dt = time.perf_counter() - t
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return dt
+
+
+def _traced(build) -> int:
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def answers_footprint(at, version: str) -> dict:
+    # Bytes que a sessão retém para respostas + motivos: dict de textos com a lista
+    # de frases (formato antigo) contra Answers + máscara. Os textos livres são
+    # compartilhados nos dois casos, então a diferença é só a representação.
+    from vialeve import answers, rules
+
+    data = dict(at.session_state["answers"])
+    mask = at.session_state["exclusion_mask"]
+    legacy = _traced(lambda: ({k: list(v) if isinstance(v, list) else v for k, v in data.items()},
+                              rules.reasons_from_mask(mask, version)))
+    compact = _traced(lambda: (answers.Answers(data), int(mask)))
+    return {"dict": legacy, "compact": compact}
+
+
+def run_session(version: str, seed: int, timeout: float = 30.0) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    lat = {}
+    try:
+        at = AppTest.from_file(str(APPS[version]), default_timeout=timeout)
+        t = time.perf_counter()
+        at.run()
+        lat["load"] = time.perf_counter() - t
+        for step in range(5):
+            _fill(at, rng, version)
+            lat[str(step)] = _click(at, NEXT, timeout)
+            if at.session_state["step"] != step + 1:
+                raise RuntimeError(f"etapa {step} não avançou")
+        # Etapa 5: confirmar (só no v0.9), consentimentos e download.
+        lat["5"] = _click(at, "Confirmar", timeout) if any(b.label.startswith("Confirmar") for b in at.button) else 0.0
+        for c in at.checkbox:
+            c.check()
+        lat["5"] += _click(at, "Salvar consentimentos", timeout)
+        lat["5"] += _click(at, "Baixar minhas respostas", timeout)
+        status, error = at.session_state["eligibility"], None
+        footprint = answers_footprint(at, version)
+    except Exception as e:
+        status, error, footprint = None, f"{type(e).__name__}: {e}", None
+    return {
+        "version": version,
+        "seed": seed,
+        "status": status,
+        "error": error,
+        "latency_s": lat,
+        "session_s": time.perf_counter() - t0,
+        "cpu_s": time.process_time() - cpu0,
+        "peak_rss_mb": _rss_mb(),
+        "answers_bytes": footprint,
+    }
+
+
+def _stats(values):
+    if not values:
+        return {}
+    v = sorted(values)
+    q = lambda p: v[min(len(v) - 1, int(p * len(v)))]
+    return {
+        "n": len(v), "mean": sum(v) / len(v), "p50": q(0.50), "p95": q(0.95), "p99": q(0.99), "max": v[-1],
+    }
+
+
+def _baseline_rss() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", "import resource, streamlit.testing.v1; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    rss = int(out.strip())
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _footprint_stats(ok) -> dict:
+    fp = [s["answers_bytes"] for s in ok if s.get("answers_bytes")]
+    if not fp:
+        return {}
+    legacy = sum(f["dict"] for f in fp) / len(fp)
+    compact = sum(f["compact"] for f in fp) / len(fp)
+    return {"dict_mean": legacy, "compact_mean": compact, "reduction_pct": 100 * (1 - compact / legacy) if legacy else None}
+
+
+def summarize(sessions, wall_s: float) -> dict:
+    out = {}
+    for version in sorted({s["version"] for s in sessions}):
+        ss = [s for s in sessions if s["version"] == version]
+        ok = [s for s in ss if not s["error"]]
+        steps = sorted({k for s in ok for k in s["latency_s"]}, key=lambda k: (k != "load", k))
+        out[version] = {
+            "sessions": len(ss),
+            "errors": len(ss) - len(ok),
+            "eligible": sum(1 for s in ok if s["status"] == "potencialmente_elegivel"),
+            "step_latency_s": {k: _stats([s["latency_s"][k] for s in ok if k in s["latency_s"]]) for k in steps},
+            "session_s": _stats([s["session_s"] for s in ok]),
+            "sessions_per_s": len(ok) / wall_s if wall_s else None,
+            "cpu_s": _stats([s["cpu_s"] for s in ok]),
+            "peak_rss_mb": _stats([s["peak_rss_mb"] for s in ok]),
+            "answers_bytes": _footprint_stats(ok),
+        }
+    return out
+
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    # Regressão = p95 de alguma etapa (ou da sessão) acima de baseline * (1 + tolerância).
+    regressions = []
+    for version, cur in current["summary"].items():
+        base = baseline.get("summary", {}).get(version)
+        if not base:
+            continue
+        pairs = [(f"step {k}", v, base["step_latency_s"].get(k)) for k, v in cur["step_latency_s"].items()]
+        pairs.append(("session", cur["session_s"], base["session_s"]))
+        for name, c, b in pairs:
+            if c and b and c["p95"] > b["p95"] * (1 + tolerance):
+                regressions.append({"version": version, "metric": name, "p95": c["p95"], "baseline_p95": b["p95"]})
+    return regressions
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Teste de carga dos apps ViaLeve com AppTest (sessões simultâneas).")
+    p.add_argument("--apps", nargs="+", choices=sorted(APPS), default=sorted(APPS))
+    p.add_argument("-n", "--sessions", type=int, default=24, help="sessões por app")
+    p.add_argument("-c", "--concurrency", type=int, default=os.cpu_count() or 4)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("-o", "--output", default="bench/apptest_results.json")
+    p.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    p.add_argument("--tolerance", type=float, default=0.20, help="piora aceita no p95 (0.20 = 20%%)")
+    a = p.parse_args(argv)
+
+    # Submissões vão para um banco descartável, não para o do app.
+    tmp = tempfile.TemporaryDirectory(prefix="vialeve-bench-")
+    os.environ["VIALEVE_DB"] = os.path.join(tmp.name, "bench.db")
+    os.environ["VIALEVE_EVENTS_FILE"] = os.path.join(tmp.name, "events.jsonl")
+    sys.path.insert(0, str(ROOT))
+
+    jobs = [(v, a.seed * 100_000 + i) for v in a.apps for i in range(a.sessions)]
+    pool = ProcessPoolExecutor(max_workers=a.concurrency, max_tasks_per_child=1)
+    cpu0 = time.process_time()
+    ru0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    sessions = []
+    with pool:
+        futs = [pool.submit(run_session, v, seed, a.timeout) for v, seed in jobs]
+        for f in as_completed(futs):
+            sessions.append(f.result())
+    wall = time.perf_counter() - t0
+    ru1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_total = (time.process_time() - cpu0) + (ru1.ru_utime - ru0.ru_utime) + (ru1.ru_stime - ru0.ru_stime)
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "streamlit": __import__("streamlit").__version__,
+            "cpu_count": os.cpu_count(),
+            "sessions_per_app": a.sessions,
+            "concurrency": a.concurrency,
+            "seed": a.seed,
+        },
+        "wall_s": wall,
+        "cpu_total_s": cpu_total,
+        "baseline_rss_mb": _baseline_rss(),
+        "summary": summarize(sessions, wall),
+        "sessions": sorted(sessions, key=lambda s: (s["version"], s["seed"])),
+    }
+    if a.baseline:
+        with open(a.baseline, encoding="utf-8") as f:
+            result["regressions"] = compare(result, json.load(f), a.tolerance)
+
+    if a.output == "-":
+        json.dump(result, sys.stdout, indent=2)
+    else:
+        Path(a.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(a.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    for version, s in result["summary"].items():
+        step_p95 = {k: round(v["p95"] * 1000, 1) for k, v in s["step_latency_s"].items()}
+        print(f"{version}: {s['sessions']} sessões, {s['errors']} erros, {s['sessions_per_s']:.2f} sessões/s, p95 por etapa (ms) {step_p95}", file=sys.stderr)
+        fp = s["answers_bytes"]
+        if fp:
+            print(f"  respostas por sessão: {fp['dict_mean']:.0f} B (dict) -> {fp['compact_mean']:.0f} B (Answers), -{fp['reduction_pct']:.0f}%", file=sys.stderr)
+    print(f"CPU total {cpu_total:.1f}s em {wall:.1f}s de parede -> {a.output}", file=sys.stderr)
+    tmp.cleanup()
+
+    errors = sum(s["errors"] for s in result["summary"].values())
+    if result.get("regressions"):
+        for r in result["regressions"]:
+            print(f"REGRESSÃO {r['version']} {r['metric']}: p95 {r['p95']*1000:.1f}ms (base {r['baseline_p95']*1000:.1f}ms)", file=sys.stderr)
+        return 1
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
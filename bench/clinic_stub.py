@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# Stub do sistema da clínica para testar o outbox (vialeve/outbox.py) sem rede
+# externa. Recebe POST {"items": [...]}, pode atrasar e falhar de propósito, e
+# conta ids recebidos/duplicados. GET /stats devolve os contadores. Ex.:
+#   python bench/clinic_stub.py --port 9900 --fail-rate 0.3 --latency-ms 50 &
+#   VIALEVE_OUTBOX_URL=http://127.0.0.1:9900/triagens streamlit run app.py
+#   python -m vialeve.outbox --url http://127.0.0.1:9900/triagens --once
+
+STATS = {"requests": 0, "items": 0, "unique": 0, "duplicates": 0, "failed": 0, "rejected": 0, "connections": 0}
+SEEN = set()
+
+
+def _response(status, payload, close=False):
+    body = json.dumps(payload).encode()
+    head = f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    if status == 503:
+        head += "Retry-After: 0\r\n"
+    if close:
+        head += "Connection: close\r\n"
+    return head.encode() + b"\r\n" + body
+
+
+async def handle(reader, writer, args):
+    STATS["connections"] += 1
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            length = 0
+            for line in lines[1:]:
+                k, _, v = line.partition(":")
+                if k.strip().lower() == "content-length":
+                    length = int(v)
+            body = await reader.readexactly(length)
+            if method == "GET" and path == "/stats":
+                writer.write(_response(200, STATS))
+                continue
+            STATS["requests"] += 1
+            if args.latency_ms:
+                await asyncio.sleep(random.uniform(0.5, 1.5) * args.latency_ms / 1000)
+            r = random.random()
+            if r < args.reject_rate:
+                STATS["rejected"] += 1
+                writer.write(_response(422, {"error": "payload recusado"}))
+                continue
+            if r < args.reject_rate + args.fail_rate:
+                STATS["failed"] += 1
+                writer.write(_response(503, {"error": "indisponível"}))
+                continue
+            items = json.loads(body)["items"]
+            for it in items:
+                key = (it["id"], it["digest"])
+                STATS["items"] += 1
+                if key in SEEN:
+                    STATS["duplicates"] += 1
+                else:
+                    SEEN.add(key)
+                    STATS["unique"] += 1
+            close = random.random() < args.close_rate
+            writer.write(_response(200, {"accepted": len(items)}, close))
+            if close:
+                break
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9900)
+    p.add_argument("--fail-rate", type=float, default=0.0, help="fração de 503 (com Retry-After)")
+    p.add_argument("--reject-rate", type=float, default=0.0, help="fração de 422 (vai para a dead-letter)")
+    p.add_argument("--close-rate", type=float, default=0.0, help="fração de respostas com Connection: close")
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    args = p.parse_args()
+    server = await asyncio.start_server(lambda r, w: handle(r, w, args), args.host, args.port)
+    print(f"stub da clínica em http://{args.host}:{args.port} ({time.strftime('%H:%M:%S')})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,103 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from apptest_load import APPS, NEXT, _fill, _stats  # noqa: E402
+
+# Mensagens (deltas) e bytes que cada rerun manda ao navegador, por etapa, e o
+# custo do rerun da etapa final ("Revisar & confirmar", com e sem o resultado
+# e os consentimentos). Conta direto do que o script enfileirou (independe da
+# instrumentação do app, então mede também versões antigas do app.py):
+#   python bench/delta_bench.py -n 40
+#   python bench/delta_bench.py --app /tmp/app_antigo.py --version v0.9 -o /tmp/antes.json
+# No servidor, as mesmas contas saem em vialeve_deltas_total / vialeve_delta_bytes_total
+# (vialeve/deltas.py).
+
+
+def _patch():
+    from streamlit.testing.v1 import local_script_runner as lsr
+
+    seen = {"msgs": 0, "bytes": 0, "script_cpu": 0.0}
+    parse = lsr.parse_tree_from_messages
+    run_script = lsr.LocalScriptRunner._run_script
+
+    def parse_counted(msgs):
+        deltas = [m for m in msgs if m.HasField("delta")]
+        seen["msgs"], seen["bytes"] = len(deltas), sum(m.ByteSize() for m in deltas)
+        return parse(msgs)
+
+    def timed(self, rerun_data):
+        t = time.thread_time()
+        try:
+            return run_script(self, rerun_data)
+        finally:
+            seen["script_cpu"] = time.thread_time() - t
+
+    lsr.parse_tree_from_messages = parse_counted
+    lsr.LocalScriptRunner._run_script = timed
+    return seen
+
+
+def measure(app: str, version: str, n: int, seed: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    seen = _patch()
+    rng = random.Random(seed)
+    at = AppTest.from_file(app, default_timeout=timeout).run()
+    steps = {}
+    for step in range(6):
+        steps[str(step)] = {"msgs": seen["msgs"], "bytes": seen["bytes"]}
+        if step == 5:
+            break
+        _fill(at, rng, version)
+        next(b for b in at.button if b.label.startswith(NEXT)).click()
+        at.run()
+        if at.exception or at.session_state["step"] != step + 1:
+            raise RuntimeError(f"etapa {step}: {at.exception}")
+
+    def reruns() -> dict:
+        cpu, wall = [], []
+        for _ in range(n):
+            t = time.perf_counter()
+            at.run()
+            wall.append(time.perf_counter() - t)
+            cpu.append(seen["script_cpu"])
+        return {"msgs": seen["msgs"], "bytes": seen["bytes"], "script_cpu_s": _stats(cpu), "wall_s": _stats(wall)}
+
+    final = {"review": reruns()}
+    conf = [b for b in at.button if b.label.startswith("Confirmar")]
+    if conf:
+        conf[0].click()
+        at.run()
+        final["result"] = reruns()
+    return {"steps": steps, "final": final}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Deltas e bytes por rerun/etapa; custo do rerun da etapa final.")
+    p.add_argument("--version", default="v0.9", choices=list(APPS))
+    p.add_argument("--app", help="script do app (padrão: o da versão)")
+    p.add_argument("-n", type=int, default=30, help="reruns medidos na etapa final")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("-o", "--output")
+    args = p.parse_args(argv)
+
+    r = measure(args.app or str(APPS[args.version]), args.version, args.n, args.seed, args.timeout)
+    print("etapa  mensagens   bytes")
+    for step, s in r["steps"].items():
+        print(f"{step:>5s} {s['msgs']:10d} {s['bytes']:7d}")
+    for name, s in r["final"].items():
+        print(f"final/{name}: {s['msgs']} mensagens, {s['bytes']} B, script {1000 * s['script_cpu_s']['mean']:.2f} ms "
+              f"(p95 {1000 * s['script_cpu_s']['p95']:.2f}), rerun {1000 * s['wall_s']['mean']:.2f} ms")
+    if args.output:
+        Path(args.output).write_text(json.dumps(r, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ["VIALEVE_CLIENT_PREVIEW"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from apptest_load import APPS, NEXT, _stats  # noqa: E402
+
+# CPU do servidor por interação numa prévia ao vivo: rerun do script inteiro
+# (o que custaria sem fragmento) contra rerun só do fragmento da etapa
+# (form.render_step). O AppTest sempre roda o script inteiro, então aqui o
+# LocalScriptRunner é trocado por um que guarda os fragmentos entre execuções
+# e, no modo "fragment", pede o rerun com fragment_id_queue — como o navegador.
+# O cache de bytecode do script também é compartilhado (como no servidor; o
+# AppTest recompila a cada run).
+# "script" é a CPU da thread do script (o custo do rerun no servidor); "total"
+# inclui o AppTest (runner novo, thread, parse da árvore), igual nos dois modos.
+# Mede o caminho com prévia no servidor: força VIALEVE_CLIENT_PREVIEW=0 (com o
+# componente "previa" as interações nem chegam ao servidor).
+#   python bench/fragment_bench.py -n 40
+#   python bench/fragment_bench.py --cases v0.4:1 -o /tmp/fragment.json
+
+# caso -> (app, etapa, key do widget, valores alternados)
+CASES = {
+    "v0.4:0": ("v0.4", 0, "w_ano", (1960, 1985, 2009, 1999)),
+    "v0.4:1": ("v0.4", 1, "w_peso", (60, 75, 90, 120)),
+    "v0.6:1": ("v0.6", 1, "w_peso", (60, 75, 90, 120)),
+    "v0.9:3": ("v0.9", 3, "w_alergias_componentes", None),  # alterna alergia / "nenhuma"
+}
+
+
+def _patch_runner():
+    from streamlit.runtime.fragment import MemoryFragmentStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.scriptrunner import RerunData
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner, parse_tree_from_messages, require_widgets_deltas
+
+    class Runner(LocalScriptRunner):
+        storage = MemoryFragmentStorage()
+        cache = ScriptCache()
+        queue: list = []
+        script_cpu: list = []
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._fragment_storage = Runner.storage
+            self._script_cache = Runner.cache
+
+        def _run_script(self, rerun_data):
+            t = time.thread_time()
+            try:
+                return super()._run_script(rerun_data)
+            finally:
+                Runner.script_cpu.append(time.thread_time() - t)
+
+        def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+            if not Runner.queue:
+                return super().run(widget_state, query_params, timeout, page_hash)
+            self.request_rerun(RerunData(widget_states=widget_state, page_script_hash=page_hash, fragment_id_queue=list(Runner.queue)))
+            self.start()
+            require_widgets_deltas(self, timeout)
+            return parse_tree_from_messages(self.forward_msgs())
+
+    app_test.LocalScriptRunner = Runner
+    return Runner
+
+
+def _goto(at, step: int):
+    for w in at.text_input:
+        if w.key == "w_nome":
+            w.input("Ana Teste")
+        elif w.key == "w_email":
+            w.input("ana@exemplo.com")
+    for _ in range(step):
+        next(b for b in at.button if b.label.startswith(NEXT)).click()
+        at.run()
+    if at.exception or at.session_state["step"] != step:
+        raise RuntimeError(f"não chegou à etapa {step}: {at.exception}")
+
+
+def _set(at, key, values, i):
+    if values is not None:
+        w = next(w for w in (*at.number_input, *at.selectbox) if w.key == key)
+        w.set_value(values[i % len(values)])
+        return
+    w = next(w for w in at.multiselect if w.key == key)
+    w.set_value([w.options[-1]] if i % 2 else [w.options[0]])
+
+
+def run_case(runner, name: str, n: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    version, step, key, values = CASES[name]
+    out = {}
+    for mode in ("full", "fragment"):
+        runner.queue = []
+        at = AppTest.from_file(str(APPS[version]), default_timeout=timeout).run()
+        _goto(at, step)
+        if mode == "fragment":
+            runner.queue = list(runner.storage._fragments)
+            if len(runner.queue) != 1:
+                raise RuntimeError(f"{name}: esperava 1 fragmento, achei {len(runner.queue)}")
+        cpu, script = [], []
+        for i in range(n):
+            _set(at, key, values, i)
+            runner.script_cpu.clear()
+            c = time.process_time()
+            at.run()
+            cpu.append(time.process_time() - c)
+            script.append(sum(runner.script_cpu))
+            if at.exception:
+                raise RuntimeError(f"{name}/{mode}: {at.exception[0].value}")
+        out[mode] = {"script_cpu_s": _stats(script), "total_cpu_s": _stats(cpu)}
+    runner.queue = []
+    for k in ("script_cpu_s", "total_cpu_s"):
+        f, p = out["full"][k]["mean"], out["fragment"][k]["mean"]
+        out[k.replace("_s", "_reduction_pct")] = round(100 * (1 - p / f), 1) if f else None
+    return out
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="CPU por interação: rerun completo x fragmento (prévias ao vivo).")
+    p.add_argument("-n", type=int, default=30, help="interações por caso e modo")
+    p.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("-o", "--output")
+    args = p.parse_args(argv)
+
+    runner = _patch_runner()
+    results = {name: run_case(runner, name, args.n, args.timeout) for name in args.cases}
+    print(f"{'caso':8s} {'script: completo':>17s} {'fragmento':>10s} {'redução':>8s}   {'total: completo':>16s} {'fragmento':>10s}")
+    for name, r in results.items():
+        ms = {m: {k: 1000 * r[m][k]["mean"] for k in ("script_cpu_s", "total_cpu_s")} for m in ("full", "fragment")}
+        print(f"{name:8s} {ms['full']['script_cpu_s']:14.1f} ms {ms['fragment']['script_cpu_s']:7.1f} ms {r['script_cpu_reduction_pct']:7.1f}%"
+              f"   {ms['full']['total_cpu_s']:13.1f} ms {ms['fragment']['total_cpu_s']:7.1f} ms")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
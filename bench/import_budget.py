@@ -0,0 +1,106 @@
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Orçamento de startup do núcleo vialeve (python -X importtime). Cada módulo é
+# importado num interpretador novo, R vezes; vale o menor tempo cumulativo
+# (µs do próprio módulo + dependências ainda não carregadas pelo site). Sai com
+# código 1 se algum módulo passar do orçamento ou puxar um import proibido
+# (Streamlit em qualquer um deles; numpy fora do lote). O pacote é compilado
+# para .pyc antes (como num deploy), senão o tempo medido inclui compile(). Ex.:
+#   python bench/import_budget.py
+#   python bench/import_budget.py --scale 2 -o /tmp/import_budget.json
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# módulo -> orçamento em ms
+BUDGETS = {
+    "vialeve.rules": 10,
+    "vialeve.answers": 12,
+    "vialeve.questionnaire": 12,
+    "vialeve.flow": 5,
+    "vialeve.metrics": 10,
+    "vialeve.emails": 10,
+    "vialeve.store": 30,
+    "vialeve.session": 30,
+    "vialeve.funnel": 30,
+    "vialeve.eventlog": 15,
+    "vialeve.summary": 30,
+    "vialeve.export": 40,
+    "vialeve.api": 80,
+    "vialeve.batch": 250,
+}
+FORBIDDEN = ("streamlit", "altair", "pandas", "pyarrow", "tornado")
+FORBIDDEN_EXCEPT = {"numpy": ("vialeve.batch",)}
+
+
+def measure(module: str) -> dict:
+    """Um import em processo novo: tempo cumulativo do módulo e lista de imports."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (str(ROOT), os.environ.get("PYTHONPATH"))))}
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    ).stderr
+    cumulative, names = None, []
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|")
+        try:
+            us = int(cum)
+        except ValueError:  # cabeçalho
+            continue
+        name = name.strip()
+        names.append(name)
+        if name == module:
+            cumulative = us
+    return {"ms": (cumulative or 0) / 1000, "imports": names}
+
+
+def check(modules, repeat: int, scale: float) -> dict:
+    report = {}
+    for m in modules:
+        runs = [measure(m) for _ in range(repeat)]
+        best = min(r["ms"] for r in runs)
+        imported = set(runs[0]["imports"])
+        bad = sorted(
+            n for n in imported
+            if n.split(".")[0] in FORBIDDEN
+            or (n.split(".")[0] in FORBIDDEN_EXCEPT and m not in FORBIDDEN_EXCEPT[n.split(".")[0]])
+        )
+        budget = BUDGETS.get(m, 50) * scale
+        report[m] = {
+            "ms": round(best, 2), "budget_ms": budget, "modules": len(imported),
+            "forbidden": sorted({n.split(".")[0] for n in bad}), "ok": best <= budget and not bad,
+        }
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("modules", nargs="*", default=list(BUDGETS))
+    p.add_argument("-r", "--repeat", type=int, default=5)
+    p.add_argument("--scale", type=float, default=1.0, help="multiplica os orçamentos (máquinas lentas/CI)")
+    p.add_argument("-o", "--output")
+    p.add_argument("--no-compile", action="store_true", help="não gera .pyc antes de medir")
+    a = p.parse_args()
+
+    if not a.no_compile:
+        compileall.compile_dir(str(ROOT / "vialeve"), quiet=1)
+
+    report = check(a.modules, a.repeat, a.scale)
+    for m, r in report.items():
+        flag = "ok " if r["ok"] else "FALHOU"
+        extra = f"  proibidos: {', '.join(r['forbidden'])}" if r["forbidden"] else ""
+        print(f"{flag:6} {m:24} {r['ms']:8.2f} ms  (orçamento {r['budget_ms']:g} ms, {r['modules']} módulos){extra}")
+    if a.output:
+        Path(a.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    sys.exit(0 if all(r["ok"] for r in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Bancos, trilha de eventos e arquivos gerados vão para um diretório descartável,
+# antes de qualquer import de vialeve (os caminhos padrão são lidos no import).
+_TMP = tempfile.mkdtemp(prefix="vialeve-tests-")
+os.environ.setdefault("VIALEVE_DB", os.path.join(_TMP, "submissions.db"))
+os.environ.setdefault("VIALEVE_EVENTS_FILE", os.path.join(_TMP, "events.jsonl"))
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest  # noqa: E402
+
+APPS = {
+    "v0.9": ROOT / "app.py",
+    "v0.6": ROOT / "vialeve-v0_2-cloud" / "app.py",
+    "v0.4": ROOT / "vialeve-v0_5-cloud" / "app.py",
+}
+
+
+@pytest.fixture
+def app_path():
+    return lambda version: str(APPS[version])
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+from vialeve import api
+
+ANSWERS = {
+    "data_nascimento": "1988-04-12", "peso": 92, "altura": 1.68, "tem_comorbidades": "sim",
+    "gravidez": "nao", "amamentando": "nao", "insuf_renal": "normal", "insuf_hepatica": "normal",
+}
+
+
+def _request(method, path, body=b"", close=False):
+    head = f"{method} {path} HTTP/1.1\r\nHost: teste\r\nContent-Length: {len(body)}\r\n"
+    return (head + ("Connection: close\r\n" if close else "") + "\r\n").encode() + body
+
+
+async def _read(reader):
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    hdrs = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in head[1:] if line)}
+    body = await reader.readexactly(int(hdrs["content-length"]))
+    return int(head[0].split(" ")[1]), hdrs, json.loads(body)
+
+
+def _exchange(*requests):
+    """Sobe a API numa porta livre e manda as requisições em sequência na mesma conexão."""
+    async def go():
+        server = await api.start("127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            out = []
+            for req in requests:
+                writer.write(req)
+                out.append(await _read(reader))
+            closed = await reader.read() == b"" if out and out[-1][1]["connection"] == "close" else None
+            writer.close()
+            return out, closed
+
+    return asyncio.run(asyncio.wait_for(go(), 10))
+
+
+def _post(path, payload):
+    return _request("POST", path, json.dumps(payload).encode())
+
+
+def test_evaluate_matches_score_over_keep_alive():
+    (r1, r2), _ = _exchange(_post("/v1/evaluate", {"answers": ANSWERS}), _post("/v1/evaluate", {"answers": ANSWERS, "version": "v0.4"}))
+    assert r1[0] == 200 and r1[1]["connection"] == "keep-alive"
+    assert r1[2] == api.score(ANSWERS, "v0.9")
+    assert r2[2]["version"] == "v0.4"
+
+
+def test_batch_keeps_item_order():
+    items = [ANSWERS, {**ANSWERS, "gravidez": "sim"}, {}]
+    [(status, _, body)], _ = _exchange(_post("/v1/evaluate/batch", {"items": items}))
+    assert status == 200
+    assert body["results"] == [api.score(a, "v0.9") for a in items]
+    assert body["results"][1]["status"] == "excluido"
+
+
+def test_validation_errors_are_400_per_field():
+    (single, batch, version), _ = _exchange(
+        _post("/v1/evaluate", {"answers": {**ANSWERS, "peso": "noventa", "gravidez": "talvez"}}),
+        _post("/v1/evaluate/batch", {"items": [ANSWERS, {"altura": 3}]}),
+        _post("/v1/evaluate", {"answers": ANSWERS, "version": "v9"}),
+    )
+    assert single[0] == 400 and set(single[2]["fields"]) == {"peso", "gravidez"}
+    assert batch[0] == 400 and list(batch[2]["items"]) == ["1"]
+    assert version[0] == 400
+
+
+def test_deeply_nested_json_is_400_and_keeps_the_connection():
+    deep = b"[" * 100_000 + b"]" * 100_000
+    (bad, ok), _ = _exchange(_request("POST", "/v1/evaluate", deep), _request("GET", "/healthz"))
+    assert bad[0] == 400 and bad[1]["connection"] == "keep-alive"
+    assert ok[0] == 200
+
+
+def test_unexpected_error_is_500_and_closes(monkeypatch):
+    def boom(*args):
+        raise RuntimeError("falha")
+
+    monkeypatch.setattr(api, "handle", boom)
+    [(status, hdrs, body)], closed = _exchange(_request("GET", "/healthz"))
+    assert status == 500 and hdrs["connection"] == "close" and closed
+    assert body == {"error": "erro interno"}
+
+
+def test_healthz_and_unknown_routes():
+    (health, missing, method), _ = _exchange(_request("GET", "/healthz"), _request("GET", "/nada"), _request("GET", "/v1/evaluate"))
+    assert health[0] == 200 and health[2]["ok"] is True and health[2]["versions"] == list(api.rules.VERSIONS)
+    assert (missing[0], method[0]) == (404, 405)
+
+
+@pytest.mark.parametrize("close", [True, False])
+def test_connection_close_is_honored(close):
+    [(status, hdrs, _)], closed = _exchange(_request("GET", "/healthz", close=close))
+    assert status == 200 and hdrs["connection"] == ("close" if close else "keep-alive")
+    assert closed is (True if close else None)
@@ -0,0 +1,104 @@
+import ast
+
+import pytest
+
+from conftest import APPS
+from vialeve import store
+
+CONSENTS = ("aceite_termo", "autoriza_teleconsulta", "lgpd", "veracidade")
+
+NEXT = ("Continuar", "Revisar", "Ver meu")
+
+
+def _unused_imports(path) -> set:
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    imported = {(a.asname or a.name).split(".")[0] for n in ast.walk(tree) if isinstance(n, (ast.Import, ast.ImportFrom)) for a in n.names}
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+    return imported - used
+
+
+@pytest.mark.parametrize("version", list(APPS))
+def test_no_unused_imports(version):
+    assert _unused_imports(APPS[version]) == set()
+
+
+def test_age_comes_from_rules_only():
+    defs = {n.name for n in ast.walk(ast.parse(APPS["v0.9"].read_text(encoding="utf-8"))) if isinstance(n, ast.FunctionDef)}
+    assert "calc_idade" not in defs
+
+
+def _finish(version, app_path):
+    if version != "v0.9":  # componente "previa" no v0.4/v0.6
+        pytest.importorskip("pyarrow", exc_type=ImportError)
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path(version), default_timeout=30).run()
+    at.text_input[0].input("Maria Silva")
+    at.text_input[1].input("maria@exemplo.com")
+    while [b for b in at.button if b.label.startswith(NEXT)]:
+        next(b for b in at.button if b.label.startswith(NEXT)).click().run()
+        assert not at.exception, at.exception
+    for b in at.button:
+        if b.label.startswith("Confirmar"):
+            b.click().run()
+    assert not at.exception, at.exception
+    return at
+
+
+def _click(at, label):
+    next(b for b in at.button if b.label.startswith(label)).click().run()
+    assert not at.exception, at.exception
+
+
+@pytest.mark.parametrize("version", list(APPS))
+def test_full_flow(version, app_path):
+    at = _finish(version, app_path)
+    assert at.session_state["step"] == 5
+    assert at.session_state["eligibility"] in ("potencialmente_elegivel", "excluido")
+
+
+@pytest.mark.parametrize("version", list(APPS))
+def test_consents_update_the_saved_submission(version, app_path):
+    at = _finish(version, app_path)
+    flow_id = at.session_state["flow_id"]
+    assert "lgpd" not in store.get_store().get(flow_id)["answers"]
+
+    for k in CONSENTS:
+        at.checkbox(key=f"w_{k}").check()
+    _click(at, "Salvar consentimentos")
+    assert at.session_state["consent_ok"] is True
+    row = store.get_store().get(flow_id)
+    assert all(row["answers"][k] is True for k in CONSENTS)
+    assert row["status"] == at.session_state["eligibility"]
+
+    _click(at, "Salvar consentimentos")  # mesmo conteúdo: o upsert não regrava
+    assert store.get_store().get(flow_id)["updated_at"] == row["updated_at"]
+
+
+@pytest.mark.parametrize("version", list(APPS))
+def test_confirmation_is_logged_once(version, app_path, monkeypatch):
+    from vialeve import eventlog
+
+    events = []
+    monkeypatch.setattr(eventlog, "log", lambda event, **fields: events.append((event, fields)))
+    at = _finish(version, app_path)
+    finish = [f for e, f in events if e == "finish"]
+    assert len(finish) == 1
+    assert finish[0]["flow_id"] == at.session_state["flow_id"] and finish[0]["version"] == version
+    assert finish[0]["to"] == 5
+
+
+@pytest.mark.parametrize("version", list(APPS))
+def test_repeated_confirmation_counts_rule_hits_once(version, app_path):
+    from vialeve import rules
+
+    before = rules.rule_hits()["_avaliacoes"]
+    at = _finish(version, app_path)
+    assert rules.rule_hits()["_avaliacoes"] == before + 1
+    if version == "v0.9":
+        _click(at, "Confirmar")  # segundo clique na revisão
+    else:
+        _click(at, "⬅️ Voltar")
+        _click(at, "Ver meu")  # reenvia a última etapa sem mudar nada
+    assert at.session_state["step"] == 5
+    assert rules.rule_hits()["_avaliacoes"] == before + 1
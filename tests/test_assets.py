@@ -0,0 +1,30 @@
+import base64
+
+from conftest import ROOT
+from vialeve import assets
+
+
+def test_header_inlines_css_and_logo_as_data_uri(tmp_path):
+    html = assets.header_html(ROOT)
+    assert html.startswith("<style>") and "app/static" not in html
+    uri = html.split("src='", 1)[1].split("'", 1)[0]
+    prefix = "data:image/svg+xml;base64,"
+    assert uri.startswith(prefix)
+    assert base64.b64decode(uri[len(prefix):]).decode("utf-8") == assets.load(ROOT / "assets" / "logo_horizontal.svg")[0]
+    assert not (ROOT / "static").exists()
+
+
+def test_streamlit_static_whitelist_untouched(app_path):
+    from streamlit.testing.v1 import AppTest
+    from streamlit.web.server import app_static_file_handler as h
+
+    before = h.SAFE_APP_STATIC_FILE_EXTENSIONS
+    AppTest.from_file(app_path("v0.9"), default_timeout=30).run()
+    assert h.SAFE_APP_STATIC_FILE_EXTENSIONS == before
+    assert ".svg" not in before and ".css" not in before
+
+
+def test_header_without_logo_is_style_only(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "app.css").write_text("a { color : red ; }")
+    assert assets.header_html(tmp_path) == "<style>a{color:red}</style>"
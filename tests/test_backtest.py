@@ -0,0 +1,65 @@
+import json
+from datetime import date
+
+import pytest
+
+from vialeve import backtest, rules, store
+
+HOJE = date(2026, 3, 1)
+BASE = {
+    "data_nascimento": "1980-05-10", "peso": 90, "altura": 1.70, "tem_comorbidades": "sim",
+    "alergias_componentes": [rules.NENHUMA_ALERGIA],
+    **{f: "nao" for f in rules.SIM_FIELDS}, **{f: "normal" for f in rules.GRAU_FIELDS},
+}
+BIT = {code: 1 << i for i, code in enumerate(rules.REASON_CODES)}
+
+
+@pytest.fixture
+def db(tmp_path):
+    # (respostas, máscara gravada): a gravada pode ter saído de regras antigas
+    rows = {
+        "igual-elegivel": (BASE, 0),
+        "igual-excluido": ({**BASE, "data_nascimento": "2012-01-01"}, BIT["menor_18"]),
+        "passa-excluido": ({**BASE, "gravidez": "sim"}, 0),
+        "passa-elegivel": (BASE, BIT["gravidez"]),
+        "troca-motivo": ({**BASE, "insuf_renal": "grave"}, BIT["gravidez"]),
+    }
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path)
+    for sid, (a, mask) in rows.items():
+        s.submit(sid, a, rules.status_from_mask(mask), mask, "v0.9")
+    s.close()
+    return path
+
+
+def test_stored_against_recomputed(db):
+    r = backtest.backtest(db, [backtest.STORED, "v0.9"], workers=1, hoje=HOJE)
+    assert r["records"] == 5
+    assert r["versions"][backtest.STORED] == {rules.STATUS_EXCLUIDO: 3, rules.STATUS_ELEGIVEL: 2, "reasons": {"menor_18": 1, "gravidez": 2}}
+    assert r["versions"]["v0.9"][rules.STATUS_EXCLUIDO] == 3
+
+    p = r["pairs"]["stored->v0.9"]
+    assert p["flips"] == {backtest.FLIP_TO_ELEGIVEL: 1, backtest.FLIP_TO_EXCLUIDO: 1}
+    assert p["samples"] == {backtest.FLIP_TO_ELEGIVEL: ["passa-elegivel"], backtest.FLIP_TO_EXCLUIDO: ["passa-excluido"]}
+    assert p["by_reason"] == {backtest.FLIP_TO_ELEGIVEL: {"gravidez": 1}, backtest.FLIP_TO_EXCLUIDO: {"gravidez": 1}}
+    assert p["reasons_changed_still_excluded"] == 1
+    assert p["reasons_added"] == {"gravidez": 1, "insuf_renal": 1}
+    assert p["reasons_removed"] == {"gravidez": 2}
+
+
+def test_parallel_chunks_match_a_single_pass(db):
+    one = backtest.backtest(db, ["v0.9", "v0.4", backtest.STORED], workers=1, hoje=HOJE)
+    many = backtest.backtest(db, ["v0.9", "v0.4", backtest.STORED], workers=2, chunk=2, hoje=HOJE)
+    assert many["meta"]["chunks"] == 3
+    for r in (one, many):
+        r.pop("meta")
+    assert many == one
+
+
+def test_cli_writes_the_report(db, tmp_path, capsys):
+    out = tmp_path / "diff.json"
+    assert backtest.main(["--db", db, "--versions", "stored", "v0.9", "-w", "1", "--hoje", "2026-03-01", "-o", str(out)]) == 0
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["pairs"]["stored->v0.9"]["flips"][backtest.FLIP_TO_EXCLUIDO] == 1
+    assert "1 passam a elegível, 1 passam a excluído" in capsys.readouterr().err
+    assert backtest.main(["--db", db, "--versions", "v9"]) == 2
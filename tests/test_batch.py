@@ -0,0 +1,102 @@
+import math
+import random
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from vialeve import batch, rules
+
+HOJE = date(2026, 3, 1)
+MISSING = object()  # chave ausente no dict
+
+
+def _dob(rng):
+    d = date(rng.randint(1940, 2020), rng.randint(1, 12), rng.randint(1, 28))
+    return rng.choice((d.isoformat(), d.isoformat(), d, datetime(d.year, d.month, d.day, 12), "", None, math.nan, "2001-13-01", MISSING))
+
+
+def _record(rng, version):
+    a = {
+        "data_nascimento": _dob(rng),
+        "idade": rng.choice((rng.randint(10, 90), None, math.nan, MISSING, MISSING)),
+        "peso": rng.choice((rng.randint(30, 200), round(rng.uniform(30, 200), 1), "92.5", 0, "", None, math.nan, MISSING)),
+        "altura": rng.choice((round(rng.uniform(1.3, 2.2), 2), round(rng.uniform(1.3, 2.2), 2), 0, None, math.nan, MISSING)),
+        "tem_comorbidades": rng.choice(("sim", "nao", "nao", None, MISSING)),
+        "alergias_componentes": rng.choice((
+            [], [rules.NENHUMA_ALERGIA], rng.sample(rules.EXCIPIENTES[version], k=2), None, MISSING,
+        )),
+    }
+    for f in rules.SIM_FIELDS:  # quase sempre "nao": senão quase todo mundo sai excluído
+        a[f] = rng.choice(("nao",) * 12 + ("sim", None, MISSING))
+    for f in rules.GRAU_FIELDS:
+        a[f] = rng.choice(("normal",) * 8 + ("leve", "moderada", "grave", "desconhecido", None, MISSING))
+    return {k: v for k, v in a.items() if v is not MISSING}
+
+
+def _cohort(version, n=600):
+    rng = random.Random(f"batch-{version}")
+    return [_record(rng, version) for _ in range(n)]
+
+
+def _expected(records, version):
+    evs = [rules.evaluate(a, version, hoje=HOJE) for a in records]
+    return [e.status for e in evs], [e.mask for e in evs]
+
+
+def _raw_columns(records):
+    keys = {k for a in records for k in a}
+    return {k: [a.get(k) for a in records] for k in keys}
+
+
+def _dt64(v):
+    try:
+        if isinstance(v, str):
+            v = date.fromisoformat(v)
+        if isinstance(v, datetime):
+            v = v.date()
+        return np.datetime64(v, "D") if isinstance(v, date) else np.datetime64("NaT")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _num(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _typed_columns(records):
+    # Colunas como viriam de um DataFrame: datetime64 com NaT, float64 com NaN.
+    cols = _raw_columns(records)
+    cols["data_nascimento"] = np.array([_dt64(v) for v in cols["data_nascimento"]], dtype="datetime64[D]")
+    for k in ("idade", "peso", "altura"):
+        cols[k] = np.array([_num(v) for v in cols[k]], dtype=np.float64)
+    return cols
+
+
+@pytest.mark.parametrize("version", rules.VERSIONS)
+@pytest.mark.parametrize("shape", ["records", "raw_columns", "typed_columns"])
+def test_batch_matches_scalar_evaluation(version, shape):
+    records = _cohort(version)
+    data = {"records": list, "raw_columns": _raw_columns, "typed_columns": _typed_columns}[shape](records)
+    status, masks = batch.evaluate_rules_batch(data, version, hoje=HOJE)
+
+    exp_status, exp_masks = _expected(records, version)
+    bad = [i for i, (s, m) in enumerate(zip(status.tolist(), masks.tolist())) if (s, m) != (exp_status[i], exp_masks[i])]
+    assert not bad, [(records[i], status[i], masks[i], exp_status[i], exp_masks[i]) for i in bad[:3]]
+    assert len(set(exp_status)) == 2 and 0 < sum(exp_masks) and len({m for m in exp_masks}) > 10  # coorte variada
+
+
+@pytest.mark.parametrize("version", rules.VERSIONS)
+def test_columns_from_records_matches_exclusion_mask(version):
+    records = _cohort(version, 200)
+    status, masks = batch.evaluate_rules_batch(batch.columns_from_records(records), version)
+    assert masks.tolist() == [rules.exclusion_mask(a, version) for a in records]
+    assert batch.explain_batch(masks, version) == [rules.reasons_from_mask(m, version) for m in masks.tolist()]
+
+
+def test_empty_cohort():
+    status, masks = batch.evaluate_rules_batch([], "v0.9")
+    assert status.shape == masks.shape == (0,)
@@ -0,0 +1,50 @@
+import pytest
+
+from vialeve import deltas
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(deltas, "ENABLED", True)
+    deltas.reset()
+    yield
+    deltas.reset()
+
+
+def test_hook_counts_messages_of_a_real_rerun(enabled, app_path):
+    # Falha se o Streamlit mudar ScriptRunContext._enqueue e o gancho parar de contar.
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path("v0.9"), default_timeout=30).run()
+    assert not at.exception
+    s = deltas.stats()[("full", "0", "v0.9")]
+    assert s["reruns"] == 1
+    assert s["msgs"] >= 5 and s["bytes"] > 0
+
+
+class _Ctx:
+    __slots__ = ()
+
+
+class _Frozen:
+    __slots__ = ("_enqueue",)
+
+    def __init__(self):
+        self._enqueue = print
+
+
+class _ReadOnly:
+    _enqueue = property(lambda self: print)
+
+
+@pytest.mark.parametrize("ctx", [_Ctx(), _Frozen(), _ReadOnly()], ids=["sem _enqueue", "com slots", "só leitura"])
+def test_begin_falls_back_without_the_hook(enabled, monkeypatch, ctx):
+    from streamlit.runtime import scriptrunner
+
+    monkeypatch.setattr(scriptrunner, "get_script_run_ctx", lambda: ctx)
+    c = deltas.begin("v0.9", 0)
+    assert c is None
+    assert deltas.end(c) is None
+    assert deltas.stats() == {}
+    assert getattr(ctx, "_enqueue", print) is print  # nada foi trocado
+    assert not hasattr(ctx, "_vialeve_deltas")
@@ -0,0 +1,39 @@
+import pytest
+
+from vialeve import emails, store
+
+
+@pytest.mark.parametrize("email, expected", [
+    ("Fulana.Silva+clinica@Gmail.com", "fulanasilva@gmail.com"),
+    ("fulana+x@googlemail.com", "fulana@gmail.com"),
+    ("fulana+x@outlook.com", "fulana@outlook.com"),
+    ("fulana+financeiro@exemplo.com.br", "fulana+financeiro@exemplo.com.br"),
+    ("f.silva@exemplo.com", "f.silva@exemplo.com"),
+    ("+x@exemplo.com", "+x@exemplo.com"),
+    ("+x@gmail.com", None),
+])
+def test_plus_tag_folded_only_for_known_providers(email, expected):
+    assert emails.normalize_email(email) == expected
+
+
+def test_plus_addresses_on_other_domains_are_distinct_keys():
+    assert emails.email_key("ana+1@exemplo.com") != emails.email_key("ana@exemplo.com")
+    assert emails.email_key("ana+1@gmail.com") == emails.email_key("ana@gmail.com")
+
+
+def test_bloom_refresh_picks_up_updated_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "sub.db")
+    mine, other = store.SubmissionStore(path), store.SubmissionStore(path)  # duas réplicas
+    try:
+        mine.submit("flow-1", {"email": "antes@exemplo.com"}, "excluido", 1, "v0.9")
+        mine._load_bloom()
+        assert not mine.seen_email("depois@exemplo.com")
+
+        # a outra réplica edita a mesma submissão (UPSERT: mesma linha, mesmo rowid, outro e-mail)
+        other.submit("flow-1", {"email": "depois@exemplo.com"}, "excluido", 1, "v0.9")
+        monkeypatch.setattr(store, "BLOOM_REFRESH", 0.0)
+        assert mine.seen_email("depois@exemplo.com")
+        assert emails.email_key("depois@exemplo.com") in mine._bloom
+    finally:
+        mine.close()
+        other.close()
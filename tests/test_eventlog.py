@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from vialeve import eventlog
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.fixture
+def make(tmp_path):
+    logs = []
+
+    def make(**kw):
+        el = eventlog.EventLog(str(tmp_path / "events.jsonl"), **{"interval": 0.01, **kw})
+        logs.append(el)
+        return el
+
+    yield make
+    for el in logs:
+        el.close()
+
+
+def test_events_are_batched_into_one_write(make, tmp_path, monkeypatch):
+    writes = []
+    el = make()
+    el._stop.set()  # sem a thread: o _run abaixo esvazia a fila como no close()
+    el._thread.join()
+    write = el._write
+    monkeypatch.setattr(el, "_write", lambda batch: (writes.append(len(batch)), write(batch)))
+    for i in range(100):
+        el.log("next", {"flow_id": "f1", "version": "v0.9", "from": i, "to": i + 1})
+    el._run()
+    assert writes == [100]
+    rows = _lines(tmp_path / "events.jsonl")
+    assert [r["from"] for r in rows] == list(range(100))
+    assert rows[0]["event"] == "next" and rows[0]["ts"].endswith("Z") and el.written == 100
+
+
+def test_rotates_by_size_and_keeps_backups(make, tmp_path):
+    el = make(max_bytes=300, backups=2)
+    for i in range(40):
+        el.log("enter", {"flow_id": f"f{i:02d}", "version": "v0.9", "step": 1})
+        el._write(el._drain([]))  # um lote por evento
+    base = tmp_path / "events.jsonl"
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["events.jsonl", "events.jsonl.1", "events.jsonl.2"]
+    assert all(p.stat().st_size <= 300 for p in tmp_path.iterdir())
+    newest = [r["flow_id"] for p in (base.with_name("events.jsonl.2"), base.with_name("events.jsonl.1"), base) for r in _lines(p)]
+    assert newest == sorted(newest) and newest[-1] == "f39"  # .2 mais antigo, depois .1, depois o atual
+    assert el.rotations > 2 and el.written == 40
+
+
+def test_full_queue_drops_and_counts(make):
+    el = make(capacity=3)
+    el._stop.set()
+    el._thread.join()  # ninguém esvazia a fila
+    for i in range(10):
+        el.log("next", {"step": i})
+    assert el.dropped == 7 and el._q.qsize() == 3
+    assert "vialeve_events_dropped_total 7" in el.metric_lines()
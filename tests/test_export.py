@@ -0,0 +1,60 @@
+import csv
+
+import pytest
+
+from vialeve import export, store
+
+STAMPS = ("2026-03-01T09:59:59.999+00:00", "2026-03-01T10:00:00.000+00:00", "2026-03-01T23:59:59.999+00:00")
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path)
+    for i, _ in enumerate(STAMPS):
+        s.submit(f"flow-{i}", {"nome": f"P{i}"}, "potencialmente_elegivel", 0, "v0.9")
+    s.close()
+    conn = store.connect(path)
+    conn.executemany("UPDATE submissions SET created_at = ? WHERE id = ?", [(t, f"flow-{i}") for i, t in enumerate(STAMPS)])
+    conn.close()
+    return path
+
+
+def _ids(db, **kw):
+    return [r["id"] for r in export.iter_submissions(db, **kw)]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-03-01", "2026-03-01T00:00:00.000+00:00"),
+    ("2026-03-01T10:00", "2026-03-01T10:00:00.000+00:00"),
+    ("2026-03-01T10:00:00Z", "2026-03-01T10:00:00.000+00:00"),
+    ("2026-03-01T07:00:00-03:00", "2026-03-01T10:00:00.000+00:00"),
+])
+def test_utc_iso_matches_created_at_format(value, expected):
+    assert export.utc_iso(value) == expected
+
+
+def test_bounds_compare_as_instants(db):
+    assert _ids(db, since="2026-03-01T07:00:00-03:00") == ["flow-1", "flow-2"]
+    assert _ids(db, until="2026-03-01T10:00:00Z") == ["flow-0"]
+    assert _ids(db, since="2026-03-01T10:00", until="2026-03-02") == ["flow-1", "flow-2"]
+
+
+def test_cli_rejects_invalid_dates(db, capsys):
+    with pytest.raises(SystemExit):
+        export.main(["--db", db, "--since", "01/03/2026"])
+    assert "--since" in capsys.readouterr().err
+
+
+def test_csv_consent_columns_follow_the_saved_consent(tmp_path):
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path)
+    s.submit("flow-1", {"nome": "Ana"}, "excluido", 1, "v0.9")  # confirmação
+    consents = {"aceite_termo": True, "autoriza_teleconsulta": True, "lgpd": True, "veracidade": True}
+    s.submit("flow-1", {"nome": "Ana", **consents}, "excluido", 1, "v0.9")  # "Salvar consentimentos"
+    s.submit("flow-2", {"nome": "Bia"}, "excluido", 1, "v0.9")  # nunca consentiu
+    s.close()
+
+    rows = {r["id"]: r for r in csv.DictReader("".join(export.csv_lines(export.iter_submissions(path))).splitlines())}
+    assert [rows["flow-1"][k] for k in consents] == ["True"] * 4
+    assert [rows["flow-2"][k] for k in consents] == [""] * 4
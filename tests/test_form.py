@@ -0,0 +1,26 @@
+import pytest
+
+NEXT = ("Continuar", "Revisar", "Ver meu")
+
+
+@pytest.mark.parametrize("version", ["v0.4", "v0.6"])
+def test_client_preview_steps_submit(version, app_path):
+    pytest.importorskip("pyarrow", exc_type=ImportError)  # pyarrow incompatível com o NumPy instalado: pula
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path(version), default_timeout=30).run()
+    assert not at.exception
+    at.text_input[0].input("Maria Silva")
+    at.text_input[1].input("maria@exemplo.com")
+    # o navegador mandaria isto com o envio do form (peso fora da faixa é limitado no servidor)
+    at.session_state["w_previa_0"] = {"data_nascimento": [1990, 5, 1] if version == "v0.4" else "1990-05-01"}
+    next(b for b in at.button if b.label.startswith(NEXT)).click()
+    at.run()
+    at.session_state["w_previa_1"] = {"peso": 9999, "altura": 1.6}
+    next(b for b in at.button if b.label.startswith(NEXT)).click()
+    at.run()
+    assert not at.exception
+    assert at.session_state["step"] == 2
+    a = at.session_state["answers"]
+    assert a["data_nascimento"] == "1990-05-01"
+    assert (a["peso"], a["altura"]) == (400, 1.6)
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import pytest
+
+from vialeve import funnel
+
+
+@pytest.fixture
+def counters(tmp_path):
+    c = funnel.Counters(str(tmp_path / "funnel.db"), interval=3600)
+    yield c
+    c.close()
+
+
+def _walk(ss, c, steps, version="v0.9"):
+    for s in steps:
+        ss["step"] = s
+        funnel.observe(ss, version, c)
+
+
+def test_back_and_forward_completes_each_step_once(counters):
+    ss = {"flow_id": "f1"}
+    # revisão -> volta à etapa 4 -> revisão de novo, duas vezes
+    _walk(ss, counters, [0, 1, 2, 3, 4, 5, 4, 5, 4, 5])
+    funnel.result(ss, "v0.9", "excluido", counters)
+    counters.flush()
+    r = funnel.report(counters.path)
+    for s in r["steps"]:
+        assert s["completed"] <= s["reached"] == 1, s
+        assert s["dropoff_rate"] == 0.0, s
+    assert r["steps"][4]["completed"] == 1
+
+
+def test_old_session_state_without_done_bits(counters):
+    ss = {"flow_id": "f1", "step": 2, "_funnel": ["f1", 1, 0.0, 0b11]}  # formato anterior
+    funnel.observe(ss, "v0.9", counters)
+    assert ss["_funnel"][3:5] == [0b111, 0b10]
+
+
+def test_report_aggregates_flows_across_flushes(counters):
+    a, b, c = {"flow_id": "a"}, {"flow_id": "b"}, {"flow_id": "c"}
+    _walk(a, counters, [0, 1, 2, 3, 4, 5])
+    funnel.result(a, "v0.9", "potencialmente_elegivel", counters)
+    _walk(b, counters, [0, 1, 2])  # abandona na etapa 2
+    counters.flush()
+    _walk(c, counters, [0, 1, 2, 3, 4, 5])
+    funnel.returning(c, "v0.9", counters)
+    funnel.result(c, "v0.9", "excluido", counters)
+    _walk({"flow_id": "outra"}, counters, [0, 1], version="v0.4")
+    counters.flush()
+
+    r = funnel.report(counters.path, version="v0.9")
+    assert r["starts"] == 3 and r["returning"] == 1
+    assert [s["reached"] for s in r["steps"]] == [3, 3, 3, 2, 2, 2]
+    assert [s["completed"] for s in r["steps"]] == [3, 3, 2, 2, 2, 2]
+    assert r["steps"][2]["dropoff"] == 1 and r["steps"][2]["dropoff_rate"] == round(1 - 2 / 3, 4)
+    assert r["results"] == {"potencialmente_elegivel": 1, "excluido": 1}
+    assert r["eligibility_ratio"] == 0.5
+    assert r["completion_rate"] == round(2 / 3, 4)
+    assert r["steps"][0]["avg_seconds"] is not None
+
+    assert funnel.report(counters.path)["starts"] == 4  # todas as versões
+    empty = funnel.report(counters.path, since=date.today() + timedelta(days=1))
+    assert empty["starts"] == 0 and empty["completion_rate"] is None
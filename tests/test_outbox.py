@@ -0,0 +1,207 @@
+import asyncio
+import json
+import random
+import sqlite3
+import time
+
+import pytest
+
+from vialeve import outbox, store
+
+
+class Clinic:
+    """Stub HTTP/1.1 da clínica: responde na ordem de `script` (status, cabeçalhos extras); depois, 200."""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                hdrs = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in head[1:] if line)}
+                body = await reader.readexactly(int(hdrs.get("content-length", "0")))
+                self.requests.append((hdrs, json.loads(body)))
+                status, extra = self.script.pop(0) if self.script else (200, {})
+                lines = [f"HTTP/1.1 {status} X", "Content-Length: 2", *(f"{k}: {v}" for k, v in extra.items())]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n{}").encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    def deliver(self, ob):
+        async def go():
+            server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+            ob.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/triagens"
+            async with server:
+                await asyncio.wait_for(ob.run(once=True), 10)
+
+        asyncio.run(go())
+
+
+def _rows(ob):
+    with ob._db_lock:
+        return ob._conn.execute("SELECT submission_id, attempts, next_attempt_at, dead, last_error FROM outbox ORDER BY seq").fetchall()
+
+
+def _due_now(ob):
+    with ob._db_lock:
+        ob._conn.execute("UPDATE outbox SET next_attempt_at = 0")
+
+
+@pytest.fixture
+def queued(tmp_path):
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path, outbox=True)
+    s.submit("flow-1", {"nome": "Ana", "lgpd": True}, "excluido", 1, "v0.9")
+    s.submit("flow-2", {"nome": "Bia", "lgpd": True}, "potencialmente_elegivel", 0, "v0.9")
+    s.close()
+    ob = outbox.Outbox(path, url="http://127.0.0.1:9/triagens", poll=0.01, max_attempts=3, base_delay=10, max_delay=60)
+    yield ob
+    ob.close()
+
+
+def test_2xx_delivers_and_clears(queued):
+    clinic = Clinic()
+    clinic.deliver(queued)
+    assert _rows(queued) == [] and queued.delivered == 2
+    hdrs, body = clinic.requests[0]
+    assert [i["id"] for i in body["items"]] == ["flow-1", "flow-2"] and hdrs["idempotency-key"]
+
+
+def test_5xx_retries_with_backoff_then_dead_letters(queued):
+    clinic = Clinic([(503, {})] * 3)
+    t0 = time.time()
+    clinic.deliver(queued)  # 1ª tentativa: reagendada; nada mais vence agora, run(once) sai
+    rows = _rows(queued)
+    assert [r[1] for r in rows] == [1, 1] and queued.retried == 2
+    assert all(t0 + 5 <= r[2] <= time.time() + 10 for r in rows)  # 0.5–1 × base
+    assert rows[0][4].startswith("HTTP 503")
+
+    _due_now(queued)
+    clinic.deliver(queued)
+    assert all(t0 + 10 <= r[2] <= time.time() + 20 for r in _rows(queued))  # dobra
+
+    _due_now(queued)
+    clinic.deliver(queued)  # 3ª falha = max_attempts
+    assert [(r[1], r[3]) for r in _rows(queued)] == [(3, 1), (3, 1)] and queued.dead == 2
+    assert queued.stats()["dead_letter"] == 2
+
+    assert queued.requeue_dead() == 2
+    clinic.deliver(queued)
+    assert _rows(queued) == [] and queued.delivered == 2
+
+
+def test_retry_after_and_permanent_errors(queued):
+    clinic = Clinic([(429, {"Retry-After": "120"})])
+    t0 = time.time()
+    clinic.deliver(queued)
+    assert all(r[2] >= t0 + 120 for r in _rows(queued))
+
+    _due_now(queued)
+    Clinic([(422, {})]).deliver(queued)  # 4xx não retentável: dead-letter direto
+    assert [(r[1], r[3]) for r in _rows(queued)] == [(2, 1), (2, 1)]
+
+
+def test_unconsented_submission_is_never_delivered(tmp_path):
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path, outbox=True)
+    s.submit("flow-1", {"nome": "Ana", "lgpd": False}, "excluido", 1, "v0.9")  # confirmou, sem consentimento
+    s.submit("flow-2", {"nome": "Bia"}, "excluido", 1, "v0.9")
+    ob = outbox.Outbox(path, url="http://127.0.0.1:9/triagens", poll=0.01)
+    try:
+        clinic = Clinic()
+        clinic.deliver(ob)
+        assert _rows(ob) == [] and clinic.requests == []
+
+        s.submit("flow-1", {"nome": "Ana", "lgpd": True}, "excluido", 1, "v0.9")  # "Salvar consentimentos"
+        clinic.deliver(ob)
+        assert [[i["id"] for i in body["items"]] for _, body in clinic.requests] == [["flow-1"]]
+        assert clinic.requests[0][1]["items"][0]["answers"]["lgpd"] is True
+    finally:
+        s.close()
+        ob.close()
+
+
+def test_revoked_consent_drops_pending_entries(tmp_path):
+    path = str(tmp_path / "sub.db")
+    s = store.SubmissionStore(path, outbox=True)
+    s.submit("flow-1", {"nome": "Ana", "lgpd": True}, "excluido", 1, "v0.9")
+    s.submit("flow-1", {"nome": "Ana", "lgpd": False}, "excluido", 1, "v0.9")
+    s.close()
+    ob = outbox.Outbox(path, url="http://127.0.0.1:9/triagens", poll=0.01)
+    try:
+        assert _rows(ob) == []
+        with ob._db_lock:  # entrada que escapou (ex.: gravada por versão anterior): descartada na reserva
+            ob._conn.execute(store._OUTBOX_INSERT, ("flow-1", "x", 0, 0))
+        clinic = Clinic()
+        clinic.deliver(ob)
+        assert _rows(ob) == [] and clinic.requests == [] and ob.delivered == 0
+    finally:
+        ob.close()
+
+
+def test_backoff_bounds():
+    random.seed(1)
+    for n in range(1, 12):
+        cap = min(300.0, 2.0 ** (n - 1))
+        assert all(0.5 * cap <= outbox.backoff(n) <= cap for _ in range(50))
+
+
+@pytest.fixture
+def box(tmp_path):
+    path = str(tmp_path / "sub.db")
+    store.SubmissionStore(path, outbox=True).close()  # schema (submissions + outbox)
+    ob = outbox.Outbox(path, url="http://127.0.0.1:9/triagens", poll=0.01, base_delay=0.01)
+    yield ob
+    ob.close()
+
+
+def test_locked_database_is_counted_and_retried(box, monkeypatch):
+    claim, calls = box._claim, []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    monkeypatch.setattr(box, "_claim", flaky)
+    asyncio.run(asyncio.wait_for(box.run(once=True), 5))
+    assert len(calls) == 3
+    assert box.db_errors == 2
+    assert "vialeve_outbox_db_errors_total 2" in box.metric_lines()
+
+
+def test_failed_reschedule_is_counted_and_left_to_the_lease(box, monkeypatch):
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(box, "_fail", locked)
+    asyncio.run(box._retry([(1, 0)], "HTTP 503", False, None))
+    assert box.db_errors == 1 and box.retried == 0
+
+
+class _Broken:
+    """Conexão que falha no meio da transação de _fail."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+
+def test_fail_rolls_back_the_open_transaction(box):
+    conn = box._conn
+    box._conn = _Broken(conn)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            box._fail([(1, 0)], "HTTP 503", False, None)
+    finally:
+        box._conn = conn
+    assert not conn.in_transaction
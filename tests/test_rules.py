@@ -0,0 +1,83 @@
+import random
+from datetime import date
+
+import pytest
+
+from vialeve import questionnaire, rules
+
+
+def _answer(rng, f):
+    if f.kind == "multi":
+        return rng.sample(list(f.options), k=rng.choice((0, 0, 1, 2)))
+    if f.options:  # quase sempre o padrão: senão quase todo mundo sai excluído
+        return f.default if rng.random() < 0.8 and f.default in f.options else rng.choice(f.options)
+    if f.name == "peso":
+        return rng.randint(30, 200)
+    if f.name == "altura":
+        return round(rng.uniform(1.3, 2.2), 2)
+    if f.kind == "slider":
+        return rng.randint(0, 10)
+    return rng.choice(("", "texto livre"))
+
+
+def _steps(rng, form):
+    today = date.today()
+    out = []
+    for s in form.steps:
+        vals = {}
+        for f in s.fields:
+            if f.kind in ("date", "dmy"):
+                vals["data_nascimento"] = date(rng.randint(today.year - 80, today.year - 10), rng.randint(1, 12), rng.randint(1, 28)).isoformat()
+            else:
+                vals[f.name] = _answer(rng, f)
+        out.append((s.targets, vals))
+    return out
+
+
+@pytest.mark.parametrize("version", ["v0.9", "v0.6", "v0.4"])
+def test_update_mask_per_step_matches_full_evaluation(version):
+    rng = random.Random(version)
+    form = questionnaire.compile_form(version)
+    seen = set()
+    for _ in range(400):
+        steps = _steps(rng, form)
+        a, mask = {}, 0
+        for targets, vals in steps:
+            a.update(vals)
+            mask = rules.update_mask(a, mask, targets, version)
+        full = {k: v for _, vals in steps for k, v in vals.items()}
+        assert mask == rules.evaluate_mask(dict(full), version)[1] == rules.evaluate(full, version).mask
+        seen.add(mask)
+
+        # voltar e editar uma etapa: só os campos dela são reavaliados
+        i = rng.randrange(len(steps))
+        targets, vals = _steps(rng, form)[i]
+        a.update(vals)
+        full.update(vals)
+        mask = rules.update_mask(a, mask, targets, version)
+        assert mask == rules.evaluate_mask(dict(full), version)[1]
+    assert 0 in seen and len(seen) > 5  # amostra cobre elegíveis e vários motivos
+
+
+def test_update_mask_keeps_bits_of_other_fields():
+    a = {"gravidez": "sim", "amamentando": "nao"}
+    mask = rules.update_mask(a, 0, ("gravidez", "amamentando"))
+    assert mask and rules.status_from_mask(mask) == rules.STATUS_EXCLUIDO
+    assert rules.update_mask({"peso": 80, "altura": 1.7}, mask, ("peso", "altura")) & mask == mask
+    assert rules.update_mask(a, mask, ("campo_sem_regra",)) == mask
+    a["gravidez"] = "nao"
+    assert rules.update_mask(a, mask, ("gravidez",)) == 0
+
+
+def test_rule_hits_are_exported_as_metrics(monkeypatch):
+    from vialeve import metrics
+
+    monkeypatch.setattr(rules, "_hits", [0] * len(rules.RULES))
+    monkeypatch.setattr(rules, "_evaluations", [0])
+    rules.count_hits(rules.BIT_IMC | rules.BIT_MENOR_18)
+    rules.count_hits(rules.BIT_IMC)
+    lines = metrics.render().splitlines()
+    assert "vialeve_rule_evaluations_total 2" in lines
+    assert 'vialeve_rule_hits_total{rule="imc_baixo"} 2' in lines
+    assert 'vialeve_rule_hits_total{rule="menor_18"} 1' in lines
+    assert sum(line.startswith("vialeve_rule_hits_total{") for line in lines) == len(rules.RULES)
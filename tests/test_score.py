@@ -0,0 +1,102 @@
+import json
+import random
+from datetime import date
+
+import pytest
+
+from vialeve import rules, score
+
+HOJE = date(2026, 3, 1)
+
+
+def _line(rng, i):
+    if i % 17 == 5:
+        return "{quebrado"
+    if i % 23 == 7:
+        return ""
+    a = {
+        "id": f"p{i}",
+        "data_nascimento": rng.choice(("1980-05-10", "10/05/1980", "01/01/2012", "")),
+        "peso": rng.choice((90, "92,5", 55)), "altura": rng.choice((1.7, 170, "1,65")),
+        "tem_comorbidades": rng.choice(("Sim", "Não")),
+        "gravidez": rng.choice(("Não",) * 5 + ("Sim",)),
+        "insuf_renal": rng.choice(("Normal", "Não sei informar", "Grave")),
+    }
+    return json.dumps(a, ensure_ascii=False)
+
+
+@pytest.fixture
+def src(tmp_path):
+    rng = random.Random(7)
+    path = tmp_path / "parceiro.ndjson"
+    path.write_text("".join(_line(rng, i) + "\n" for i in range(120)), encoding="utf-8")
+    return str(path)
+
+
+def _out(path):
+    return [json.loads(line) for line in open(path, encoding="utf-8")]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_output_keeps_input_order(src, tmp_path, workers):
+    dst = str(tmp_path / f"out-{workers}.ndjson")
+    s = score.run(src, dst, workers=workers, chunk=7, hoje=HOJE)
+    rows = _out(dst)
+    assert [r["line"] for r in rows] == [i + 1 for i in range(120) if i % 23 != 7]
+    assert s["lines"] == len(rows) and s["errors"] == sum("error" in r for r in rows) > 0
+    ref = str(tmp_path / "ref.ndjson")
+    score.run(src, ref, workers=1, chunk=1000, hoje=HOJE)
+    assert open(dst, "rb").read() == open(ref, "rb").read()
+
+
+def test_resume_after_an_interrupted_run(src, tmp_path, monkeypatch):
+    ref = str(tmp_path / "ref.ndjson")
+    score.run(src, ref, workers=1, chunk=10, hoje=HOJE)
+
+    dst = str(tmp_path / "out.ndjson")
+    real, calls = score.score_chunk, []
+
+    def crash_on_fourth(args):
+        calls.append(args[0])
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return real(args)
+
+    monkeypatch.setattr(score, "score_chunk", crash_on_fourth)
+    with pytest.raises(KeyboardInterrupt):
+        score.run(src, dst, workers=1, chunk=10, hoje=HOJE)
+    ckpt = score.read_checkpoint(dst + score.CKPT_SUFFIX)
+    assert ckpt["lines"] == 30
+    with open(dst, "ab") as f:
+        f.write(b'{"line": 31, "meia linha')  # bloco que não chegou ao checkpoint
+    monkeypatch.setattr(score, "score_chunk", real)
+
+    s = score.run(src, dst, workers=1, chunk=10, hoje=HOJE, resume=True)
+    assert s["resumed_from_line"] == 30
+    assert open(dst, "rb").read() == open(ref, "rb").read()
+    assert score.read_checkpoint(dst + score.CKPT_SUFFIX) is None
+
+
+def test_normalize_partner_labels():
+    a = score.normalize({
+        "gravidez": "Não", "amamentando": "SIM ", "insuf_renal": "Não sei informar", "insuf_hepatica": "Grave",
+        "data_nascimento": "05/03/1990", "altura": 170, "peso": "92,5", "tem_comorbidades": "não",
+        "alergias_componentes": "não tenho alergia a esses componentes",
+    })
+    assert a == {
+        "gravidez": "nao", "amamentando": "sim", "insuf_renal": "desconhecido", "insuf_hepatica": "grave",
+        "data_nascimento": "1990-03-05", "altura": 1.7, "peso": 92.5, "tem_comorbidades": "nao",
+        "alergias_componentes": [rules.NENHUMA_ALERGIA],
+    }
+    assert score.normalize({"answers": {"data_nascimento": "31/02/1990", "idade": "41"}}) == {"data_nascimento": "31/02/1990", "idade": 41}
+
+
+def test_scored_labels_match_rules(src, tmp_path):
+    dst = str(tmp_path / "out.ndjson")
+    score.run(src, dst, workers=1, hoje=HOJE)
+    lines = open(src, encoding="utf-8").read().splitlines()
+    for r in _out(dst):
+        if "error" in r:
+            continue
+        ev = rules.evaluate(score.normalize(json.loads(lines[r["line"] - 1])), "v0.9", hoje=HOJE)
+        assert (r["status"], r["reason_codes"], r["idade"]) == (ev.status, rules.codes_from_mask(ev.mask), ev.idade)
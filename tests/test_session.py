@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from vialeve import session
+
+
+@pytest.fixture
+def backend(tmp_path):
+    b = session.SQLiteBackend(str(tmp_path / "sessions.db"), ttl=60)
+    yield b
+    b.close()
+
+
+def _answers(email):
+    return session.encode("answers", {"email": email, "peso": 80})
+
+
+def test_writer_purges_expired_rows_on_schedule(backend):
+    backend.write({"velha": {"step": "2"}})
+    backend._conn.execute("UPDATE sessions SET updated_at = ?", (time.time() - 3600,))
+    w = session.Writer(backend, purge_interval=0.05)
+    try:
+        deadline = time.monotonic() + 2
+        while w.purged == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert w.purged == 1
+        assert backend._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+    finally:
+        w.close()
+
+
+def test_delete_is_ordered_with_pending_writes(backend):
+    backend.write({"s1": {"step": "3", "consent_ok": "true"}})
+    w = session.Writer(backend, purge_interval=3600)
+    try:
+        w.put("s1", {"answers": _answers("a@exemplo.com")})
+        w.delete("s1")
+        w.put("s1", {"step": "0"})
+        w.flush()
+        assert backend.read("s1") == {"step": "0"}
+    finally:
+        w.close()
+
+
+def test_forget_on_confirm_stops_mirroring_until_reset(backend):
+    w = session.Writer(backend, purge_interval=3600)
+    ss = {}
+    try:
+        session.restore(ss, {}, w)
+        ss.update(step=4, answers={"email": "a@exemplo.com"})
+        session.flush(ss, w)
+        w.flush()
+        assert backend.read(ss["_sid"])
+
+        session.forget(ss, stop=True, writer=w)
+        ss["eligibility"] = "excluido"
+        assert session.flush(ss, w) == 0
+        w.flush()
+        assert backend.read(ss["_sid"]) == {}
+
+        session.forget(ss, writer=w)  # reiniciar: volta a espelhar, tudo de novo
+        assert session.flush(ss, w) == 3
+    finally:
+        w.close()
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "local"])
+def test_erase_deletes_sessions_with_the_email(kind, backend):
+    b = backend if kind == "sqlite" else session.RedisBackend(session.LocalRedis())
+    b.write({
+        "s1": {"answers": _answers("Fulana@Exemplo.com"), "step": "2"},
+        "s2": {"answers": _answers("outra@exemplo.com")},
+        "s3": {"step": "0"},
+    })
+    assert b.erase(session.emails.email_key("fulana@exemplo.com")) == 1
+    assert b.read("s1") == {}
+    assert b.read("s2") and b.read("s3")
@@ -0,0 +1,59 @@
+import pytest
+
+from vialeve import store
+
+
+@pytest.fixture
+def sub(tmp_path):
+    s = store.SubmissionStore(str(tmp_path / "sub.db"), outbox=True, max_wait=0.05)
+    yield s
+    s.close()
+
+
+def _count(s, table):
+    conn = store.connect(s.path, readonly=True)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_same_flow_and_digest_writes_nothing(sub):
+    a = {"nome": "Ana", "email": "ana@exemplo.com", "lgpd": True}
+    assert sub.submit("flow-1", a, "excluido", 1, "v0.9") is True
+    assert sub.submit("flow-1", dict(a), "excluido", 1, "v0.9") is False  # rerun / reconfirmação igual
+    assert (_count(sub, "submissions"), _count(sub, "outbox")) == (1, 1)
+
+    assert sub.submit("flow-1", {**a, "peso": 90}, "excluido", 1, "v0.9") is True  # voltou e editou
+    assert (_count(sub, "submissions"), _count(sub, "outbox")) == (1, 2)
+    assert sub.get("flow-1")["answers"]["peso"] == 90
+
+
+def test_outbox_waits_for_lgpd_consent(sub):
+    a = {"nome": "Ana", "email": "ana@exemplo.com"}
+    assert sub.submit("flow-1", a, "excluido", 1, "v0.9") is True  # confirmação
+    assert (_count(sub, "submissions"), _count(sub, "outbox")) == (1, 0)
+    assert sub.submit("flow-1", {**a, "lgpd": True}, "excluido", 1, "v0.9") is True  # consentimentos
+    assert (_count(sub, "submissions"), _count(sub, "outbox")) == (1, 1)
+
+
+def test_concurrent_submissions_share_commits(sub):
+    futs = [sub.submit_async(f"flow-{i}", {"nome": f"P{i}", "lgpd": True}, "potencialmente_elegivel", 0, "v0.9") for i in range(200)]
+    futs.append(sub.submit_async("flow-0", {"nome": "P0", "lgpd": True}, "potencialmente_elegivel", 0, "v0.9"))  # repetido no lote
+    assert [f.result(5) for f in futs] == [True] * 200 + [False]
+    assert sub.rows_written == 200 and sub.commits < 200
+    assert (_count(sub, "submissions"), _count(sub, "outbox")) == (200, 200)
+
+
+def test_erase_email_removes_rows_and_pending_outbox(sub):
+    sub.submit("f1", {"email": "Ana.Silva+triagem@gmail.com", "lgpd": True}, "excluido", 1, "v0.9")
+    sub.submit("f2", {"email": "anasilva@gmail.com", "lgpd": True}, "excluido", 1, "v0.6")
+    sub.submit("f3", {"email": "outra@exemplo.com", "lgpd": True}, "excluido", 1, "v0.9")
+    assert [r["id"] for r in store.find_by_email("ANASILVA@gmail.com", sub.path)] == ["f1", "f2"]
+
+    assert store.erase_email("ana.silva@googlemail.com", sub.path) == 2
+    assert store.find_by_email("anasilva@gmail.com", sub.path) == []
+    assert sub.get("f1") is None and sub.get("f3") is not None
+    assert _count(sub, "outbox") == 1
+    assert store.erase_email("ninguem@exemplo.com", sub.path) == 0
+    assert store.erase_email("invalido", sub.path) == 0
@@ -0,0 +1,45 @@
+import time
+
+from vialeve import answers, summary
+
+NEXT = ("Continuar", "Revisar", "Ver meu")
+CONSENTS = {"aceite_termo": True, "autoriza_teleconsulta": True, "lgpd": True, "veracidade": True}
+
+
+def test_prefetch_key_ignores_consents():
+    a = answers.Answers({"nome": "Ana", "email": "ana@exemplo.com", "peso": 80, "altura": 1.7})
+    cache = summary.get_cache()
+    key, _ = summary.request(a, "potencialmente_elegivel", 0, "v0.9")  # confirm(): sem consentimentos
+    cache.wait(key, 10)
+    misses = cache.misses
+
+    a.update(CONSENTS)
+    key2, doc = summary.request(a, "potencialmente_elegivel", 0, "v0.9")
+    assert key2 == key and cache.misses == misses
+    assert doc is not None and doc.endswith(b"</table></body></html>")
+    assert doc.count(b"<td>Sim</td>") >= 4
+    assert "Não".encode() not in doc.split(b"<h2>Consentimentos</h2>")[1]
+
+
+def test_download_appears_without_a_click(app_path):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path("v0.9"), default_timeout=30).run()
+    at.text_input[0].input("Maria Silva")
+    at.text_input[1].input("maria@exemplo.com")
+    while [b for b in at.button if b.label.startswith(NEXT)]:
+        next(b for b in at.button if b.label.startswith(NEXT)).click().run()
+    next(b for b in at.button if b.label.startswith("Confirmar")).click().run()
+    misses = summary.get_cache().misses
+
+    for c in at.checkbox:
+        c.check()
+    next(b for b in at.button if b.label.startswith("Salvar consentimentos")).click().run()
+    assert not at.exception
+    deadline = time.monotonic() + 10
+    while not at.get("download_button") and time.monotonic() < deadline:
+        time.sleep(0.05)
+        at.run()  # no navegador, o fragmento com run_every faz este rerun sozinho
+    assert [d for d in at.get("download_button") if "resumo" in d.proto.label]
+    assert not [b for b in at.button if "clique para atualizar" in b.label]
+    assert summary.get_cache().misses == misses  # o documento pedido na confirmação foi reaproveitado
@@ -1,152 +1,145 @@
 import os
+import sys
+import uuid
+from pathlib import Path
 import streamlit as st
-from typing import Dict, Any, Tuple, List
-from datetime import date
+from typing import Tuple
 
-st.set_page_config(page_title="ViaLeve - Pré-elegibilidade", page_icon="💊", layout="centered")
-
-LOGO_SVG = """
-<svg width="720" height="180" viewBox="0 0 720 180" xmlns="http://www.w3.org/2000/svg">
-  <defs>
-    <linearGradient id="g1" x1="0" y1="0" x2="1" y2="1">
-      <stop offset="0%" stop-color="#0EA5A4" />
-      <stop offset="100%" stop-color="#94E7E3" />
-    </linearGradient>
-  </defs>
-  <g transform="translate(10,20)">
-    <circle cx="70" cy="70" r="62" fill="url(#g1)"/>
-    <path d="M45 70 C60 45, 80 40, 100 55 C95 60, 85 68, 75 78 C68 84, 60 90, 55 94 C58 84, 58 78, 60 70 Z" fill="#ffffff" opacity="0.95"/>
-    <path d="M55 90 L70 105 L105 70" fill="none" stroke="#ffffff" stroke-width="10" stroke-linecap="round" stroke-linejoin="round" opacity="0.95"/>
-  </g>
-  <g transform="translate(160,40)">
-    <text x="0" y="55" font-size="64" font-family="Inter, Arial, Helvetica, sans-serif" font-weight="700" fill="#0F172A">Via</text>
-    <text x="155" y="55" font-size="64" font-family="Inter, Arial, Helvetica, sans-serif" font-weight="600" fill="#0EA5A4">Leve</text>
-    <text x="0" y="105" font-size="20" font-family="Inter, Arial, Helvetica, sans-serif" fill="#475569">sua jornada mais leve começa aqui</text>
-  </g>
-</svg>
-"""
+APP_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(APP_DIR.parent))  # pacote vialeve (raiz do repo)
+from vialeve import answers, assets, deltas, export, flow, form, funnel, metrics, questionnaire, rules, session, store
 
-st.markdown(
-    """
-    <style>
-      :root { --brand: #0EA5A4; --brandSoft: #94E7E3; --ink: #0F172A; }
-      .small-muted { color:#6b7280; font-size:0.9rem; }
-      .badge { display:inline-block; padding:0.25rem 0.6rem; border-radius:999px; background:var(--brandSoft); }
-      .card { padding:1rem; border-radius:1rem; background:#F7FAF9; border:1px solid #e5e7eb; }
-      .logo-wrap { display:flex; align-items:center; gap:14px; margin: 0 0 12px 0; }
-      .logo-wrap svg { max-width: 100%; height: auto; }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+st.set_page_config(page_title="ViaLeve - Pré-elegibilidade", page_icon="💊", layout="centered")
 
 def init_state():
     defaults = {
         "step": 0,
-        "answers": {},
+        "answers": answers.Answers(),
         "eligibility": None,
-        "exclusion_reasons": [],
+        "exclusion_mask": 0,
         "consent_ok": False,
+        "flow_id": uuid.uuid4().hex,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
-def next_step():
-    st.session_state.step += 1
-
-def prev_step():
-    st.session_state.step = max(0, st.session_state.step - 1)
-
-def reset_flow():
-    for k in list(st.session_state.keys()):
-        del st.session_state[k]
-    init_state()
-
-def calc_idade(d: date | None) -> int | None:
-    if not d:
-        return None
-    today = date.today()
-    return today.year - d.year - ((today.month, today.day) < (d.month, d.day))
-
-EXCIPIENTES_COMUNS = [
-    "Polietilenoglicol (PEG)",
-    "Metacresol / Fenol",
-    "Fosfatos (fosfato dissódico etc.)",
-    "Látex (agulhas/rolhas)",
-    "Carboximetilcelulose",
-    "Trometamina (TRIS)",
-]
-
-def evaluate_rules(a: Dict[str, Any]):
-    exclusion = []
-    def g(key, default=None):
-        return a.get(key, default)
-
-    if g("data_nascimento"):
-        try:
-            dob = g("data_nascimento")
-            if isinstance(dob, str):
-                dob = date.fromisoformat(dob)
-            idade = calc_idade(dob)
-            if idade is not None:
-                a["idade"] = idade
-                a["idade_calculada"] = idade
-        except Exception:
-            pass
-
-    if g("idade") is not None and g("idade") < 18:
-        exclusion.append("Menor de 18 anos.")
-    if g("gravidez") == "sim":
-        exclusion.append("Gestação em curso.")
-    if g("amamentando") == "sim":
-        exclusion.append("Amamentação em curso.")
-    if g("tratamento_cancer") == "sim":
-        exclusion.append("Tratamento oncológico ativo.")
-    if g("pancreatite_previa") == "sim":
-        exclusion.append("História de pancreatite prévia.")
-    if g("historico_mtc_men2") == "sim":
-        exclusion.append("História pessoal/familiar de carcinoma medular de tireoide (MTC) ou MEN2.")
-    if g("alergia_glp1") == "sim":
-        exclusion.append("Hipersensibilidade conhecida a análogos de GLP-1.")
-    if g("alergias_componentes"):
-        exclusion.append("Alergia relatada a excipientes comuns de formulações injetáveis (ver detalhes).")
-    if g("gi_grave") == "sim":
-        exclusion.append("Doença gastrointestinal grave ativa.")
-    if g("gastroparesia") == "sim":
-        exclusion.append("Gastroparesia diagnosticada.")
-    if g("colecistite_12m") == "sim":
-        exclusion.append("Colecistite/colelitíase sintomática nos últimos 12 meses.")
-    if g("insuf_renal") in ["moderada", "grave"]:
-        exclusion.append("Insuficiência renal moderada/grave (necessita avaliação médica).")
-    if g("insuf_hepatica") in ["moderada", "grave"]:
-        exclusion.append("Insuficiência hepática moderada/grave (necessita avaliação médica).")
-    if g("transtorno_alimentar") == "sim":
-        exclusion.append("Transtorno alimentar ativo.")
-    if g("uso_corticoide") == "sim":
-        exclusion.append("Uso crônico de corticoide (requer avaliação).")
-    if g("antipsicoticos") == "sim":
-        exclusion.append("Uso de antipsicóticos (requer avaliação).")
-
-    imc = None
-    peso = g("peso")
-    altura = g("altura")
-    if peso and altura:
-        try:
-            imc = float(peso) / (float(altura) ** 2)
-            st.session_state.answers["imc"] = round(imc, 1)
-        except Exception:
-            pass
+def update_eligibility(fields: Tuple[str, ...]):
+    # Avaliação incremental: cada etapa reavalia só as regras que leem seus campos.
+    ss = st.session_state
+    with metrics.timer("evaluate_rules", "v0.6", ss.step):
+        ss.exclusion_mask = rules.update_mask(ss.answers, ss.exclusion_mask, fields, "v0.6")
+    if "peso" in fields:
+        # "imc" fica nas respostas só como registro da submissão (exportação); a tela lê de rules.evaluate.
+        imc = rules.evaluate(ss.answers, "v0.6").imc
+        if imc is not None:
+            ss.answers["imc"] = round(imc, 1)
+
+def save_submission(status: str, mask: int) -> bool:
+    # Grava a submissão confirmada (idempotente por flow_id; reruns não duplicam). True se a linha mudou.
+    try:
+        return store.get_store().submit(
+            st.session_state.flow_id, st.session_state.answers, status,
+            mask, "v0.6",
+        )
+    except Exception:
+        st.caption("⚠️ Não foi possível salvar suas respostas agora.")
+    return False
+
+# Questionário (etapas 0–4) compilado uma vez: opções, códigos e rótulos prontos.
+FORM = questionnaire.compile_form("v0.6")
+
+def commit_form(step: int):
+    update_eligibility(questionnaire.commit(FORM, step, st.session_state))
+    if step == 0:
+        check_email()
+
+def check_email():
+    # Bloom em memória + índice de e-mail: quem já respondeu antes conta como retorno no funil.
+    try:
+        seen = store.get_store().seen_email(st.session_state.answers.get("email"))
+    except Exception:
+        return
+    if seen:
+        funnel.returning(st.session_state, "v0.6")
+
+def finish_step(step: int) -> str | None:
+    # Roda após a validação. O resultado sai da máscara acumulada, sem reavaliar
+    # regras; com VIALEVE_SHORT_CIRCUIT, uma exclusão encerra o fluxo mais cedo.
+    ss = st.session_state
+    if step == 4 or (flow.SHORT_CIRCUIT and ss.exclusion_mask):
+        ss.eligibility = rules.status_from_mask(ss.exclusion_mask)
+        if save_submission(ss.eligibility, ss.exclusion_mask):
+            rules.count_hits(ss.exclusion_mask)  # só o que gravou: reenviar igual não reconta
+        session.forget(ss, stop=True)  # confirmado: as respostas ficam só em submissions
+        funnel.result(ss, "v0.6", ss.eligibility)
+        return "finish"
+    return None
+
+def validate_step0() -> str | None:
+    return questionnaire.validate(FORM, 0, st.session_state)
+
+# Navegação em callbacks: a transição acontece antes do rerun (uma execução por clique).
+def nav(event: str, step: int | None = None):
+    if event == "reset":
+        session.forget(st.session_state)  # recomeçar apaga o estado salvo
+    commit = (lambda: commit_form(step)) if step is not None else None
+    advance = (lambda: finish_step(step)) if step is not None else None
+    flow.navigate(st.session_state, event, commit=commit, validate=validate_step0 if step == 0 else None, init=init_state, advance=advance, version="v0.6")
+
+def count_click():
+    flow.count_click(st.session_state)
+
+CONSENTS = ("aceite_termo", "autoriza_teleconsulta", "lgpd", "veracidade")
+
+def save_consents():
+    # Os consentimentos entram na mesma submissão (mesmo flow_id): o digest muda e o upsert atualiza a linha.
+    count_click()
+    ss = st.session_state
+    ss.answers.update({k: bool(ss.get(f"w_{k}", False)) for k in CONSENTS})
+    ss.consent_ok = all(ss.answers[k] for k in CONSENTS)
+    save_submission(ss.eligibility, ss.exclusion_mask)
+
+def download_answers():
+    # O JSON só é montado no clique; o botão de download aparece em seguida.
+    if not st.session_state.consent_ok:
+        st.session_state.pop("download_json", None)
+    if st.button("Baixar minhas respostas (JSON)", disabled=not st.session_state.consent_ok, on_click=count_click):
+        st.session_state.download_json = export.answers_json(st.session_state.answers)
+    if st.session_state.get("download_json"):
+        st.download_button(
+            "Salvar arquivo",
+            data=st.session_state.download_json,
+            file_name="vialeve_respostas.json",
+            mime="application/json",
+            on_click=count_click,
+        )
+
+# Prévias ao vivo: no navegador (componente "previa") ou, com VIALEVE_CLIENT_PREVIEW=0,
+# no fragmento da etapa (form.render_step), lendo os widgets.
+def idade_badge():
+    dob, erro = questionnaire.read_dob(FORM.fields["data_nascimento"], st.session_state)
+    idade_calc = rules.calc_idade(dob) if dob and not erro else None
+    if idade_calc is not None:
+        st.markdown(f"<span class='small-muted'>Idade calculada: <span class='badge'><b>{idade_calc}</b> anos</span></span>", unsafe_allow_html=True)
+
+def imc_card():
+    ss = st.session_state
+    imc = rules.calc_imc({"peso": ss.get("w_peso", ss.answers.get("peso", 90)), "altura": ss.get("w_altura", ss.answers.get("altura", 1.70))})
     if imc is not None:
-        if imc < 27 and g("tem_comorbidades") == "nao":
-            exclusion.append("IMC < 27 sem comorbidades relevantes.")
+        st.markdown(f"<div class='card'>IMC estimado: <span class='badge'><b>{imc:.1f}</b></span></div>", unsafe_allow_html=True)
 
-    status = "excluido" if exclusion else "potencialmente_elegivel"
-    return status, exclusion
+# etapa -> (prévia, campos que ela lê, cálculo no navegador)
+STEP_EXTRAS = {0: (idade_badge, ("data_nascimento",), "idade"), 1: (imc_card, ("peso", "altura"), "imc")}
 
 # UI
+session.restore(st.session_state, st.query_params)  # estado compartilhado entre réplicas (VIALEVE_SESSION_BACKEND)
 init_state()
-st.markdown(f"<div class='logo-wrap'>{LOGO_SVG}</div>", unsafe_allow_html=True)
+flow.count_run(st.session_state)
+funnel.observe(st.session_state, "v0.6")  # funil por etapa (contadores pré-agregados)
+_step, _t_rerun = st.session_state.step, metrics.now()
+_deltas = deltas.begin("v0.6", _step)  # mensagens/bytes do rerun (VIALEVE_DELTAS ou métricas ligadas)
+st.markdown(assets.header_html(APP_DIR), unsafe_allow_html=True)
 st.caption("Uma triagem rápida e acolhedora para entender se o tratamento farmacológico pode ser adequado para você.")
 
 with st.expander("Como funciona (rapidinho)", expanded=False):
@@ -154,142 +147,24 @@ with st.expander("Como funciona (rapidinho)", expanded=False):
 
 total_steps = 6
 st.progress((st.session_state.step + 1) / total_steps)
+if st.session_state.get("nav_error"):
+    st.error(st.session_state.nav_error)
 
-if st.session_state.step == 0:
-    st.subheader("1) Quem é você? 🙂")
-    with st.form("step0"):
-        col1, col2 = st.columns(2)
-        with col1:
-            nome = st.text_input("Nome completo *", value=st.session_state.answers.get("nome", ""), placeholder="Seu nome e sobrenome")
-            email = st.text_input("E-mail *", value=st.session_state.answers.get("email", ""), placeholder="voce@exemplo.com")
-        with col2:
-            default_dob = st.session_state.answers.get("data_nascimento")
-            if isinstance(default_dob, str):
-                try:
-                    default_dob = date.fromisoformat(default_dob)
-                except Exception:
-                    default_dob = date(1990,1,1)
-            elif not default_dob:
-                default_dob = date(1990,1,1)
-            data_nascimento = st.date_input("Data de nascimento *", value=default_dob, min_value=date(1900,1,1), max_value=date.today(), format="DD/MM/YYYY")
-            sexo = st.selectbox("Sexo (opcional)", ["feminino", "masculino", "prefiro não informar"], index=["feminino", "masculino", "prefiro não informar"].index(st.session_state.answers.get("sexo", "feminino")) if st.session_state.answers.get("sexo") else 0)
-
-        idade_calc = calc_idade(data_nascimento)
-        st.session_state.answers.update({
-            "nome": nome, "email": email, "data_nascimento": str(data_nascimento),
-            "idade": idade_calc, "idade_calculada": idade_calc, "sexo": sexo
-        })
-        if idade_calc is not None:
-            st.markdown(f"<span class='small-muted'>Idade calculada: <span class='badge'><b>{idade_calc}</b> anos</span></span>", unsafe_allow_html=True)
-
-        ok = bool(nome.strip()) and bool(email.strip()) and (data_nascimento is not None)
-        if st.form_submit_button("Continuar ▶️", disabled=not ok, use_container_width=True):
-            next_step()
+_t_step = metrics.now()
+if st.session_state.step < 5:
+    extra, live, client = STEP_EXTRAS.get(st.session_state.step, (None, (), None))
+    form.render_step(FORM, st.session_state.step, nav, extra=extra, live=live, client=client)
 
-elif st.session_state.step == 1:
-    st.subheader("2) Medidas e saúde atual 🩺")
-    with st.form("step1"):
-        col1, col2 = st.columns(2)
-        with col1:
-            peso = st.number_input("Peso (kg) *", min_value=30, max_value=400, step=1, value=int(st.session_state.answers.get("peso", 90)), format="%d")
-            tem_comorbidades = st.radio("Possui comorbidades relevantes? (DM2, pressão alta, apneia, colesterol...)", options=["sim", "nao"], index=0 if st.session_state.answers.get("tem_comorbidades","sim")=="sim" else 1, horizontal=True)
-        with col2:
-            altura = st.number_input("Altura (m) *", min_value=1.30, max_value=2.20, step=0.01, value=float(st.session_state.answers.get("altura", 1.70)), help="Ex.: 1.70")
-            comorbidades = st.text_area("Se sim, quais comorbidades?", value=st.session_state.answers.get("comorbidades", ""))
-
-        st.session_state.answers.update({"peso": peso, "altura": altura, "tem_comorbidades": tem_comorbidades, "comorbidades": comorbidades})
-        try:
-            imc = float(peso)/(float(altura)**2)
-            st.markdown(f"<div class='card'>IMC estimado: <span class='badge'><b>{imc:.1f}</b></span></div>", unsafe_allow_html=True)
-        except Exception:
-            pass
-
-        if st.form_submit_button("Continuar ▶️", use_container_width=True):
-            next_step()
-
-elif st.session_state.step == 2:
-    st.subheader("3) Algumas condições importantes ⚠️")
-    with st.form("step2"):
-        col1, col2 = st.columns(2)
-        with col1:
-            gravidez = st.radio("Está grávida?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("gravidez","nao")=="nao" else 1)
-            amamentando = st.radio("Está amamentando?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("amamentando","nao")=="nao" else 1)
-            tratamento_cancer = st.radio("Em tratamento oncológico ativo?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("tratamento_cancer","nao")=="nao" else 1)
-            gi_grave = st.radio("Doença gastrointestinal grave ativa?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("gi_grave","nao")=="nao" else 1)
-            gastroparesia = st.radio("Diagnóstico de gastroparesia (esvaziamento gástrico lento)?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("gastroparesia","nao")=="nao" else 1)
-        with col2:
-            pancreatite_previa = st.radio("Já teve pancreatite?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("pancreatite_previa","nao")=="nao" else 1)
-            historico_mtc_men2 = st.radio("História pessoal/familiar de MTC/MEN2?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("historico_mtc_men2","nao")=="nao" else 1)
-            colecistite_12m = st.radio("Cólica de vesícula/colecistite nos últimos 12 meses?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("colecistite_12m","nao")=="nao" else 1)
-            outras_contra = st.text_area("Outras condições clínicas relevantes?")
-
-        st.session_state.answers.update({
-            "gravidez": gravidez, "amamentando": amamentando, "tratamento_cancer": tratamento_cancer,
-            "gi_grave": gi_grave, "gastroparesia": gastroparesia, "pancreatite_previa": pancreatite_previa,
-            "historico_mtc_men2": historico_mtc_men2, "colecistite_12m": colecistite_12m, "outras_contra": outras_contra,
-        })
-        if st.form_submit_button("Continuar ▶️", use_container_width=True):
-            next_step()
-
-elif st.session_state.step == 3:
-    st.subheader("4) Medicações e alergias 💉")
-    with st.form("step3"):
-        col1, col2 = st.columns(2)
-        with col1:
-            insuf_renal = st.selectbox("Como estão seus rins?", ["normal", "leve", "moderada", "grave"], index=["normal","leve","moderada","grave"].index(st.session_state.answers.get("insuf_renal","normal")) if st.session_state.answers.get("insuf_renal") else 0)
-            insuf_hepatica = st.selectbox("E o fígado?", ["normal", "leve", "moderada", "grave"], index=["normal","leve","moderada","grave"].index(st.session_state.answers.get("insuf_hepatica","normal")) if st.session_state.answers.get("insuf_hepatica") else 0)
-            transtorno_alimentar = st.radio("Tem transtorno alimentar ativo (anorexia/bulimia/compulsão)?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("transtorno_alimentar","nao")=="nao" else 1)
-            uso_corticoide = st.radio("Usa corticoide todos os dias há mais de 3 meses?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("uso_corticoide","nao")=="nao" else 1)
-            antipsicoticos = st.radio("Usa antipsicóticos atualmente?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("antipsicotos","nao")=="nao" else 1)
-        with col2:
-            alergia_glp1 = st.radio("Tem alergia conhecida a remédios do tipo GLP-1?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("alergia_glp1","nao")=="nao" else 1)
-            alergias_componentes = st.multiselect("É alérgico(a) a algum destes componentes comuns?", options=[
-                "Polietilenoglicol (PEG)","Metacresol / Fenol","Fosfatos (fosfato dissódico etc.)","Látex (agulhas/rolhas)","Carboximetilcelulose","Trometamina (TRIS)"
-            ], default=st.session_state.answers.get("alergias_componentes", []))
-            outros_componentes = st.text_input("Algum outro componente ao qual você é alérgico(a)?")
-
-        st.session_state.answers.update({
-            "insuf_renal": insuf_renal, "insuf_hepatica": insuf_hepatica, "transtorno_alimentar": transtorno_alimentar,
-            "uso_corticoide": uso_corticoide, "antipsicotos": antipsicotos,  # mantém a chave usada na UI acima
-            "alergia_glp1": alergia_glp1, "alergias_componentes": alergias_componentes, "outros_componentes": outros_componentes,
-        })
-        if st.form_submit_button("Continuar ▶️", use_container_width=True):
-            next_step()
-
-elif st.session_state.step == 4:
-    st.subheader("5) Histórico e objetivo 🎯")
-    with st.form("step4"):
-        col1, col2 = st.columns(2)
-        with col1:
-            usou_antes = st.radio("Já usou medicação para emagrecer?", options=["nao", "sim"], horizontal=True, index=0 if st.session_state.answers.get("usou_antes","nao")=="nao" else 1)
-            quais = st.multiselect("Quais?", options=["Semaglutida","Tirzepatida","Liraglutida","Orlistate","Bupropiona/Naltrexona","Outros"], default=st.session_state.answers.get("quais", []))
-            efeitos = st.text_area("Teve algum efeito colateral? Conte pra gente.")
-        with col2:
-            objetivo = st.selectbox("Qual seu objetivo principal?", options=["Perda de peso","Controle de comorbidades","Manutenção"], index=["Perda de peso","Controle de comorbidades","Manutenção"].index(st.session_state.answers.get("objetivo","Perda de peso")) if st.session_state.answers.get("objetivo") else 0)
-            gestao_expectativas = st.slider("Quão pronto(a) está para mudanças no dia a dia (0-10)?", 0, 10, value=st.session_state.answers.get("pronto_mudar", 7))
-
-        st.session_state.answers.update({"usou_antes": usou_antes, "quais": quais, "efeitos": efeitos, "objetivo": objetivo, "pronto_mudar": gestao_expectativas})
-        if st.form_submit_button("Ver meu resultado ✅", use_container_width=True):
-            try:
-                dob = date.fromisoformat(st.session_state.answers.get("data_nascimento"))
-                st.session_state.answers["idade"] = calc_idade(dob)
-                st.session_state.answers["idade_calculada"] = st.session_state.answers["idade"]
-            except Exception:
-                pass
-            status, reasons = evaluate_rules(st.session_state.answers)
-            st.session_state.eligibility = status
-            st.session_state.exclusion_reasons = reasons
-            next_step()
-
-elif st.session_state.step == 5:
+else:
     st.subheader("6) Seu resultado ✅")
     status = st.session_state.eligibility
-    reasons = st.session_state.exclusion_reasons
+    reasons = rules.reasons_from_mask(st.session_state.exclusion_mask, "v0.6")
 
     if status == "potencialmente_elegivel":
         st.success("🎉 **Parabéns!** Você pode se **beneficiar do tratamento farmacológico**. Vamos seguir para o agendamento da sua consulta.")
-        if "imc" in st.session_state.answers:
-            st.markdown(f"<div class='card'>IMC estimado: <span class='badge'><b>{st.session_state.answers['imc']}</b></span></div>", unsafe_allow_html=True)
+        imc = rules.evaluate(st.session_state.answers, "v0.6").imc  # memoizado: reruns não recalculam
+        if imc is not None:
+            st.markdown(f"<div class='card'>IMC estimado: <span class='badge'><b>{imc:.1f}</b></span></div>", unsafe_allow_html=True)
         st.info("Na consulta on-line, um médico vai revisar seus dados e, se tudo estiver adequado, definir a melhor estratégia de tratamento para o seu caso.")
         sched = os.environ.get("VIALEVE_SCHED_URL", "")
         if sched:
@@ -304,6 +179,7 @@ elif st.session_state.step == 5:
                     st.write(f"- {r}")
         st.info("Isso **não significa** que você não pode tratar. Nossa equipe pode orientar um plano seguro e personalizado para você.")
 
+    _t_consent = metrics.now()
     st.divider()
     st.subheader("Consentimento e autorização")
     with st.expander("Leia o termo completo", expanded=False):
@@ -322,24 +198,29 @@ elif st.session_state.step == 5:
     with st.form("consent"):
         c1, c2 = st.columns(2)
         with c1:
-            aceite_termo = st.checkbox("Li e **aceito** o Termo de Consentimento.", value=st.session_state.answers.get("aceite_termo", False))
-            autoriza_teleconsulta = st.checkbox("**Autorizo** a consulta on-line (telemedicina).", value=st.session_state.answers.get("autoriza_teleconsulta", False))
+            st.checkbox("Li e **aceito** o Termo de Consentimento.", value=st.session_state.answers.get("aceite_termo", False), key="w_aceite_termo")
+            st.checkbox("**Autorizo** a consulta on-line (telemedicina).", value=st.session_state.answers.get("autoriza_teleconsulta", False), key="w_autoriza_teleconsulta")
         with c2:
-            lgpd = st.checkbox("Autorizo o uso dos meus dados (LGPD).", value=st.session_state.answers.get("lgpd", False))
-            veracidade = st.checkbox("Confirmo que as informações são verdadeiras.", value=st.session_state.answers.get("veracidade", False))
-
-        st.session_state.answers.update({
-            "aceite_termo": aceite_termo, "autoriza_teleconsulta": autoriza_teleconsulta, "lgpd": lgpd, "veracidade": veracidade,
-        })
-        st.session_state.consent_ok = all([aceite_termo, autoriza_teleconsulta, lgpd, veracidade])
+            st.checkbox("Autorizo o uso dos meus dados (LGPD).", value=st.session_state.answers.get("lgpd", False), key="w_lgpd")
+            st.checkbox("Confirmo que as informações são verdadeiras.", value=st.session_state.answers.get("veracidade", False), key="w_veracidade")
 
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.form_submit_button("⬅️ Voltar", on_click=prev_step, use_container_width=True)
+            st.form_submit_button("⬅️ Voltar", on_click=nav, args=("back",), use_container_width=True)
         with col2:
-            st.form_submit_button("Reiniciar fluxo 🔄", on_click=reset_flow, use_container_width=True)
+            st.form_submit_button("Reiniciar fluxo 🔄", on_click=nav, args=("reset",), use_container_width=True)
         with col3:
-            st.download_button("Baixar minhas respostas (JSON)", data=str(st.session_state.answers), file_name="vialeve_respostas.json", mime="application/json", disabled=not st.session_state.consent_ok)
+            st.form_submit_button("Salvar consentimentos ✅", on_click=save_consents, use_container_width=True)
+
+    download_answers()
+    metrics.record("consent", "v0.6", _step, _t_consent)
+
+metrics.record("step", "v0.6", _step, _t_step)
 
 st.markdown("---")
-st.caption("ViaLeve • Protótipo v0.6 — PT-BR • Streamlit (Python)")
\ No newline at end of file
+st.caption("ViaLeve • Protótipo v0.6 — PT-BR • Streamlit (Python)")
+if os.environ.get("VIALEVE_DEBUG_RUNS"):
+    st.caption(f"execuções: {flow.run_stats(st.session_state)}")
+session.flush(st.session_state)
+metrics.record("rerun", "v0.6", _step, _t_rerun)
+deltas.end(_deltas)
@@ -0,0 +1 @@
+# ViaLeve — núcleo compartilhado pelos apps Streamlit (regras, lote, serviços).
@@ -0,0 +1,167 @@
+from collections.abc import MutableMapping
+from datetime import date
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from vialeve import rules
+
+# ------------------------------
+# Respostas compactas por sessão
+# ------------------------------
+# Answers guarda cada campo num slot (sem dict por instância). Campos
+# categóricos viram inteiros pequenos (índice na tabela de opções, ou máscara
+# de bits nas listas de múltipla escolha) e a data de nascimento vira ordinal;
+# o texto ("sim", rótulos, ISO) só é reconstruído na leitura, ou seja, na hora
+# de renderizar/gravar. A interface é a de um dict (get, [], update, items),
+# então rules, store e export continuam recebendo um Mapping.
+#
+# Valores fora da tabela (ex.: entrada da API) ficam como vieram.
+
+SIM_NAO = ("nao", "sim")
+GRAUS = ("normal", "leve", "moderada", "grave", "desconhecido")
+# Rótulos de todas as versões do app (o látex mudou de texto no v0.9).
+ALERGIAS = (
+    "Polietilenoglicol (PEG)", "Metacresol / Fenol", "Fosfatos (fosfato dissódico etc.)",
+    "Látex (agulhas/rolhas)", "Látex (camisinha/agulhas/rolhas)", "Carboximetilcelulose",
+    "Trometamina (TRIS)", rules.NENHUMA_ALERGIA,
+)
+MEDICACOES = ("Semaglutida", "Tirzepatida", "Liraglutida", "Orlistate", "Bupropiona/Naltrexona", "Outros")
+OBJETIVOS = ("Perda de peso", "Controle de comorbidades", "Manutenção do peso", "Manutenção")
+IDENTIDADES = ("Feminino", "Masculino", "Prefiro não informar", "feminino", "masculino", "prefiro não informar")
+
+
+class _Enum:
+    __slots__ = ("values", "index")
+
+    def __init__(self, values: Tuple[str, ...]):
+        self.values = values
+        self.index = {v: i for i, v in enumerate(values)}
+
+    def encode(self, v):
+        return self.index.get(v, v) if isinstance(v, str) else v
+
+    def decode(self, v):
+        return self.values[v] if type(v) is int else v
+
+
+class _Set:
+    __slots__ = ("values", "bit")
+
+    def __init__(self, values: Tuple[str, ...]):
+        self.values = values
+        self.bit = {v: 1 << i for i, v in enumerate(values)}
+
+    def encode(self, v):
+        if isinstance(v, (list, tuple)) and all(x in self.bit for x in v):
+            mask = 0
+            for x in v:
+                mask |= self.bit[x]
+            return mask
+        return v
+
+    def decode(self, v):
+        if type(v) is not int:
+            return v
+        return [x for i, x in enumerate(self.values) if v >> i & 1]
+
+
+class _Date:
+    __slots__ = ()
+
+    def encode(self, v):
+        if v == "":
+            return 0
+        if isinstance(v, date):
+            return v.toordinal()
+        try:
+            return date.fromisoformat(v).toordinal()
+        except (TypeError, ValueError):
+            return v
+
+    def decode(self, v):
+        if type(v) is not int:
+            return v
+        return date.fromordinal(v).isoformat() if v else ""
+
+
+_SIM = _Enum(SIM_NAO)
+CODECS: Dict[str, Any] = {
+    **{f: _SIM for f in rules.SIM_FIELDS + ("tem_comorbidades", "usou_antes")},
+    **{f: _Enum(GRAUS) for f in rules.GRAU_FIELDS},
+    "alergias_componentes": _Set(ALERGIAS),
+    "quais": _Set(MEDICACOES),
+    "objetivo": _Enum(OBJETIVOS),
+    "identidade": _Enum(IDENTIDADES),
+    "sexo": _Enum(IDENTIDADES),
+    "data_nascimento": _Date(),
+}
+# Campos guardados como vieram (números, texto livre, booleanos).
+PLAIN_FIELDS = (
+    "nome", "email", "idade", "idade_calculada", "peso", "altura", "imc", "comorbidades",
+    "outras_contra", "outros_componentes", "efeitos", "pronto_mudar",
+    "aceite_termo", "autoriza_teleconsulta", "lgpd", "veracidade", "_abertura_lida",
+)
+FIELDS = tuple(CODECS) + PLAIN_FIELDS
+
+
+class Answers(MutableMapping):
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, **kw):
+        if data:
+            self.update(data)
+        if kw:
+            self.update(kw)
+
+    def __getitem__(self, key: str):
+        codec = CODECS.get(key)
+        try:
+            v = getattr(self, key) if key in _SLOT_SET else self._extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+        return codec.decode(v) if codec else v
+
+    def __setitem__(self, key: str, value):
+        if key in _SLOT_SET:
+            codec = CODECS.get(key)
+            object.__setattr__(self, key, codec.encode(value) if codec else value)
+            return
+        try:
+            self._extra[key] = value
+        except AttributeError:
+            self._extra = {key: value}
+
+    def __delitem__(self, key: str):
+        try:
+            if key in _SLOT_SET:
+                object.__delattr__(self, key)
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        for f in FIELDS:
+            if hasattr(self, f):
+                yield f
+        yield from getattr(self, "_extra", ())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key) -> bool:
+        if key in _SLOT_SET:
+            return hasattr(self, key)
+        return key in getattr(self, "_extra", ())
+
+    def raw(self, key: str, default=None):
+        """Valor codificado (int/máscara) sem conversão para texto."""
+        return getattr(self, key, default) if key in _SLOT_SET else getattr(self, "_extra", {}).get(key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Answers({self.to_dict()!r})"
+
+
+_SLOT_SET = frozenset(FIELDS)
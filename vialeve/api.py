@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import os
+from datetime import date
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+
+from vialeve import rules
+
+# ------------------------------
+# API headless de pontuação (asyncio puro)
+# ------------------------------
+# Mesmo código de regras da UI (vialeve.rules), sem Streamlit. HTTP/1.1 com
+# keep-alive e pipelining; JSON de entrada e saída.
+#
+#   POST /v1/evaluate        {"answers": {...}, "version": "v0.9"}
+#   POST /v1/evaluate/batch  {"items": [{...}, ...], "version": "v0.9"}
+#   GET  /healthz
+#
+# Meta de vazão: >= 5.000 req/s de /v1/evaluate em um núcleo, com conexões
+# persistentes (medir com `python bench/api_bench.py`).
+
+MAX_HEADER = 16 * 1024
+MAX_BODY = 1024 * 1024
+MAX_BATCH = 1000
+KEEPALIVE_TIMEOUT = 75.0
+
+SIM_NAO = ("sim", "nao")
+GRAUS = ("normal", "leve", "moderada", "grave", "desconhecido")
+FAIXAS = {"peso": (30, 400), "altura": (1.30, 2.20)}
+
+
+def validate_answers(a: Any) -> Dict[str, str]:
+    if not isinstance(a, dict):
+        return {"answers": "deve ser um objeto JSON"}
+    erros: Dict[str, str] = {}
+    for f in rules.SIM_FIELDS + ("tem_comorbidades",):
+        v = a.get(f)
+        if v is not None and v not in SIM_NAO:
+            erros[f] = "use 'sim' ou 'nao'"
+    for f in rules.GRAU_FIELDS:
+        v = a.get(f)
+        if v is not None and v not in GRAUS:
+            erros[f] = f"use um de: {', '.join(GRAUS)}"
+    dob = a.get("data_nascimento")
+    if dob:
+        try:
+            if date.fromisoformat(dob) > date.today():
+                erros["data_nascimento"] = "data no futuro"
+        except (TypeError, ValueError):
+            erros["data_nascimento"] = "use o formato AAAA-MM-DD"
+    idade = a.get("idade")
+    if idade is not None and (isinstance(idade, bool) or not isinstance(idade, int)):
+        erros["idade"] = "deve ser inteiro"
+    for f, (lo, hi) in FAIXAS.items():
+        v = a.get(f)
+        if v is None:
+            continue
+        if isinstance(v, bool) or not isinstance(v, (int, float)):
+            erros[f] = "deve ser numérico"
+        elif not lo <= v <= hi:
+            erros[f] = f"fora da faixa {lo}–{hi}"
+    alergias = a.get("alergias_componentes")
+    if alergias is not None and (not isinstance(alergias, list) or not all(isinstance(x, str) for x in alergias)):
+        erros["alergias_componentes"] = "deve ser lista de textos"
+    return erros
+
+
+def score(a: Dict[str, Any], version: str) -> Dict[str, Any]:
+    # Memoizado por conteúdo: respostas repetidas (quase todas no padrão) não reavaliam regras.
+    ev = rules.evaluate(a, version)
+    rules.count_hits(ev.mask)
+    return {
+        "status": ev.status,
+        "reasons": rules.reasons_from_mask(ev.mask, version),
+        "reason_codes": rules.codes_from_mask(ev.mask),
+        "idade": ev.idade,
+        "imc": round(ev.imc, 1) if ev.imc is not None else None,
+        "version": version,
+    }
+
+
+def _version(body: Dict[str, Any]) -> Optional[str]:
+    v = body.get("version", rules.DEFAULT_VERSION)
+    return v if v in rules.VERSIONS else None
+
+
+def handle(method: str, path: str, raw: bytes) -> Tuple[int, Dict[str, Any]]:
+    if path == "/healthz":
+        return 200, {"ok": True, "versions": list(rules.VERSIONS), "evaluation_cache": rules.evaluation_stats()}
+    if path not in ("/v1/evaluate", "/v1/evaluate/batch"):
+        return 404, {"error": "rota não encontrada"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+    try:
+        body = json.loads(raw)
+    except (ValueError, RecursionError):  # UnicodeDecodeError é ValueError
+        return 400, {"error": "JSON inválido"}
+    if not isinstance(body, dict):
+        return 400, {"error": "corpo deve ser um objeto JSON"}
+    version = _version(body)
+    if version is None:
+        return 400, {"error": f"versão desconhecida (disponíveis: {', '.join(rules.VERSIONS)})"}
+
+    if path == "/v1/evaluate":
+        answers = body.get("answers", body)
+        erros = validate_answers(answers)
+        if erros:
+            return 400, {"error": "validação", "fields": erros}
+        return 200, score(answers, version)
+
+    items = body.get("items")
+    if not isinstance(items, list):
+        return 400, {"error": "'items' deve ser uma lista"}
+    if len(items) > MAX_BATCH:
+        return 413, {"error": f"máximo de {MAX_BATCH} itens por lote"}
+    erros_itens = {str(i): e for i, e in ((i, validate_answers(a)) for i, a in enumerate(items)) if e}
+    if erros_itens:
+        return 400, {"error": "validação", "items": erros_itens}
+    return 200, {"results": [score(a, version) for a in items]}
+
+
+def _response(status: int, payload: Dict[str, Any], keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class _HttpProtocol(asyncio.Protocol):
+    def __init__(self):
+        self._buf = bytearray()
+        self._transport: Optional[asyncio.Transport] = None
+        self._idle: Optional[asyncio.TimerHandle] = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._arm_idle()
+
+    def connection_lost(self, exc):
+        if self._idle:
+            self._idle.cancel()
+
+    def _arm_idle(self):
+        if self._idle:
+            self._idle.cancel()
+        self._idle = asyncio.get_running_loop().call_later(KEEPALIVE_TIMEOUT, self._transport.close)
+
+    def data_received(self, data: bytes):
+        self._buf += data
+        self._arm_idle()
+        # Pipelining: atende todas as requisições completas no buffer.
+        while self._transport and not self._transport.is_closing():
+            if not self._next_request():
+                break
+
+    def _fail(self, status: int, msg: str):
+        self._transport.write(_response(status, {"error": msg}, keep_alive=False))
+        self._transport.close()
+
+    def _next_request(self) -> bool:
+        end = self._buf.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self._buf) > MAX_HEADER:
+                self._fail(431, "cabeçalhos grandes demais")
+            return False
+        try:
+            lines = bytes(self._buf[:end]).decode("latin-1").split("\r\n")
+            method, path, proto = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                k, _, v = line.partition(":")
+                headers[k.strip().lower()] = v.strip()
+            length = int(headers.get("content-length", "0"))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self._fail(400, "requisição malformada")
+            return False
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            self._fail(411, "envie Content-Length")
+            return False
+        if length > MAX_BODY:
+            self._fail(413, "corpo grande demais")
+            return False
+        start = end + 4
+        if len(self._buf) < start + length:
+            return False
+        raw = bytes(self._buf[start:start + length])
+        del self._buf[:start + length]
+
+        conn = headers.get("connection", "").lower()
+        keep_alive = conn != "close" if proto == "HTTP/1.1" else conn == "keep-alive"
+        try:
+            status, payload = handle(method, path.split("?", 1)[0], raw)
+        except (RecursionError, ValueError):  # ex.: JSON aninhado fundo demais
+            status, payload = 400, {"error": "requisição inválida"}
+        except Exception:
+            import traceback  # adiado: só no caminho de erro
+
+            traceback.print_exc()
+            self._fail(500, "erro interno")
+            return False
+        self._transport.write(_response(status, payload, keep_alive))
+        if not keep_alive:
+            self._transport.close()
+            return False
+        return True
+
+
+async def start(host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+    """Abre o socket e devolve o servidor já aceitando conexões (port=0: porta livre)."""
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(_HttpProtocol, host, port, reuse_address=True, backlog=1024)
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080):
+    server = await start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="API headless de pré-elegibilidade ViaLeve")
+    p.add_argument("--host", default=os.environ.get("VIALEVE_API_HOST", "127.0.0.1"))
+    p.add_argument("--port", type=int, default=int(os.environ.get("VIALEVE_API_PORT", "8080")))
+    args = p.parse_args(argv)
+    print(f"ViaLeve API em http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+# ------------------------------
+# Assets do cabeçalho (logo SVG + CSS)
+# ------------------------------
+# Minifica uma vez por processo (cache compartilhado entre sessões, invalidado
+# pelo mtime do arquivo). O CSS vai num <style> e o logo num <img> com data
+# URI (montado uma vez por conteúdo). O app/static do Streamlit não serve
+# SVG/CSS com o MIME certo (só imagens raster, de propósito: proteção contra
+# XSS), e a lista dele não deve ser alterada.
+
+_cache: Dict[str, Tuple[float, int, str, str]] = {}
+_uris: Dict[str, str] = {}  # hash do SVG minificado -> data URI
+_lock = threading.Lock()
+
+_XML_DECL = re.compile(r"<\?xml[^>]*\?>")
+_COMMENT_SVG = re.compile(r"<!--.*?-->", re.S)
+_BETWEEN_TAGS = re.compile(r">\s+<")
+_COMMENT_CSS = re.compile(r"/\*.*?\*/", re.S)
+_CSS_PUNCT = re.compile(r"\s*([{}:;,>])\s*")
+
+
+def minify_svg(text: str) -> str:
+    text = _XML_DECL.sub("", text)
+    text = _COMMENT_SVG.sub("", text)
+    text = _BETWEEN_TAGS.sub("><", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def minify_css(text: str) -> str:
+    text = _COMMENT_CSS.sub("", text)
+    text = re.sub(r"\s+", " ", text)
+    text = _CSS_PUNCT.sub(r"\1", text)
+    return text.replace(";}", "}").strip()
+
+
+_MINIFIERS = {".svg": minify_svg, ".css": minify_css}
+
+
+def load(path: Path) -> Tuple[str, str]:
+    """(conteúdo minificado, hash curto) — relido só quando o arquivo muda."""
+    key = str(path)
+    st = os.stat(path)
+    hit = _cache.get(key)
+    if hit and hit[0] == st.st_mtime and hit[1] == st.st_size:
+        return hit[2], hit[3]
+    with _lock:
+        text = _MINIFIERS[path.suffix](path.read_text(encoding="utf-8"))
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        _cache[key] = (st.st_mtime, st.st_size, text, digest)
+    return text, digest
+
+
+def data_uri(path: Path) -> str:
+    """Logo como data URI: vai dentro de <img>, então o SVG não roda script na página."""
+    text, digest = load(path)
+    uri = _uris.get(digest)
+    if uri is None:
+        uri = _uris[digest] = "data:image/svg+xml;base64," + base64.b64encode(text.encode("utf-8")).decode("ascii")
+    return uri
+
+
+def header_html(app_dir: Path, css: str = "assets/app.css", logo: str = "assets/logo_horizontal.svg") -> str:
+    """Markup do cabeçalho (CSS + logo) para um único st.markdown por rerun."""
+    css_path, logo_path = app_dir / css, app_dir / logo
+    style = f"<style>{load(css_path)[0]}</style>"
+    if not logo_path.exists():
+        return style
+    return f"{style}<div class='logo-wrap'><img src='{data_uri(logo_path)}' alt='ViaLeve'></div>"
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vialeve import batch, rules, store
+
+# ------------------------------
+# Backtest de versões de regras sobre o histórico
+# ------------------------------
+# Reaplica as submissões gravadas em várias versões de regras e conta quem
+# muda de lado (excluido <-> potencialmente_elegivel), agrupado pelo motivo
+# que apareceu ou sumiu. O trabalho é dividido em faixas de rowid: cada
+# worker abre a própria conexão (só leitura), lê a sua faixa, avalia com
+# batch.evaluate_rules_batch e devolve apenas contadores — nada de linhas
+# atravessando processos, então milhões de registros cabem em memória fixa.
+#
+#   python -m vialeve.backtest --versions v0.4 v0.6 v0.9 --baseline v0.9 -w 8 -o diff.json
+#   python -m vialeve.backtest --versions stored v0.9      # contra o status gravado
+#
+# "stored" é uma pseudo-versão: o status/máscara que foi gravado na submissão.
+
+STORED = "stored"
+CHUNK = 50_000
+SAMPLE = 5  # ids de exemplo por tipo de mudança e par de versões
+
+FLIP_TO_ELEGIVEL = f"{rules.STATUS_EXCLUIDO}->{rules.STATUS_ELEGIVEL}"
+FLIP_TO_EXCLUIDO = f"{rules.STATUS_ELEGIVEL}->{rules.STATUS_EXCLUIDO}"
+
+
+def chunk_ranges(path: str, chunk: int = CHUNK) -> List[Tuple[int, int]]:
+    """Faixas (rowid_ini, rowid_fim] com até `chunk` rowids cada."""
+    conn = store.connect(path, readonly=True)
+    try:
+        lo, hi = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM submissions").fetchone()
+    finally:
+        conn.close()
+    if lo is None:
+        return []
+    return [(start, min(start + chunk, hi)) for start in range(lo - 1, hi, chunk)]
+
+
+def _text_diff_bits(a: str, b: str) -> int:
+    # Bits cujo texto de motivo muda entre as versões (ex.: MTC no v0.9).
+    if STORED in (a, b):
+        return 0
+    ta, tb = rules.REASON_TEXTS[a], rules.REASON_TEXTS[b]
+    return sum(1 << i for i, code in enumerate(rules.REASON_CODES) if ta[code] != tb[code])
+
+
+def _counts(masks: np.ndarray) -> Dict[str, int]:
+    return {k: v for k, v in batch.reason_counts(masks).items() if v}
+
+
+def _add(acc: Dict[str, Any], part: Dict[str, Any]):
+    # Soma recursiva de contadores; listas (amostras) são concatenadas até SAMPLE.
+    for k, v in part.items():
+        if isinstance(v, dict):
+            _add(acc.setdefault(k, {}), v)
+        elif isinstance(v, list):
+            cur = acc.setdefault(k, [])
+            cur.extend(v[: max(0, SAMPLE - len(cur))])
+        else:
+            acc[k] = acc.get(k, 0) + v
+
+
+def run_chunk(args: Tuple[str, int, int, Sequence[str], str, Optional[str]]) -> Dict[str, Any]:
+    path, lo, hi, versions, baseline, hoje_iso = args
+    hoje = date.fromisoformat(hoje_iso) if hoje_iso else None
+    conn = store.connect(path, readonly=True)
+    try:
+        rows = conn.execute(
+            "SELECT id, reason_mask, answers FROM submissions WHERE rowid > ? AND rowid <= ?", (lo, hi)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return {"records": 0}
+    ids = [r[0] for r in rows]
+    records = [json.loads(r[2]) for r in rows]
+    cols = batch.columns_from_records(records)
+    masks = {}
+    for v in versions:
+        if v == STORED:
+            masks[v] = np.fromiter((r[1] for r in rows), dtype=np.uint32, count=len(rows))
+        else:
+            masks[v] = batch.evaluate_rules_batch(cols, v, hoje)[1]
+
+    out: Dict[str, Any] = {"records": len(rows), "versions": {}, "pairs": {}}
+    for v, m in masks.items():
+        excl = int(np.count_nonzero(m))
+        out["versions"][v] = {rules.STATUS_EXCLUIDO: excl, rules.STATUS_ELEGIVEL: len(m) - excl, "reasons": _counts(m)}
+
+    base = masks[baseline]
+    for v in versions:
+        if v == baseline:
+            continue
+        other = masks[v]
+        to_elig = (base != 0) & (other == 0)
+        to_excl = (base == 0) & (other != 0)
+        same_status_diff = (base != 0) & (other != 0) & (base != other)
+        diff_bits = _text_diff_bits(baseline, v)
+        out["pairs"][f"{baseline}->{v}"] = {
+            "flips": {FLIP_TO_ELEGIVEL: int(to_elig.sum()), FLIP_TO_EXCLUIDO: int(to_excl.sum())},
+            # motivo que deixou de valer (-> elegível) / que passou a valer (-> excluído)
+            "by_reason": {FLIP_TO_ELEGIVEL: _counts(base[to_elig]), FLIP_TO_EXCLUIDO: _counts(other[to_excl])},
+            "reasons_changed_still_excluded": int(same_status_diff.sum()),
+            "reasons_added": _counts(other & ~base),
+            "reasons_removed": _counts(base & ~other),
+            "text_changed": int(np.count_nonzero(base & other & np.uint32(diff_bits))) if diff_bits else 0,
+            "samples": {
+                FLIP_TO_ELEGIVEL: [ids[i] for i in np.flatnonzero(to_elig)[:SAMPLE].tolist()],
+                FLIP_TO_EXCLUIDO: [ids[i] for i in np.flatnonzero(to_excl)[:SAMPLE].tolist()],
+            },
+        }
+    return out
+
+
+def backtest(
+    path: str = store.DEFAULT_PATH,
+    versions: Sequence[str] = rules.VERSIONS,
+    baseline: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk: int = CHUNK,
+    hoje: Optional[date] = None,
+) -> Dict[str, Any]:
+    versions = list(dict.fromkeys(versions))
+    for v in versions:
+        if v != STORED:
+            rules.check_version(v)
+    baseline = baseline or versions[0]
+    if baseline not in versions:
+        versions.insert(0, baseline)
+    t0 = time.perf_counter()
+    ranges = chunk_ranges(path, chunk)
+    tasks = [(path, lo, hi, tuple(versions), baseline, hoje.isoformat() if hoje else None) for lo, hi in ranges]
+    report: Dict[str, Any] = {"records": 0}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        for part in map(run_chunk, tasks):
+            _add(report, part)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+            for part in ex.map(run_chunk, tasks):
+                _add(report, part)
+    dt = time.perf_counter() - t0
+    report["meta"] = {
+        "db": path, "versions": versions, "baseline": baseline, "chunks": len(tasks), "chunk": chunk,
+        "workers": workers, "hoje": (hoje or date.today()).isoformat(), "seconds": round(dt, 3),
+        "records_per_s": round(report["records"] / dt) if dt else None,
+    }
+    report["reason_text_changes"] = {
+        code: {v: rules.REASON_TEXTS[v][code] for v in versions if v != STORED}
+        for code in rules.REASON_CODES
+        if len({rules.REASON_TEXTS[v][code] for v in versions if v != STORED}) > 1
+    }
+    return report
+
+
+def summary_lines(report: Dict[str, Any]) -> Iterator[str]:
+    yield f"{report['records']} submissões em {report['meta']['seconds']} s ({report['meta']['chunks']} blocos)"
+    for v, c in report.get("versions", {}).items():
+        yield f"  {v:7} excluídos {c[rules.STATUS_EXCLUIDO]:>9}  elegíveis {c[rules.STATUS_ELEGIVEL]:>9}"
+    for pair, p in report.get("pairs", {}).items():
+        f = p["flips"]
+        yield f"  {pair}: {f[FLIP_TO_ELEGIVEL]} passam a elegível, {f[FLIP_TO_EXCLUIDO]} passam a excluído"
+        for kind, by in p["by_reason"].items():
+            for code, n in sorted(by.items(), key=lambda kv: -kv[1]):
+                yield f"      {kind:40} {code:22} {n}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Reaplica as submissões gravadas em várias versões de regras e compara.")
+    p.add_argument("--db", default=store.DEFAULT_PATH)
+    p.add_argument("--versions", nargs="+", default=list(rules.VERSIONS), help=f"versões ({', '.join(rules.VERSIONS)} ou {STORED})")
+    p.add_argument("--baseline", help="versão de referência (padrão: a primeira)")
+    p.add_argument("-w", "--workers", type=int, help="processos (padrão: nº de CPUs)")
+    p.add_argument("--chunk", type=int, default=CHUNK, help="rowids por bloco de trabalho")
+    p.add_argument("--hoje", type=date.fromisoformat, help="data de referência para a idade (AAAA-MM-DD)")
+    p.add_argument("-o", "--output", help="relatório JSON ('-' = stdout)")
+    args = p.parse_args(argv)
+
+    try:
+        report = backtest(args.db, args.versions, args.baseline, args.workers, args.chunk, args.hoje)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    for line in summary_lines(report):
+        print(line, file=sys.stderr)
+    if args.output == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
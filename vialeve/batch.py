@@ -0,0 +1,238 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from vialeve.rules import (
+    ALERGIA_NENHUMA_CONTA,
+    DEFAULT_VERSION,
+    GRAU_FIELDS,
+    GRAUS_EXCLUSAO,
+    NENHUMA_ALERGIA,
+    REASON_BIT,
+    REASON_CODES,
+    SIM_FIELDS,
+    STATUS_ELEGIVEL,
+    STATUS_EXCLUIDO,
+    check_version,
+    reasons_from_mask,
+)
+
+# ------------------------------
+# Avaliação vetorizada (coortes inteiras)
+# ------------------------------
+# Mesmo resultado de evaluate_rules(), mas sobre colunas NumPy: cada critério
+# vira uma operação de array e o resultado de cada linha é uma máscara de bits
+# (bit i = REASON_CODES[i]), expandida em texto só quando alguém pede.
+
+# Coluna "alergias_componentes" normalizada: 0 = vazia, 1 = só "Não tenho alergia...", 2 = alguma alergia.
+ALERGIA_VAZIA, ALERGIA_NENHUMA, ALERGIA_RELATADA = 0, 1, 2
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_NAT = np.iinfo(np.int64).min
+
+Columns = Dict[str, np.ndarray]
+
+
+def _dob_ordinal(v: Any) -> int:
+    # Espelha o try/except de evaluate_rules: qualquer falha = sem data.
+    if not v:
+        return _NAT
+    try:
+        if isinstance(v, str):
+            v = date.fromisoformat(v)
+        if isinstance(v, datetime):
+            v = v.date()
+        if not isinstance(v, date):
+            return _NAT
+        return v.toordinal() - _EPOCH_ORDINAL
+    except Exception:
+        return _NAT
+
+
+def _to_float(v: Any) -> float:
+    # "if peso and altura" + float(...): valores vazios/zero/inválidos viram NaN.
+    if not v:
+        return np.nan
+    try:
+        return float(v)
+    except Exception:
+        return np.nan
+
+
+def _idade(v: Any) -> float:
+    if v is None or isinstance(v, str):
+        return np.nan
+    try:
+        return float(v)
+    except Exception:
+        return np.nan
+
+
+def _alergia(v: Any) -> int:
+    if not v:
+        return ALERGIA_VAZIA
+    if list(v) == [NENHUMA_ALERGIA]:
+        return ALERGIA_NENHUMA
+    return ALERGIA_RELATADA
+
+
+def _dob_column(values: Any) -> np.ndarray:
+    arr = np.asarray(values)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype("datetime64[D]")
+    return np.fromiter((_dob_ordinal(v) for v in arr.tolist()), dtype=np.int64, count=arr.size).view("datetime64[D]")
+
+
+def _float_column(values: Any, conv, zero_is_missing: bool = True) -> np.ndarray:
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iuf":
+        out = arr.astype(np.float64)
+        if zero_is_missing:
+            out[out == 0] = np.nan
+        return out
+    return np.fromiter((conv(v) for v in arr.tolist()), dtype=np.float64, count=arr.size)
+
+
+def _sim_column(values: Any) -> np.ndarray:
+    arr = np.asarray(values)
+    if arr.dtype == np.bool_:
+        return arr
+    return arr == "sim"
+
+
+def _grau_column(values: Any) -> np.ndarray:
+    arr = np.asarray(values)
+    if arr.dtype == np.bool_:
+        return arr
+    return np.isin(arr, GRAUS_EXCLUSAO)
+
+
+def _alergia_column(values: Any) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iu":
+        return values.astype(np.int8)
+    return np.fromiter((_alergia(v) for v in values), dtype=np.int8)
+
+
+def columns_from_records(records: Iterable[Mapping[str, Any]]) -> Columns:
+    """Converte (uma única vez) uma lista de respostas em colunas tipadas."""
+    recs = records if isinstance(records, list) else list(records)
+    n = len(recs)
+    cols: Columns = {
+        "data_nascimento": np.fromiter((_dob_ordinal(r.get("data_nascimento")) for r in recs), dtype=np.int64, count=n).view("datetime64[D]"),
+        "idade": np.fromiter((_idade(r.get("idade")) for r in recs), dtype=np.float64, count=n),
+        "peso": np.fromiter((_to_float(r.get("peso")) for r in recs), dtype=np.float64, count=n),
+        "altura": np.fromiter((_to_float(r.get("altura")) for r in recs), dtype=np.float64, count=n),
+        "sem_comorbidades": np.fromiter((r.get("tem_comorbidades") == "nao" for r in recs), dtype=np.bool_, count=n),
+        "alergias_componentes": np.fromiter((_alergia(r.get("alergias_componentes")) for r in recs), dtype=np.int8, count=n),
+    }
+    for f in SIM_FIELDS:
+        cols[f] = np.fromiter((r.get(f) == "sim" for r in recs), dtype=np.bool_, count=n)
+    for f in GRAU_FIELDS:
+        cols[f] = np.fromiter((r.get(f) in GRAUS_EXCLUSAO for r in recs), dtype=np.bool_, count=n)
+    return cols
+
+
+def normalize_columns(data: Mapping[str, Any]) -> Columns:
+    """Aceita colunas "cruas" (mesmas chaves de answers) e devolve colunas tipadas."""
+    n = len(next(iter(data.values()))) if data else 0
+
+    def col(key, default):
+        return data[key] if key in data else np.full(n, default, dtype=object)
+
+    cols: Columns = {
+        "data_nascimento": _dob_column(col("data_nascimento", None)),
+        "idade": _float_column(col("idade", None), _idade, zero_is_missing=False),
+        "peso": _float_column(col("peso", None), _to_float),
+        "altura": _float_column(col("altura", None), _to_float),
+        "alergias_componentes": _alergia_column(col("alergias_componentes", None)),
+    }
+    if "sem_comorbidades" in data:
+        cols["sem_comorbidades"] = np.asarray(data["sem_comorbidades"], dtype=np.bool_)
+    else:
+        cols["sem_comorbidades"] = np.asarray(col("tem_comorbidades", None)) == "nao"
+    for f in SIM_FIELDS:
+        cols[f] = _sim_column(col(f, None))
+    for f in GRAU_FIELDS:
+        cols[f] = _grau_column(col(f, None))
+    for k, v in cols.items():
+        if len(v) != n:
+            raise ValueError(f"Coluna {k!r} com {len(v)} linhas; esperado {n}.")
+    return cols
+
+
+def ages_from_dob(dob: np.ndarray, hoje: Optional[date] = None) -> np.ndarray:
+    """Idade em anos completos (float, NaN onde não há data) — mesma conta de calc_idade."""
+    hoje = hoje or date.today()
+    dob = dob.astype("datetime64[D]")
+    valid = ~np.isnat(dob)
+    ano = dob.astype("datetime64[Y]").astype(np.int64) + 1970
+    mes_ini = dob.astype("datetime64[M]")
+    mes = mes_ini.astype(np.int64) % 12 + 1
+    dia = (dob - mes_ini.astype("datetime64[D]")).astype(np.int64) + 1
+    antes_do_aniversario = (hoje.month * 100 + hoje.day) < (mes * 100 + dia)
+    idade = (hoje.year - ano - antes_do_aniversario).astype(np.float64)
+    idade[~valid] = np.nan
+    return idade
+
+
+def bmi(peso: np.ndarray, altura: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        imc = peso / (altura ** 2)
+    imc[~np.isfinite(imc)] = np.nan
+    return imc
+
+
+def evaluate_rules_batch(
+    data: Union[Columns, Mapping[str, Any], List[Mapping[str, Any]]],
+    version: str = DEFAULT_VERSION,
+    hoje: Optional[date] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Avalia uma coorte inteira.
+
+    `data` pode ser uma lista de dicts (como st.session_state.answers) ou um
+    dict de colunas. Devolve (status, motivos): status é um array de strings
+    ("excluido"/"potencialmente_elegivel") e motivos um uint32 por linha com
+    um bit por critério disparado (ver reasons_from_mask).
+    """
+    check_version(version)
+    if isinstance(data, list):
+        cols = columns_from_records(data)
+    else:
+        cols = normalize_columns(data)
+
+    idade_dob = ages_from_dob(cols["data_nascimento"], hoje)
+    idade = np.where(np.isnan(idade_dob), cols["idade"], idade_dob)
+
+    n = len(idade)
+    mask = np.zeros(n, dtype=np.uint32)
+
+    def hit(code: str, cond: np.ndarray):
+        mask[cond] |= np.uint32(1 << REASON_BIT[code])
+
+    hit("menor_18", idade < 18)
+    for f in SIM_FIELDS:
+        hit(f, cols[f])
+    for f in GRAU_FIELDS:
+        hit(f, cols[f])
+    alergias = cols["alergias_componentes"]
+    if ALERGIA_NENHUMA_CONTA[version]:
+        hit("alergias_componentes", alergias == ALERGIA_RELATADA)
+    else:
+        hit("alergias_componentes", alergias != ALERGIA_VAZIA)
+    hit("imc_baixo", (bmi(cols["peso"], cols["altura"]) < 27) & cols["sem_comorbidades"])
+
+    status = np.where(mask != 0, STATUS_EXCLUIDO, STATUS_ELEGIVEL)
+    return status, mask
+
+
+def explain_batch(masks: np.ndarray, version: str = DEFAULT_VERSION) -> List[List[str]]:
+    # Texto dos motivos por linha; máscaras repetidas são expandidas uma única vez.
+    uniq, inv = np.unique(masks, return_inverse=True)
+    textos = [reasons_from_mask(m, version) for m in uniq.tolist()]
+    return [textos[i] for i in inv.tolist()]
+
+
+def reason_counts(masks: np.ndarray) -> Dict[str, int]:
+    masks = np.asarray(masks, dtype=np.uint32)
+    return {code: int(np.count_nonzero(masks & np.uint32(1 << i))) for i, code in enumerate(REASON_CODES)}
@@ -0,0 +1,128 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from vialeve import metrics
+
+# ------------------------------
+# Mensagens enviadas ao navegador por rerun
+# ------------------------------
+# Cada elemento emitido pelo script (st.write, st.markdown, widget...) vira
+# uma ForwardMsg (delta) no websocket. begin() envolve o enqueue do contexto
+# do script da sessão (uma vez por sessão) e zera o contador; end() soma as
+# mensagens e os bytes (protobuf serializado) do rerun por (versão, etapa).
+# Reruns só de fragmento não passam por begin/end: o que eles enviam é
+# contado como run="fragment" na etapa em que estavam, no begin seguinte.
+#
+# Depende de um detalhe interno: ScriptRunContext._enqueue (campo do dataclass
+# no Streamlit 1.33, o fixado em requirements.txt). Se uma versão nova tirar o
+# campo, begin() devolve None e o app segue sem contar (tests/test_deltas.py
+# falha para avisar).
+#
+# Ligado junto com as métricas (VIALEVE_METRICS_FILE/PORT) ou com
+#   VIALEVE_DELTAS=1
+#
+# Séries (via metrics.register):
+#   vialeve_reruns_measured_total{run,step,version}
+#   vialeve_deltas_total{run,step,version}
+#   vialeve_delta_bytes_total{run,step,version}
+#   vialeve_delta_bytes_max{run,step,version}     maior rerun visto
+
+ENABLED = metrics.ENABLED or os.environ.get("VIALEVE_DELTAS", "") not in ("", "0")
+
+Key = Tuple[str, str, str]  # (run, step, version)
+
+_lock = threading.Lock()
+_totals: Dict[Key, List[int]] = {}  # [reruns, mensagens, bytes, maior rerun em bytes]
+
+
+class Counter:
+    """Mensagens/bytes do rerun em andamento (um por sessão, preso ao contexto do script)."""
+
+    __slots__ = ("msgs", "bytes", "version", "step")
+
+    def __init__(self):
+        self.msgs = self.bytes = 0
+        self.version, self.step = "", ""
+
+    def wrap(self, enqueue):
+        def counted(msg):
+            self.msgs += 1
+            self.bytes += msg.ByteSize()
+            enqueue(msg)
+
+        return counted
+
+
+def begin(version: str, step) -> Optional[Counter]:
+    """Início do rerun (antes do primeiro elemento); None se desligado ou fora do Streamlit."""
+    if not ENABLED:
+        return None
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    c = getattr(ctx, "_vialeve_deltas", None)
+    if c is None:
+        enqueue = getattr(ctx, "_enqueue", None)
+        if not callable(enqueue):
+            return None  # Streamlit sem o gancho: sem contagem
+        c = Counter()
+        try:
+            ctx._vialeve_deltas = c  # primeiro: se não der, _enqueue fica intacto
+            ctx._enqueue = c.wrap(enqueue)
+        except AttributeError:  # contexto congelado/com slots, _enqueue só leitura
+            if getattr(ctx, "_vialeve_deltas", None) is c:
+                del ctx._vialeve_deltas
+            return None
+    elif c.msgs:
+        _add(("fragment", c.step, c.version), c.msgs, c.bytes)
+    c.msgs = c.bytes = 0
+    c.version, c.step = version, str(step)
+    return c
+
+
+def end(c: Optional[Counter]) -> Optional[Tuple[int, int]]:
+    """Fecha o rerun: (mensagens, bytes) também somados às séries."""
+    if c is None:
+        return None
+    n, b = c.msgs, c.bytes
+    _add(("full", c.step, c.version), n, b)
+    c.msgs = c.bytes = 0
+    return n, b
+
+
+def _add(key: Key, n: int, b: int):
+    with _lock:
+        t = _totals.get(key)
+        if t is None:
+            t = _totals[key] = [0, 0, 0, 0]
+        t[0] += 1
+        t[1] += n
+        t[2] += b
+        t[3] = max(t[3], b)
+
+
+def stats() -> Dict[Key, Dict[str, int]]:
+    with _lock:
+        return {k: {"reruns": t[0], "msgs": t[1], "bytes": t[2], "max_bytes": t[3]} for k, t in _totals.items()}
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+
+
+def metric_lines() -> List[str]:
+    with _lock:
+        totals = sorted((k, list(t)) for k, t in _totals.items())
+    out = []
+    for i, (name, kind) in enumerate((("vialeve_reruns_measured_total", "counter"), ("vialeve_deltas_total", "counter"),
+                                      ("vialeve_delta_bytes_total", "counter"), ("vialeve_delta_bytes_max", "gauge"))):
+        out.append(f"# TYPE {name} {kind}")
+        out += [f'{name}{{run="{run}",step="{step}",version="{version}"}} {t[i]}' for (run, step, version), t in totals]
+    return out
+
+
+metrics.register(metric_lines)
@@ -0,0 +1,126 @@
+import hashlib
+import math
+import os
+import sys
+from typing import Any, List, Optional
+
+# ------------------------------
+# E-mail normalizado: chave de índice e filtro de Bloom
+# ------------------------------
+# A submissão guarda email_key = sha256(pepper + e-mail normalizado), 128 bits
+# em hex, numa coluna com índice B-tree: achar as submissões de uma pessoa
+# (duplicatas, pedido de exclusão LGPD) é uma busca no índice, não uma
+# varredura. O índice não guarda o e-mail em claro.
+#
+# Normalização: minúsculas, sem espaços; sem "+etiqueta" só nos provedores que
+# entregam usuario+x na caixa de usuario (_PLUS_TAGS; nos demais o "+" pode ser
+# outra caixa, e a chave fica exata); no Gmail, sem os pontos do usuário
+# (googlemail.com = gmail.com). Mudou a normalização => rode "reindex".
+#
+#   VIALEVE_EMAIL_PEPPER=...   segredo misturado ao hash (troque => rode "reindex")
+#
+#   python -m vialeve.emails find fulana@exemplo.com
+#   python -m vialeve.emails erase fulana@exemplo.com      # apaga todas as submissões dela (e as sessões salvas)
+#   python -m vialeve.emails reindex                        # recalcula email_key de todas as linhas
+
+PEPPER = os.environ.get("VIALEVE_EMAIL_PEPPER", "")
+_GMAIL = ("gmail.com", "googlemail.com")
+_PLUS_TAGS = frozenset((*_GMAIL, "outlook.com", "hotmail.com", "live.com", "icloud.com", "me.com",
+                        "proton.me", "protonmail.com", "fastmail.com"))
+
+
+def normalize_email(email: Any) -> Optional[str]:
+    if not isinstance(email, str):
+        return None
+    e = email.strip().casefold()
+    user, at, domain = e.rpartition("@")
+    if not at or not user or "." not in domain:
+        return None
+    if domain in _PLUS_TAGS:
+        user = user.split("+", 1)[0]
+    if domain in _GMAIL:
+        user, domain = user.replace(".", ""), "gmail.com"
+    return f"{user}@{domain}" if user else None
+
+
+def email_key(email: Any) -> Optional[str]:
+    e = normalize_email(email)
+    if e is None:
+        return None
+    return hashlib.sha256(f"{PEPPER}{e}".encode("utf-8")).hexdigest()[:32]
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre email_key (já é um hash: os índices saem dos bits dele).
+
+    "Não" é definitivo; "talvez" é confirmado no índice. Não remove itens:
+    depois de exclusões o filtro só fica mais pessimista até ser reconstruído.
+    """
+
+    __slots__ = ("capacity", "m", "k", "bits", "count")
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.m = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        h1, h2 = int(key[:16], 16), int(key[16:32], 16) | 1  # double hashing
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] >> (p & 7) & 1 for p in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # argparse/json só no CLI: este módulo está no caminho de import do store (startup do app).
+    import argparse
+    import json
+    import sqlite3
+
+    from vialeve import session, store
+
+    p = argparse.ArgumentParser(description="Índice de e-mail das submissões (duplicatas e exclusão LGPD).")
+    p.add_argument("--db", default=store.DEFAULT_PATH)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("find", help="lista as submissões de um e-mail").add_argument("email")
+    sub.add_parser("erase", help="apaga todas as submissões de um e-mail").add_argument("email")
+    sub.add_parser("reindex", help="recalcula email_key de todas as submissões")
+    args = p.parse_args(argv)
+
+    try:
+        if args.cmd == "reindex":
+            n = store.reindex_emails(args.db, force=True)
+            print(f"{n} submissões reindexadas.", file=sys.stderr)
+            return 0
+        if email_key(args.email) is None:
+            print(f"E-mail inválido: {args.email!r}", file=sys.stderr)
+            return 2
+        if args.cmd == "find":
+            for row in store.find_by_email(args.email, args.db):
+                print(json.dumps(row, ensure_ascii=False))
+            return 0
+        n = store.erase_email(args.email, args.db)
+        sessions = session.erase_email(args.email)
+    except sqlite3.OperationalError as e:
+        print(f"Erro no banco {args.db}: {e} (banco antigo? rode 'reindex')", file=sys.stderr)
+        return 1
+    print(f"{n} submissões apagadas, {sessions} sessões salvas apagadas.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from vialeve import metrics
+
+# ------------------------------
+# Trilha de navegação (JSON por linha, gravada em segundo plano)
+# ------------------------------
+# flow.navigate registra cada transição: avançar ("next"/"finish"), voltar
+# ("back"), reiniciar ("reset"), envio recusado pela validação ("invalid") e
+# a etapa em que a pessoa entrou ("enter"), com flow_id, versão e horário.
+# O rerun só põe uma tupla numa fila limitada (put_nowait: nunca espera);
+# uma thread esvazia a fila em lotes, serializa e grava com um write por lote,
+# girando o arquivo por tamanho (arquivo.1, arquivo.2, ...). Fila cheia =
+# evento descartado e contado em vialeve_events_dropped_total.
+#
+#   VIALEVE_EVENTS=0                  desliga
+#   VIALEVE_EVENTS_FILE=vialeve_events.jsonl
+#   VIALEVE_EVENTS_MAX_BYTES=10485760 tamanho para girar
+#   VIALEVE_EVENTS_BACKUPS=5          arquivos antigos mantidos
+#   VIALEVE_EVENTS_QUEUE=10000        eventos na fila antes de descartar
+#   VIALEVE_EVENTS_INTERVAL=1         segundos máximos entre gravações
+#
+# Linha: {"ts": "2026-10-17T12:00:00.123Z", "event": "back", "flow_id": "...", "version": "v0.9", "from": 3, "to": 2}
+# Sem respostas do questionário: só etapas e eventos.
+
+ENABLED = os.environ.get("VIALEVE_EVENTS", "1") not in ("", "0")
+PATH = os.environ.get("VIALEVE_EVENTS_FILE", "vialeve_events.jsonl")
+MAX_BYTES = int(os.environ.get("VIALEVE_EVENTS_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUPS = int(os.environ.get("VIALEVE_EVENTS_BACKUPS", "5"))
+QUEUE_SIZE = int(os.environ.get("VIALEVE_EVENTS_QUEUE", "10000"))
+FLUSH_INTERVAL = float(os.environ.get("VIALEVE_EVENTS_INTERVAL", "1"))
+BATCH = 512  # eventos por write
+
+
+class EventLog:
+    def __init__(self, path: str = PATH, max_bytes: int = MAX_BYTES, backups: int = BACKUPS,
+                 capacity: int = QUEUE_SIZE, interval: float = FLUSH_INTERVAL):
+        self.path, self.max_bytes, self.backups, self.interval = path, max_bytes, max(0, backups), interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+        self._q: "queue.Queue[tuple]" = queue.Queue(max(1, capacity))
+        self._lock = threading.Lock()  # dropped: somado por reruns e pela thread
+        self._stop = threading.Event()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="vialeve-eventlog-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, event: str, fields: Dict[str, Any]):
+        """Enfileira o evento (não bloqueia; descarta e conta se a fila estiver cheia)."""
+        try:
+            self._q.put_nowait((time.time(), event, fields))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    # --- thread de gravação ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._q.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain([first]))
+        self._write(self._drain([]))  # close(): o que sobrou na fila
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _drain(self, batch: List[tuple]) -> List[tuple]:
+        while len(batch) < BATCH:
+            try:
+                batch.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[tuple]):
+        if not batch:
+            return
+        lines = []
+        for ts, event, fields in batch:
+            stamp = datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+            lines.append(json.dumps({"ts": stamp, "event": event, **fields}, ensure_ascii=False, default=str))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        try:
+            f = self._open()
+            if f.tell() and f.tell() + len(data) > self.max_bytes:
+                f = self._rotate()
+            f.write(data)
+            f.flush()
+        except OSError:
+            # disco cheio / sem permissão: o lote se perde, o app segue
+            self.errors += 1
+            with self._lock:
+                self.dropped += len(batch)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return
+        self.written += len(batch)
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        return self._open()
+
+    def metric_lines(self) -> List[str]:
+        out = ["# TYPE vialeve_events_queue gauge", f"vialeve_events_queue {self._q.qsize()}"]
+        for k, v in (("written", self.written), ("dropped", self.dropped), ("errors", self.errors), ("rotations", self.rotations)):
+            out += [f"# TYPE vialeve_events_{k}_total counter", f"vialeve_events_{k}_total {v}"]
+        return out
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+_log: Optional[EventLog] = None
+_log_lock = threading.Lock()
+
+
+def get_log() -> Optional[EventLog]:
+    global _log
+    if not ENABLED:
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = EventLog()
+                metrics.register(_log.metric_lines)
+                atexit.register(_log.close)
+    return _log
+
+
+def log(event: str, **fields):
+    """Registra um evento da trilha (custo no rerun: um put_nowait)."""
+    el = get_log()
+    if el is not None:
+        el.log(event, fields)
@@ -0,0 +1,178 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from vialeve import rules, store
+
+# ------------------------------
+# Exportação em fluxo (NDJSON / CSV)
+# ------------------------------
+# Tudo é gerador: as linhas saem do cursor SQLite em lotes e vão direto para
+# o arquivo, então a memória não cresce com o tamanho do histórico.
+#
+#   python -m vialeve.export --format ndjson --since 2026-01-01 -o dump.ndjson.gz
+#   python -m vialeve.export --format csv --status excluido -o -
+
+FETCH_SIZE = 1000
+
+META_COLUMNS = ("id", "created_at", "updated_at", "app_version", "status", "reason_codes")
+# Campos de answers com coluna própria no CSV; o resto vai em "outros" (JSON).
+ANSWER_COLUMNS = (
+    "nome", "email", "data_nascimento", "idade", "identidade", "sexo",
+    "peso", "altura", "imc", "tem_comorbidades", "comorbidades",
+    "gravidez", "amamentando", "tratamento_cancer", "gi_grave", "gastroparesia",
+    "pancreatite_previa", "historico_mtc_men2", "colecistite_12m", "outras_contra",
+    "insuf_renal", "insuf_hepatica", "transtorno_alimentar", "uso_corticoide", "antipsicoticos",
+    "alergia_glp1", "alergias_componentes", "outros_componentes",
+    "usou_antes", "quais", "efeitos", "objetivo", "pronto_mudar",
+    "aceite_termo", "autoriza_teleconsulta", "lgpd", "veracidade",
+)
+CSV_COLUMNS = META_COLUMNS + ANSWER_COLUMNS + ("outros",)
+
+
+def utc_iso(value: str) -> str:
+    """Data ou data-hora ISO no formato de created_at (UTC, milissegundos, "+00:00").
+
+    Sem fuso = UTC; com fuso, convertida. "2026-01-01" vira "2026-01-01T00:00:00.000+00:00".
+    """
+    dt = datetime.fromisoformat(value)
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.isoformat(timespec="milliseconds")
+
+
+def answers_json(answers: Dict[str, Any]) -> str:
+    """JSON válido das respostas de um paciente (download individual)."""
+    clean = {k: v for k, v in answers.items() if not k.startswith("_")}
+    return json.dumps(clean, ensure_ascii=False, indent=2, default=str)
+
+
+def iter_submissions(
+    path: str = store.DEFAULT_PATH,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    # since/until em ISO (data ou data-hora; sem fuso = UTC); until é exclusivo.
+    # Comparados como texto com created_at, então normalizados para o mesmo formato.
+    where, params = [], []
+    if since:
+        where.append("created_at >= ?")
+        params.append(utc_iso(since))
+    if until:
+        where.append("created_at < ?")
+        params.append(utc_iso(until))
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    sql = "SELECT id, created_at, updated_at, app_version, status, reason_mask, answers FROM submissions"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at, id"
+
+    conn = store.connect(path, readonly=True)
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            chunk = cur.fetchmany(FETCH_SIZE)
+            if not chunk:
+                break
+            for sid, created, updated, version, st, mask, answers in chunk:
+                yield {
+                    "id": sid,
+                    "created_at": created,
+                    "updated_at": updated,
+                    "app_version": version,
+                    "status": st,
+                    "reason_codes": rules.codes_from_mask(mask),
+                    "answers": json.loads(answers),
+                }
+    finally:
+        conn.close()
+
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+def _cell(v: Any) -> Any:
+    if isinstance(v, list):
+        return "; ".join(str(x) for x in v)
+    return "" if v is None else v
+
+
+def csv_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+
+    def flush() -> str:
+        out = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return out
+
+    w.writerow(CSV_COLUMNS)
+    yield flush()
+    known = set(ANSWER_COLUMNS)
+    for row in rows:
+        a = row["answers"]
+        extras = {k: v for k, v in a.items() if k not in known}
+        w.writerow(
+            [_cell(row[c]) for c in META_COLUMNS]
+            + [_cell(a.get(c)) for c in ANSWER_COLUMNS]
+            + [json.dumps(extras, ensure_ascii=False, default=str) if extras else ""]
+        )
+        yield flush()
+
+
+def write(lines: Iterable[str], out: TextIO) -> int:
+    n = 0
+    for line in lines:
+        out.write(line)
+        n += 1
+    return n
+
+
+def _open_out(path: str) -> TextIO:
+    if path == "-":
+        return sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Exporta submissões ViaLeve em NDJSON ou CSV (fluxo contínuo).")
+    p.add_argument("--db", default=store.DEFAULT_PATH)
+    p.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    p.add_argument("--since", type=utc_iso, help="data/hora ISO inicial (inclusiva; sem fuso = UTC)")
+    p.add_argument("--until", type=utc_iso, help="data/hora ISO final (exclusiva; sem fuso = UTC)")
+    p.add_argument("--status", choices=(rules.STATUS_EXCLUIDO, rules.STATUS_ELEGIVEL))
+    p.add_argument("-o", "--output", default="-", help="arquivo de saída ('-' = stdout; .gz comprime)")
+    args = p.parse_args(argv)
+
+    rows = iter_submissions(args.db, args.since, args.until, args.status)
+    lines = ndjson_lines(rows) if args.format == "ndjson" else csv_lines(rows)
+    out = _open_out(args.output)
+    try:
+        n = write(lines, out)
+    except sqlite3.OperationalError as e:
+        print(f"Erro lendo {args.db}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.format == "csv":
+        n -= 1
+    print(f"{n} submissões exportadas.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+from typing import Any, Callable, Dict, MutableMapping, Optional
+
+# ------------------------------
+# Navegação entre etapas (máquina de estados)
+# ------------------------------
+# As transições rodam em callbacks (on_click) — antes do script renderizar —,
+# então cada clique custa exatamente uma execução do script, sem
+# st.experimental_rerun(). Os contadores provam isso: em uma sessão,
+# _runs - 1 (a carga inicial) deve ser igual a _clicks.
+#
+# Cada transição também vai para a trilha de navegação (vialeve/eventlog.py:
+# fila + thread de gravação, o callback não toca o disco).
+
+STEP_COUNT = 6
+LAST_STEP = STEP_COUNT - 1
+EVENTS = ("next", "back", "reset", "stay", "finish")
+
+# Chaves que sobrevivem a "reset" (instrumentação e vínculo com o backend de
+# sessão, não estado do fluxo).
+_KEEP_ON_RESET = ("_runs", "_clicks", "_sid", "_sess_sent")
+
+# Com VIALEVE_SHORT_CIRCUIT=1, uma exclusão já encontrada pela avaliação
+# incremental pula as etapas restantes (vai direto para a última).
+SHORT_CIRCUIT = os.environ.get("VIALEVE_SHORT_CIRCUIT", "") not in ("", "0")
+
+_totals: Dict[str, int] = {"runs": 0, "clicks": 0}
+
+
+def transition(step: int, event: str) -> int:
+    if event == "next":
+        return min(LAST_STEP, step + 1)
+    if event == "back":
+        return max(0, step - 1)
+    if event == "reset":
+        return 0
+    if event == "stay":
+        return step
+    if event == "finish":
+        return LAST_STEP
+    raise ValueError(f"Evento de navegação desconhecido: {event!r}")
+
+
+def count_run(ss: MutableMapping[str, Any]):
+    ss["_runs"] = ss.get("_runs", 0) + 1
+    _totals["runs"] += 1
+
+
+def count_click(ss: MutableMapping[str, Any]):
+    ss["_clicks"] = ss.get("_clicks", 0) + 1
+    _totals["clicks"] += 1
+
+
+def run_stats(ss: MutableMapping[str, Any]) -> Dict[str, Any]:
+    runs, clicks = ss.get("_runs", 0), ss.get("_clicks", 0)
+    return {
+        "runs": runs,
+        "clicks": clicks,
+        "runs_per_click": round((runs - 1) / clicks, 3) if clicks else None,
+        "process_runs": _totals["runs"],
+        "process_clicks": _totals["clicks"],
+    }
+
+
+def _log(ss: MutableMapping[str, Any], event: str, version: str, **fields):
+    from vialeve import eventlog  # adiado: mantém o import do flow leve (bench/import_budget.py)
+
+    eventlog.log(event, flow_id=ss.get("flow_id"), version=version, **fields)
+
+
+def navigate(
+    ss: MutableMapping[str, Any],
+    event: str,
+    commit: Optional[Callable[[], None]] = None,
+    validate: Optional[Callable[[], Optional[str]]] = None,
+    init: Optional[Callable[[], None]] = None,
+    advance: Optional[Callable[[], Optional[str]]] = None,
+    version: str = "",
+):
+    """Callback de navegação: grava o form, valida e muda de etapa.
+
+    advance roda só depois da validação e pode trocar o evento (ex.: "finish"
+    quando uma exclusão definitiva já encerra o fluxo).
+    """
+    count_click(ss)
+    step = ss.get("step", 0)
+    if commit:
+        commit()
+    if validate:
+        erro = validate()
+        if erro:
+            ss["nav_error"] = erro
+            _log(ss, "invalid", version, step=step, error=erro)
+            return
+    ss.pop("nav_error", None)
+    if event == "reset":
+        _log(ss, "reset", version, **{"from": step, "to": 0})
+        keep = {k: ss[k] for k in _KEEP_ON_RESET if k in ss}
+        for k in list(ss.keys()):
+            del ss[k]
+        ss.update(keep)
+        if init:
+            init()
+        _log(ss, "enter", version, step=ss.get("step", 0))  # flow_id novo
+        return
+    if advance:
+        event = advance() or event
+    to = ss["step"] = transition(step, event)
+    _log(ss, event, version, **{"from": step, "to": to})
+    if to != step:
+        _log(ss, "enter", version, step=to)
@@ -0,0 +1,204 @@
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from vialeve import rules
+from vialeve.questionnaire import DAYS, MONTHS, CompiledField, Form, dob_default, years
+
+# ------------------------------
+# Renderização do questionário (Streamlit)
+# ------------------------------
+# Emite os widgets de uma etapa a partir do Form compilado: opções, índices e
+# rótulos já vêm prontos, aqui só se escolhe o widget e o valor inicial.
+# Todo widget usa key "w_<campo>"; questionnaire.commit() copia para answers.
+#
+# Campos com prévia ao vivo (idade, IMC) e multi com opção exclusiva ficam
+# fora do form, num fragmento acima dele: mexer neles reroda só o fragmento
+# (widgets + prévia), não o script inteiro. O resto continua no form e não
+# reroda nada até o envio; o envio lê os dois grupos pelas keys.
+#
+# Com `client` ("idade" / "imc"), os campos da prévia vão para o componente
+# "previa" (components/previa/index.html) dentro do form: o navegador calcula
+# idade/IMC a cada tecla e as entradas só chegam com o envio — nem rerun nem
+# tráfego no websocket enquanto a pessoa digita. No envio, _client_commit
+# valida/limita as entradas e as grava nas keys de sempre (w_peso, w_ano...),
+# e o resto segue igual: commit -> regras recalculam tudo no servidor.
+#
+#   VIALEVE_CLIENT_PREVIEW=0      volta ao fragmento (prévia calculada no servidor)
+
+CLIENT_PREVIEW = os.environ.get("VIALEVE_CLIENT_PREVIEW", "1") not in ("", "0")
+_previa = components.declare_component("vialeve_previa", path=str(Path(__file__).parent / "components" / "previa"))
+
+
+def _number(f: CompiledField, v):
+    try:
+        return type(f.default)(v)
+    except (TypeError, ValueError):
+        return f.default
+
+
+def _widget(f: CompiledField, a, container):
+    kw = f.kwargs
+    if f.kind == "text":
+        return container.text_input(f.label, value=a.get(f.name, f.default), key=f.key, **kw)
+    if f.kind == "textarea":
+        return container.text_area(f.label, value=a.get(f.name, f.default), key=f.key, **kw)
+    if f.kind == "number":
+        return container.number_input(f.label, value=_number(f, a.get(f.name, f.default)), key=f.key, **kw)
+    if f.kind == "slider":
+        return container.slider(f.label, value=a.get(f.name, f.default), key=f.key, **kw)
+    if f.kind == "choice":
+        extra = {"horizontal": True} if f.widget == "radio" else {}
+        if f.format:
+            extra["format_func"] = f.format
+        w = container.radio if f.widget == "radio" else container.selectbox
+        return w(f.label, f.options, index=f.option_index(a.get(f.name)), key=f.key, **extra, **kw)
+    if f.kind == "multi":
+        if f.exclusive:  # só fora de form (fragmento): callbacks em form são proibidos
+            kw = {**kw, "on_change": _exclusive, "args": (f,)}
+        # Valor já trocado pelo callback: sem default, para não conflitar com o Session State.
+        default = None if f.key in st.session_state else rules.safe_multi(f.index, a.get(f.name))
+        return container.multiselect(f.label, options=f.options, default=default, key=f.key, **kw)
+    if f.kind == "date":
+        return container.date_input(f.label, value=dob_default(a), min_value=date(kw.get("first_year", 1900), 1, 1),
+                                    max_value=date.today(), format="DD/MM/YYYY", key=f.key)
+    if f.kind == "dmy":
+        d = dob_default(a)
+        anos, idx = years(kw.get("first_year", 1900), date.today().year)
+        c1, c2, c3 = container.columns([1, 1, 2])
+        c1.selectbox("Dia", DAYS, index=d.day - 1, key="w_dia")
+        c2.selectbox("Mês", MONTHS, index=d.month - 1, key="w_mes")
+        return c3.selectbox("Ano", anos, index=idx.get(d.year, len(anos) // 2), key="w_ano")
+    raise ValueError(f"Tipo de campo desconhecido: {f.kind!r}")
+
+
+def _exclusive(f: CompiledField):
+    # A última escolha vence: marcar a exclusiva limpa as demais, e vice-versa.
+    v = st.session_state[f.key]
+    if f.exclusive in v and len(v) > 1:
+        st.session_state[f.key] = [f.exclusive] if v[-1] == f.exclusive else [x for x in v if x != f.exclusive]
+
+
+@st.experimental_fragment
+def _live(fields: Tuple[CompiledField, ...], preview: Optional[Callable[[], None]]):
+    a = st.session_state.answers
+    cols = sorted({f.col for f in fields})
+    containers = st.columns(len(cols)) if len(cols) > 1 else [st]
+    for f in fields:
+        _widget(f, a, containers[cols.index(f.col)])
+    if preview:
+        preview()
+
+
+# ------------------------------
+# Componente "previa" (cálculo no navegador)
+# ------------------------------
+def _client_spec(fields: Tuple[CompiledField, ...], a, calc: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(args do componente, valor inicial) a partir das respostas atuais."""
+    specs, value = [], {}
+    for f in fields:
+        kw = f.kwargs
+        s: Dict[str, Any] = {"name": f.name, "kind": f.kind, "label": f.label}
+        if f.kind == "number":
+            s["value"] = _number(f, a.get(f.name, f.default))
+            s.update(min=kw.get("min_value"), max=kw.get("max_value"), step=kw.get("step", 1))
+        elif f.kind == "dmy":
+            d = dob_default(a)
+            s["value"] = [d.year, d.month, d.day]
+            s.update(days=DAYS, months=MONTHS, years=years(kw.get("first_year", 1900), date.today().year)[0])
+        elif f.kind == "date":
+            s["value"] = dob_default(a).isoformat()
+            s.update(min=date(kw.get("first_year", 1900), 1, 1).isoformat(), max=date.today().isoformat())
+        else:
+            raise ValueError(f"Campo {f.name!r} ({f.kind}) não cabe no componente de prévia")
+        specs.append(s)
+        value[f.name] = s["value"]
+    return {"calc": calc, "fields": specs}, value
+
+
+def _client_commit(fields: Tuple[CompiledField, ...], key: str, initial: Dict[str, Any]):
+    """Entradas do componente -> keys dos widgets (o navegador não é confiável: valida e limita).
+
+    Sem interação o componente não manda nada (None): valem os valores iniciais.
+    """
+    ss = st.session_state
+    v = ss.get(key)
+    if not isinstance(v, dict):
+        v = initial
+    for f in fields:
+        x = v.get(f.name)
+        if f.kind == "number":
+            lo, hi = f.kwargs.get("min_value"), f.kwargs.get("max_value")
+            x = _number(f, x if x is not None else ss.answers.get(f.name, f.default))
+            ss[f.key] = min(max(x, lo), hi) if lo is not None and hi is not None else x
+        elif f.kind == "dmy":
+            try:
+                ss["w_ano"], ss["w_mes"], ss["w_dia"] = (int(p) for p in x)
+            except (TypeError, ValueError):
+                ss["w_ano"] = ss["w_mes"] = ss["w_dia"] = None  # read_dob -> ERRO_DATA
+        else:
+            try:
+                ss[f.key] = date.fromisoformat(x)
+            except (TypeError, ValueError):
+                ss[f.key] = None
+
+
+def _client_submit(nav: Callable[..., None], step: int, fields: Tuple[CompiledField, ...], key: str, initial: Dict[str, Any]):
+    _client_commit(fields, key, initial)
+    nav("next", step)
+
+
+def render_step(
+    form: Form,
+    step: int,
+    nav: Callable[..., None],
+    extra: Optional[Callable[[], None]] = None,
+    title: Optional[Callable[[str], Any]] = st.subheader,
+    live: Sequence[str] = (),
+    client: Optional[str] = None,
+):
+    """Título, botão Voltar (se a versão tiver), form da etapa e botão de envio.
+
+    nav recebe ("next", step) no envio e ("back",) no Voltar. Os campos em
+    `live` (e multi com opção exclusiva) vão para o fragmento acima do form,
+    com `extra` como prévia (badges, cartão de IMC); sem eles, extra roda
+    dentro do form, depois dos campos. Com `client` (e CLIENT_PREVIEW), os
+    campos em `live` vão para o componente "previa" dentro do form, que
+    calcula `client` ("idade" / "imc") no navegador; `extra` não é usado.
+    """
+    s = form.steps[step]
+    a = st.session_state.answers
+    if title:
+        title(s.title)
+    if form.back_button:
+        st.button("⬅️ Voltar", on_click=nav, args=("back",), disabled=step == 0)
+    browser = tuple(f for f in s.fields if f.name in live) if client and CLIENT_PREVIEW else ()
+    if browser:
+        extra = None
+    frag = tuple(f for f in s.fields if (f.name in live or f.exclusive) and f not in browser)
+    if frag:
+        _live(frag, extra)
+        extra = None
+    with st.form(f"step{step}"):
+        key = f"w_previa_{step}"
+        if browser:
+            spec, value = _client_spec(browser, a, client)
+            _previa(spec=spec, default=value, key=key)
+        cols = st.columns(len(s.columns))
+        for col, fields in zip(cols, s.columns):
+            with col:
+                for f in fields:
+                    if f not in frag and f not in browser:
+                        _widget(f, a, st)
+        if extra:
+            extra()
+        submit: Dict[str, Any] = {"use_container_width": True} if form.wide else {}
+        if browser:
+            submit.update(on_click=_client_submit, args=(nav, step, browser, key, value))
+        else:
+            submit.update(on_click=nav, args=("next", step))
+        st.form_submit_button(s.submit, **submit)
@@ -0,0 +1,262 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple
+
+from vialeve import flow, rules, store
+
+# ------------------------------
+# Funil por etapa (contadores pré-agregados)
+# ------------------------------
+# Cada rerun compara a etapa atual com a última vista pelo fluxo (chave
+# "_funnel" da sessão) e, se mudou, soma contadores em memória: início,
+# chegada e conclusão por etapa, tempo na etapa e resultado final. Uma thread
+# grava os deltas a cada FLUSH_INTERVAL s com UPSERT (n = n + delta) numa
+# tabela por (dia, versão, métrica, etapa). O painel lê só essa tabela —
+# dezenas de linhas por dia —, sem varrer submissões.
+#
+#   VIALEVE_FUNNEL=0              desliga a coleta
+#   VIALEVE_FUNNEL_DB=...         banco dos contadores (padrão: o mesmo das submissões)
+#   VIALEVE_FUNNEL_INTERVAL=2     segundos entre gravações
+#
+#   streamlit run analytics.py    painel
+#   python -m vialeve.funnel --since 2026-10-01 --version v0.9
+
+ENABLED = os.environ.get("VIALEVE_FUNNEL", "1") not in ("", "0")
+DB_PATH = os.environ.get("VIALEVE_FUNNEL_DB", store.DEFAULT_PATH)
+FLUSH_INTERVAL = float(os.environ.get("VIALEVE_FUNNEL_INTERVAL", "2"))
+
+# métricas (coluna metric); "time" acumula segundos em `seconds` e saídas em `n`
+START, REACH, COMPLETE, TIME = "start", "reach", "complete", "time"
+RETURNING = "returning"  # e-mail já visto em outra submissão (etapa 0)
+RESULT = "result:"  # result:excluido / result:potencialmente_elegivel (etapa = flow.LAST_STEP)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS funnel_counts (
+    day     TEXT NOT NULL,
+    version TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    step    INTEGER NOT NULL,
+    n       INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (day, version, metric, step)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO funnel_counts (day, version, metric, step, n, seconds) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, version, metric, step) DO UPDATE SET
+    n = n + excluded.n,
+    seconds = seconds + excluded.seconds
+"""
+
+CounterKey = Tuple[str, str, str, int]  # (day, version, metric, step)
+
+
+class Counters:
+    """Deltas em memória + thread que os soma no banco."""
+
+    def __init__(self, path: str = DB_PATH, interval: float = FLUSH_INTERVAL):
+        self.path, self.interval = path, interval
+        self.flushes = 0
+        self.errors = 0
+        self._pending: Dict[CounterKey, List[float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        conn = store.connect(path)
+        conn.executescript(_SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._run, name="vialeve-funnel-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, version: str, metric: str, step: int, n: int = 1, seconds: float = 0.0):
+        key = (datetime.now(timezone.utc).date().isoformat(), version, metric, int(step))
+        with self._lock:
+            c = self._pending.get(key)
+            if c is None:
+                c = self._pending[key] = [0, 0.0]
+            c[0] += n
+            c[1] += seconds
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [(*k, int(n), s) for k, (n, s) in pending.items()]
+        try:
+            conn = store.connect(self.path)
+            try:
+                conn.execute("PRAGMA synchronous=NORMAL")  # contadores, não submissões
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(_UPSERT, rows)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        except Exception:
+            # devolve os deltas para a próxima tentativa (somando ao que chegou nesse meio-tempo)
+            self.errors += 1
+            with self._lock:
+                for k, (n, s) in pending.items():
+                    c = self._pending.setdefault(k, [0, 0.0])
+                    c[0] += n
+                    c[1] += s
+            return 0
+        self.flushes += 1
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+
+_counters: Optional[Counters] = None
+_counters_lock = threading.Lock()
+
+
+def get_counters() -> Optional[Counters]:
+    global _counters
+    if not ENABLED:
+        return None
+    if _counters is None:
+        with _counters_lock:
+            if _counters is None:
+                _counters = Counters()
+                atexit.register(_counters.close)
+    return _counters
+
+
+# ------------------------------
+# Coleta (chamada pelos apps a cada rerun)
+# ------------------------------
+def observe(ss: MutableMapping[str, Any], version: str, counters: Optional[Counters] = None):
+    """Registra a mudança de etapa desde o último rerun (custa uma comparação se não mudou).
+
+    ss["_funnel"] = [flow_id, etapa, entrada (epoch), etapas já alcançadas (bits), etapas já concluídas (bits)[, status]]
+
+    Chegada e conclusão contam uma vez por etapa e fluxo: voltar e reenviar não soma de novo.
+    """
+    c = counters or get_counters()
+    if c is None:
+        return
+    step, flow_id, t = ss.get("step", 0), ss.get("flow_id"), time.time()
+    f = ss.get("_funnel")
+    if f is None or f[0] != flow_id:
+        c.add(version, START, 0)
+        c.add(version, REACH, step)
+        ss["_funnel"] = [flow_id, step, t, 1 << step, 0]
+        return
+    prev = f[1]
+    if step == prev:
+        return
+    if len(f) < 5 or not isinstance(f[4], int):  # estado antigo (sessão compartilhada), sem os concluídos
+        f = [*f[:4], 0, *f[4:]]
+    c.add(version, TIME, prev, 1, max(0.0, t - f[2]))
+    seen, done = f[3], f[4]
+    if step > prev and not done >> prev & 1:
+        c.add(version, COMPLETE, prev)
+        done |= 1 << prev
+    if not seen >> step & 1:
+        c.add(version, REACH, step)
+        seen |= 1 << step
+    ss["_funnel"] = [flow_id, step, t, seen, done, *f[5:]]
+
+
+def result(ss: MutableMapping[str, Any], version: str, status: str, counters: Optional[Counters] = None):
+    """Resultado do fluxo; conta uma vez por fluxo (reconfirmar não soma)."""
+    c = counters or get_counters()
+    f = ss.get("_funnel")
+    if c is None or f is None or len(f) > 5:
+        return
+    c.add(version, RESULT + status, flow.LAST_STEP)
+    ss["_funnel"] = [*f, status]
+
+
+def returning(ss: MutableMapping[str, Any], version: str, counters: Optional[Counters] = None):
+    """Fluxo de alguém que já respondeu antes (mesmo e-mail); conta uma vez por fluxo."""
+    c = counters or get_counters()
+    f = ss.get("_funnel")
+    flag = 1 << flow.STEP_COUNT  # bit acima das etapas na máscara de alcançadas
+    if c is None or f is None or f[3] & flag:
+        return
+    c.add(version, RETURNING, 0)
+    ss["_funnel"] = [*f[:3], f[3] | flag, *f[4:]]
+
+
+# ------------------------------
+# Leitura (painel / CLI)
+# ------------------------------
+def report(
+    path: str = DB_PATH,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    version: Optional[str] = None,
+    steps: int = flow.STEP_COUNT,
+) -> Dict[str, Any]:
+    """Soma os contadores do período: por etapa, chegadas, conclusões, abandono e tempo médio."""
+    sql = "SELECT metric, step, SUM(n), SUM(seconds) FROM funnel_counts WHERE day >= ? AND day <= ?"
+    args: List[Any] = [(since or date.min).isoformat(), (until or date.max).isoformat()]
+    if version:
+        sql += " AND version = ?"
+        args.append(version)
+    try:
+        conn = store.connect(path, readonly=True)
+        try:
+            rows = conn.execute(sql + " GROUP BY metric, step", args).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:  # banco/tabela ainda não criados
+        rows = []
+    agg: Dict[Tuple[str, int], Tuple[int, float]] = {(m, s): (n, sec) for m, s, n, sec in rows}
+
+    def n(metric: str, step: int) -> int:
+        return agg.get((metric, step), (0, 0.0))[0]
+
+    results = {m[len(RESULT):]: v[0] for (m, _), v in agg.items() if m.startswith(RESULT)}
+    confirmados = sum(results.values())
+    out_steps = []
+    for s in range(steps):
+        # a última etapa se conclui com o resultado (confirmação / tela final)
+        reached, done = n(REACH, s), (n(COMPLETE, s) if s < steps - 1 else confirmados)
+        exits, secs = agg.get((TIME, s), (0, 0.0))
+        out_steps.append({
+            "step": s, "reached": reached, "completed": done,
+            "dropoff": max(0, reached - done),
+            "dropoff_rate": round(1 - done / reached, 4) if reached else None,
+            "avg_seconds": round(secs / exits, 1) if exits else None,
+        })
+    return {
+        "starts": n(START, 0),
+        "returning": n(RETURNING, 0),
+        "steps": out_steps,
+        "results": results,
+        "eligibility_ratio": round(results.get(rules.STATUS_ELEGIVEL, 0) / confirmados, 4) if confirmados else None,
+        "completion_rate": round(confirmados / n(START, 0), 4) if n(START, 0) else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Funil por etapa a partir dos contadores pré-agregados.")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--since", type=date.fromisoformat, help="AAAA-MM-DD (inclusivo, UTC)")
+    p.add_argument("--until", type=date.fromisoformat, help="AAAA-MM-DD (inclusivo, UTC)")
+    p.add_argument("--version")
+    args = p.parse_args(argv)
+    json.dump(report(args.db, args.since, args.until, args.version), sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# ------------------------------
+# Métricas de execução (formato de texto do Prometheus)
+# ------------------------------
+# Desligado por padrão: now() devolve 0 e record()/timer() saem na primeira
+# linha, então o custo por rerun é uma comparação. Liga com:
+#
+#   VIALEVE_METRICS_FILE=/tmp/vialeve.prom   arquivo reescrito a cada 5 s (textfile collector)
+#   VIALEVE_METRICS_PORT=9464                endpoint GET /metrics em thread própria
+#
+# Séries:
+#   vialeve_section_seconds{section,step,version}     histograma (seções: step, evaluate_rules, consent, rerun)
+#   vialeve_rerun_seconds{step,version,quantile}      p50/p95/p99 das últimas RESERVOIR execuções
+#   vialeve_reruns_total{version} / vialeve_reruns_per_second{version} (janela de RATE_WINDOW s)
+#
+# Outros módulos acrescentam séries com register(fn): fn() devolve linhas já
+# no formato de texto (ex.: vialeve_outbox_* do outbox).
+
+METRICS_FILE = os.environ.get("VIALEVE_METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("VIALEVE_METRICS_PORT", "0") or 0)
+FLUSH_INTERVAL = float(os.environ.get("VIALEVE_METRICS_INTERVAL", "5"))
+ENABLED = bool(METRICS_FILE or METRICS_PORT)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR = 2048
+RATE_WINDOW = 60.0
+
+Key = Tuple[str, str, str]  # (section, step, version)
+
+_lock = threading.Lock()
+_hist: Dict[Key, List[float]] = {}  # [contagens por bucket..., +Inf, soma]
+_samples: Dict[Tuple[str, str], Deque[float]] = {}
+_reruns: Dict[str, int] = {}
+_rerun_times: Dict[str, Deque[float]] = {}
+_collectors: List[Callable[[], List[str]]] = []
+_last_flush = 0.0
+_server_started = False
+
+
+def now() -> float:
+    return time.perf_counter() if ENABLED else 0.0
+
+
+def record(section: str, version: str, step, t0: float):
+    """Registra a duração desde t0 (de now()); sem efeito se desligado."""
+    if not ENABLED:
+        return
+    observe(section, version, step, time.perf_counter() - t0)
+
+
+def observe(section: str, version: str, step, seconds: float):
+    key = (section, str(step), version)
+    with _lock:
+        h = _hist.get(key)
+        if h is None:
+            h = _hist[key] = [0.0] * (len(BUCKETS) + 2)
+        h[bisect.bisect_left(BUCKETS, seconds)] += 1
+        h[-1] += seconds
+        if section == "rerun":
+            s = _samples.get(key[1:])
+            if s is None:
+                s = _samples[key[1:]] = deque(maxlen=RESERVOIR)
+            s.append(seconds)
+            _reruns[version] = _reruns.get(version, 0) + 1
+            _rerun_times.setdefault(version, deque(maxlen=100_000)).append(time.monotonic())
+    if section == "rerun":
+        _maybe_flush()
+        _maybe_serve()
+
+
+class timer:
+    """with metrics.timer("evaluate_rules", "v0.9", 5): ..."""
+
+    __slots__ = ("section", "version", "step", "t0")
+
+    def __init__(self, section: str, version: str, step=""):
+        self.section, self.version, self.step = section, version, step
+
+    def __enter__(self):
+        self.t0 = now()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.section, self.version, self.step, self.t0)
+        return False
+
+
+def _quantile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def _labels(**kw) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in kw.items()) + "}"
+
+
+def render() -> str:
+    out = [
+        "# HELP vialeve_section_seconds Duração das seções do script por etapa.",
+        "# TYPE vialeve_section_seconds histogram",
+    ]
+    with _lock:
+        hist = {k: list(v) for k, v in _hist.items()}
+        samples = {k: sorted(v) for k, v in _samples.items()}
+        reruns = dict(_reruns)
+        t_now = time.monotonic()
+        rates = {v: sum(1 for t in ts if t_now - t <= RATE_WINDOW) / RATE_WINDOW for v, ts in _rerun_times.items()}
+    for (section, step, version), h in sorted(hist.items()):
+        acc = 0.0
+        for le, n in zip(BUCKETS + ("+Inf",), h[:-1]):
+            acc += n
+            out.append(f"vialeve_section_seconds_bucket{_labels(section=section, step=step, version=version, le=le)} {int(acc)}")
+        lab = _labels(section=section, step=step, version=version)
+        out.append(f"vialeve_section_seconds_sum{lab} {h[-1]:.6f}")
+        out.append(f"vialeve_section_seconds_count{lab} {int(acc)}")
+
+    out += ["# HELP vialeve_rerun_seconds Latência do rerun completo (janela deslizante).", "# TYPE vialeve_rerun_seconds summary"]
+    for (step, version), vals in sorted(samples.items()):
+        for q in QUANTILES:
+            out.append(f"vialeve_rerun_seconds{_labels(step=step, version=version, quantile=q)} {_quantile(vals, q):.6f}")
+        lab = _labels(step=step, version=version)
+        out.append(f"vialeve_rerun_seconds_sum{lab} {sum(vals):.6f}")
+        out.append(f"vialeve_rerun_seconds_count{lab} {len(vals)}")
+
+    out += ["# TYPE vialeve_reruns_total counter"]
+    out += [f"vialeve_reruns_total{_labels(version=v)} {n}" for v, n in sorted(reruns.items())]
+    out += ["# TYPE vialeve_reruns_per_second gauge"]
+    out += [f"vialeve_reruns_per_second{_labels(version=v)} {r:.3f}" for v, r in sorted(rates.items())]
+    for fn in list(_collectors):
+        try:
+            out += fn()
+        except Exception:
+            pass
+    return "\n".join(out) + "\n"
+
+
+def register(fn: Callable[[], List[str]]):
+    if fn not in _collectors:
+        _collectors.append(fn)
+
+
+def write(path: str = METRICS_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def _maybe_flush():
+    global _last_flush
+    if not METRICS_FILE:
+        return
+    t = time.monotonic()
+    if t - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = t
+    try:
+        write(METRICS_FILE)
+    except OSError:
+        pass
+
+
+def _handler():
+    # http.server (e email/ssl por tabela) só é importado se houver porta configurada.
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return _Handler
+
+
+def _maybe_serve():
+    # Um servidor por processo, iniciado no primeiro rerun medido.
+    global _server_started
+    if not METRICS_PORT or _server_started:
+        return
+    with _lock:
+        if _server_started:
+            return
+        _server_started = True
+    from http.server import ThreadingHTTPServer
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), _handler())
+    except OSError:
+        return
+    threading.Thread(target=server.serve_forever, name="vialeve-metrics", daemon=True).start()
+
+
+def reset():
+    with _lock:
+        _hist.clear()
+        _samples.clear()
+        _reruns.clear()
+        _rerun_times.clear()
@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import ssl
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from vialeve import metrics, rules, store
+
+# ------------------------------
+# Outbox: entrega das submissões confirmadas ao sistema da clínica
+# ------------------------------
+# O store grava a submissão e a entrada do outbox na mesma transação (só com o
+# consentimento LGPD nas respostas); aqui um worker asyncio (thread própria,
+# fora do rerun do Streamlit) reserva lotes com lease, lê as submissões e faz
+# POST em conexões HTTP/1.1 persistentes.
+#
+#   2xx                      -> entregue (linha sai do outbox)
+#   408/425/429/5xx, rede    -> nova tentativa com backoff exponencial + jitter (Retry-After vale)
+#   outros 4xx, MAX_ATTEMPTS -> dead-letter (dead = 1, fica para inspeção/--requeue-dead)
+#   banco ocupado/travado    -> conta em vialeve_outbox_db_errors_total e tenta de novo após POLL
+#                               (o que estava reservado volta quando o lease vence)
+#
+# Entrega "pelo menos uma vez": cada item leva id + digest e o lote leva
+# Idempotency-Key, para a clínica descartar repetições. O lease deixa vários
+# processos (réplicas ou o worker avulso) dividirem a fila sem pegar o mesmo lote.
+#
+#   VIALEVE_OUTBOX_URL=https://clinica.exemplo/api/v1/triagens   liga o outbox
+#   VIALEVE_OUTBOX_TOKEN=...                                      Authorization: Bearer
+#   VIALEVE_OUTBOX_WORKER=0                                       não entrega no processo do app
+#
+#   python -m vialeve.outbox                 worker avulso (para de ler com Ctrl+C)
+#   python -m vialeve.outbox --once          entrega o que estiver pendente e sai
+#   python -m vialeve.outbox --stats | --requeue-dead
+
+TOKEN = os.environ.get("VIALEVE_OUTBOX_TOKEN", "")
+IN_APP_WORKER = os.environ.get("VIALEVE_OUTBOX_WORKER", "1") not in ("", "0")
+
+BATCH = 50
+CONCURRENCY = 4  # lotes em voo (= conexões no pool)
+MAX_ATTEMPTS = 8
+BASE_DELAY = 1.0
+MAX_DELAY = 300.0
+LEASE = 60.0
+POLL = 1.0
+TIMEOUT = 10.0
+RETRYABLE = {408, 425, 429}
+
+
+def backoff(attempts: int, base: float = BASE_DELAY, cap: float = MAX_DELAY) -> float:
+    """Exponencial com jitter "cheio" (0.5–1 × base·2^n, até cap)."""
+    d = min(cap, base * 2 ** max(0, attempts - 1))
+    return d * random.uniform(0.5, 1.0)
+
+
+class HttpError(Exception):
+    pass
+
+
+# ------------------------------
+# Pool de conexões HTTP/1.1 (asyncio puro, como a API)
+# ------------------------------
+class HttpPool:
+    def __init__(self, url: str, size: int = CONCURRENCY, timeout: float = TIMEOUT):
+        u = urlsplit(url)
+        if u.scheme not in ("http", "https") or not u.hostname:
+            raise ValueError(f"URL inválida para o outbox: {url!r}")
+        self.host = u.hostname
+        self.port = u.port or (443 if u.scheme == "https" else 80)
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.ssl = ssl.create_default_context() if u.scheme == "https" else None
+        self.timeout = timeout
+        self.opened = 0
+        self._sem = asyncio.Semaphore(size)
+        self._idle: Deque[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = deque()
+
+    async def post(self, body: bytes, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        async with self._sem:
+            if self._idle:
+                conn = self._idle.pop()
+                try:
+                    return self._keep(conn, await asyncio.wait_for(self._exchange(conn, body, headers), self.timeout))
+                except asyncio.TimeoutError as e:
+                    conn[1].close()
+                    raise HttpError(f"TimeoutError: {e}") from e
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    conn[1].close()  # conexão ociosa fechada pelo servidor: uma nova tentativa numa conexão nova
+            try:
+                conn = await self._open()
+                try:
+                    return self._keep(conn, await asyncio.wait_for(self._exchange(conn, body, headers), self.timeout))
+                except BaseException:
+                    conn[1].close()
+                    raise
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                raise HttpError(f"{type(e).__name__}: {e}") from e
+
+    def _keep(self, conn, resp):
+        if resp[1].get("connection", "").lower() == "close":
+            conn[1].close()
+        else:
+            self._idle.append(conn)
+        return resp
+
+    async def _open(self):
+        conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        self.opened += 1
+        return conn
+
+    async def _exchange(self, conn, body: bytes, headers: Dict[str, str]):
+        reader, writer = conn
+        head = f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+        lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        hdrs = {}
+        for line in lines[1:]:
+            k, _, v = line.partition(":")
+            if k:
+                hdrs[k.strip().lower()] = v.strip()
+        if "chunked" in hdrs.get("transfer-encoding", "").lower():
+            data = b""
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await reader.readexactly(int(hdrs.get("content-length", "0")))
+        return status, hdrs, data
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+# ------------------------------
+# Fila no SQLite (reserva com lease, ack, retry, dead-letter)
+# ------------------------------
+_CLAIM = """
+UPDATE outbox SET lease_until = :until
+WHERE seq IN (
+    SELECT seq FROM outbox
+    WHERE dead = 0 AND next_attempt_at <= :now AND lease_until <= :now
+    ORDER BY seq LIMIT :n
+)
+RETURNING seq, submission_id, digest, attempts
+"""
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: str = store.DEFAULT_PATH,
+        url: str = store.OUTBOX_URL,
+        batch: int = BATCH,
+        concurrency: int = CONCURRENCY,
+        max_attempts: int = MAX_ATTEMPTS,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        lease: float = LEASE,
+        poll: float = POLL,
+        timeout: float = TIMEOUT,
+        token: str = TOKEN,
+    ):
+        self.path, self.url = path, url
+        self.batch, self.concurrency = batch, concurrency
+        self.max_attempts, self.base_delay, self.max_delay = max_attempts, base_delay, max_delay
+        self.lease, self.poll, self.timeout, self.token = lease, poll, timeout, token
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.batches = 0
+        self.db_errors = 0
+        self.in_flight = 0
+        self.last_latency = 0.0
+        self._conn = store.connect(path)
+        self._conn.executescript(store._OUTBOX_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- banco (chamado via to_thread) ----
+    def _claim(self) -> List[Tuple[int, str, str, int, Optional[Dict[str, Any]]]]:
+        now = time.time()
+        with self._db_lock:
+            rows = self._conn.execute(_CLAIM, {"until": now + self.lease, "now": now, "n": self.batch}).fetchall()
+            if not rows:
+                return []
+            ids = list({r[1] for r in rows})
+            subs = {
+                r[0]: r for r in self._conn.execute(
+                    f"SELECT id, created_at, updated_at, app_version, status, reason_mask, digest, answers FROM submissions WHERE id IN ({','.join('?' * len(ids))})",
+                    ids,
+                )
+            }
+        out = []
+        for seq, sid, digest, attempts in sorted(rows):
+            s = subs.get(sid)
+            item = None
+            answers = json.loads(s[7]) if s is not None else {}
+            if answers.get("lgpd"):  # sem consentimento (ou apagada) não sai daqui
+                item = {
+                    "id": s[0], "digest": s[6], "created_at": s[1], "updated_at": s[2], "app_version": s[3],
+                    "status": s[4], "reason_codes": rules.codes_from_mask(s[5]), "answers": answers,
+                }
+            out.append((seq, sid, digest, attempts, item))
+        return out
+
+    def _ack(self, seqs: List[int]) -> int:
+        with self._db_lock:
+            self._conn.executemany("DELETE FROM outbox WHERE seq = ?", [(s,) for s in seqs])
+        return len(seqs)
+
+    def _fail(self, rows: List[Tuple[int, int]], error: str, permanent: bool, retry_after: Optional[float]) -> Tuple[int, int]:
+        # rows: (seq, tentativas já feitas). Devolve (reagendadas, mortas).
+        now, upd, dead = time.time(), [], []
+        for seq, attempts in rows:
+            n = attempts + 1
+            if permanent or n >= self.max_attempts:
+                dead.append((n, error, seq))
+            else:
+                delay = max(retry_after or 0.0, backoff(n, self.base_delay, self.max_delay))
+                upd.append((n, now + delay, error, seq))
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("UPDATE outbox SET attempts = ?, next_attempt_at = ?, lease_until = 0, last_error = ? WHERE seq = ?", upd)
+                self._conn.executemany("UPDATE outbox SET attempts = ?, dead = 1, lease_until = 0, last_error = ? WHERE seq = ?", dead)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(upd), len(dead)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            pending, oldest = self._conn.execute("SELECT COUNT(*), MIN(created_at) FROM outbox WHERE dead = 0").fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+        return {
+            "pending": pending, "dead_letter": dead, "oldest_pending_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "in_flight": self.in_flight, "delivered_total": self.delivered, "retries_total": self.retried,
+            "dead_total": self.dead, "batches_total": self.batches, "db_errors_total": self.db_errors,
+            "last_batch_seconds": round(self.last_latency, 4),
+        }
+
+    def requeue_dead(self) -> int:
+        with self._db_lock:
+            return self._conn.execute(
+                "UPDATE outbox SET dead = 0, attempts = 0, next_attempt_at = ?, last_error = NULL WHERE dead = 1", (time.time(),)
+            ).rowcount
+
+    def metric_lines(self) -> List[str]:
+        s = self.stats()
+        out = ["# TYPE vialeve_outbox_pending gauge", f"vialeve_outbox_pending {s['pending']}",
+               "# TYPE vialeve_outbox_dead_letter gauge", f"vialeve_outbox_dead_letter {s['dead_letter']}",
+               "# TYPE vialeve_outbox_oldest_pending_seconds gauge", f"vialeve_outbox_oldest_pending_seconds {s['oldest_pending_s']}",
+               "# TYPE vialeve_outbox_in_flight gauge", f"vialeve_outbox_in_flight {s['in_flight']}"]
+        for k in ("delivered_total", "retries_total", "dead_total", "batches_total", "db_errors_total"):
+            out += [f"# TYPE vialeve_outbox_{k} counter", f"vialeve_outbox_{k} {s[k]}"]
+        return out
+
+    # ---- entrega ----
+    async def _db(self, fn, *args):
+        # Banco ocupado/travado não derruba o worker: conta e devolve None.
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except sqlite3.OperationalError:
+            self.db_errors += 1
+            return None
+
+    async def _deliver(self, pool: HttpPool, claimed):
+        self.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            gone = [seq for seq, _, _, _, item in claimed if item is None]  # apagada ou sem consentimento LGPD
+            live = [(seq, att, item) for seq, _, _, att, item in claimed if item is not None]
+            if gone:
+                await self._db(self._ack, gone)
+            if not live:
+                return
+            body = json.dumps({"items": [i for _, _, i in live]}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            headers = {"Idempotency-Key": hashlib.sha256(b"|".join(f"{i['id']}:{i['digest']}".encode() for _, _, i in live)).hexdigest()}
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+            rows = [(seq, att) for seq, att, _ in live]
+            try:
+                status, hdrs, data = await pool.post(body, headers)
+            except HttpError as e:
+                await self._retry(rows, str(e), False, None)
+                return
+            if 200 <= status < 300:
+                # sem o ack, o lease vence e o lote é reenviado (mesma Idempotency-Key)
+                self.delivered += await self._db(self._ack, [seq for seq, _ in rows]) or 0
+                return
+            retry_after = None
+            try:
+                retry_after = float(hdrs.get("retry-after", ""))
+            except ValueError:
+                pass
+            permanent = status < 500 and status not in RETRYABLE
+            await self._retry(rows, f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}", permanent, retry_after)
+        finally:
+            self.in_flight -= 1
+            self.batches += 1
+            self.last_latency = time.perf_counter() - t0
+
+    async def _retry(self, rows, error: str, permanent: bool, retry_after: Optional[float]):
+        r = await self._db(self._fail, rows, error, permanent, retry_after)
+        if r is None:
+            return  # sem reagendar: as linhas voltam quando o lease vencer
+        retried, dead = r
+        self.retried += retried
+        self.dead += dead
+
+    async def run(self, once: bool = False):
+        """Laço principal. once=True: sai quando não houver nada vencido nem em voo."""
+        self._loop = asyncio.get_running_loop()
+        self._wake, self._stop = asyncio.Event(), asyncio.Event()
+        pool = HttpPool(self.url, self.concurrency, self.timeout)
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        try:
+            while not self._stop.is_set():
+                await slots.acquire()
+                claimed = await self._db(self._claim)
+                if claimed is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), self.poll)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if not claimed:
+                    slots.release()
+                    if once and not tasks:
+                        break
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), self.poll)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(self._deliver(pool, claimed))
+                tasks.add(task)
+
+                def done(t, tasks=tasks, slots=slots):
+                    tasks.discard(t)
+                    slots.release()
+
+                task.add_done_callback(done)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            pool.close()
+            self._loop = self._wake = self._stop = None
+
+    # ---- thread dedicada (processo do app) ----
+    def notify(self):
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None:
+            loop.call_soon_threadsafe(wake.set)
+
+    def start(self) -> "Outbox":
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="vialeve-outbox", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self, timeout: float = 5.0):
+        loop, stop = self._loop, self._stop
+        if loop is not None and stop is not None:
+            loop.call_soon_threadsafe(stop.set)
+            loop.call_soon_threadsafe(self._wake.set)
+        if self._thread:
+            self._thread.join(timeout)
+        with self._db_lock:
+            self._conn.close()
+
+
+_worker: Optional[Outbox] = None
+
+
+def start_for(s: "store.SubmissionStore") -> Optional[Outbox]:
+    """Worker no processo do app, acordado a cada commit que enfileira algo."""
+    global _worker
+    if not IN_APP_WORKER or _worker is not None:
+        return _worker
+    import atexit
+
+    _worker = Outbox(s.path).start()
+    s.on_outbox = _worker.notify
+    metrics.register(_worker.metric_lines)
+    atexit.register(_worker.close)
+    return _worker
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Entrega as submissões do outbox ao sistema da clínica.")
+    p.add_argument("--db", default=store.DEFAULT_PATH)
+    p.add_argument("--url", default=store.OUTBOX_URL)
+    p.add_argument("--batch", type=int, default=BATCH)
+    p.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY)
+    p.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    p.add_argument("--base-delay", type=float, default=BASE_DELAY, help="s (1ª nova tentativa)")
+    p.add_argument("--once", action="store_true", help="entrega o que estiver vencido e sai")
+    p.add_argument("--stats", action="store_true")
+    p.add_argument("--requeue-dead", action="store_true", help="devolve a dead-letter para a fila")
+    args = p.parse_args(argv)
+
+    if not (args.url or args.stats or args.requeue_dead):
+        print("Defina --url ou VIALEVE_OUTBOX_URL.", file=sys.stderr)
+        return 2
+    ob = Outbox(args.db, args.url or "http://localhost/", args.batch, args.concurrency, args.max_attempts, args.base_delay)
+    try:
+        if args.requeue_dead:
+            print(f"{ob.requeue_dead()} itens devolvidos à fila.", file=sys.stderr)
+        if not (args.stats or args.requeue_dead):
+            t0 = time.perf_counter()
+            try:
+                asyncio.run(ob.run(once=args.once))
+            except KeyboardInterrupt:
+                pass
+            print(f"{ob.delivered} entregues, {ob.retried} reagendados, {ob.dead} na dead-letter em {time.perf_counter() - t0:.2f} s", file=sys.stderr)
+        print(json.dumps(ob.stats(), ensure_ascii=False))
+    finally:
+        ob.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, MutableMapping, NamedTuple, Optional, Tuple
+
+from vialeve import rules
+
+# ------------------------------
+# Questionário declarativo
+# ------------------------------
+# Uma única definição do fluxo (etapas, campos, opções, códigos, padrões) para
+# os três apps; as diferenças de cada versão ficam em VARIANTS. compile_form()
+# roda uma vez por versão e devolve tuplas de opções prontas e dicionários
+# código -> índice / código -> rótulo, então o rerun não monta listas nem faz
+# .index() linear. A renderização (Streamlit) fica em vialeve/form.py.
+#
+# Tipos de campo:
+#   text / textarea   texto livre
+#   number / slider   número (args: min_value, max_value, step, ...)
+#   choice            uma opção (widget "selectbox" ou "radio"); o valor do widget já é o código
+#   multi             várias opções; `exclusive` descarta as demais se marcada junto
+#   date              st.date_input  -> data_nascimento (ISO)
+#   dmy               dia/mês/ano em três selectbox (w_dia, w_mes, w_ano) -> data_nascimento (ISO)
+
+SIM_NAO = ("nao", "sim")
+NAO_SIM_LABELS = ("Não", "Sim")
+GRAUS = ("normal", "leve", "moderada", "grave")
+MEDICACOES = ("Semaglutida", "Tirzepatida", "Liraglutida", "Orlistate", "Bupropiona/Naltrexona", "Outros")
+SEXOS = ("feminino", "masculino", "prefiro não informar")
+
+DOB_DEFAULT = date(1990, 1, 1)
+ERRO_DATA = "Data inválida. Verifique dia/mês/ano."
+ERRO_DATA_FUTURA = "Data de nascimento no futuro não é válida."
+
+
+class Field(NamedTuple):
+    name: str
+    kind: str
+    label: str
+    options: Tuple[Any, ...] = ()
+    labels: Tuple[str, ...] = ()  # rótulos na ordem de options; vazio = o próprio código
+    default: Any = None
+    col: int = 0
+    widget: str = "radio"
+    required: str = ""  # mensagem de erro se ficar em branco
+    exclusive: str = ""
+    args: Tuple[Tuple[str, Any], ...] = ()  # kwargs extras do widget
+
+
+class Step(NamedTuple):
+    title: str
+    fields: Tuple[Field, ...]
+    submit: str = "Continuar ▶️"
+
+
+def _sn(name: str, label: str, col: int = 0, default: str = "nao") -> Field:
+    return Field(name, "choice", label, SIM_NAO, default=default, col=col)
+
+
+# ------------------------------
+# Fluxo base (v0.6 / v0.4)
+# ------------------------------
+STEPS: Tuple[Step, ...] = (
+    Step("1) Quem é você? 🙂", (
+        Field("nome", "text", "Nome completo *", default="", required="Por favor, preencha o nome completo.",
+              args=(("placeholder", "Seu nome e sobrenome"), ("help", "Como aparece em seus documentos."))),
+        Field("email", "text", "E-mail *", default="", required="Por favor, preencha o e-mail.",
+              args=(("placeholder", "voce@exemplo.com"), ("help", "Usaremos para enviar seu resumo e próximos passos."))),
+        Field("data_nascimento", "date", "Data de nascimento *", default=DOB_DEFAULT, col=1, args=(("first_year", 1900),)),
+        Field("sexo", "choice", "Sexo (opcional)", SEXOS, default="feminino", col=1, widget="selectbox"),
+    )),
+    Step("2) Medidas e saúde atual 🩺", (
+        Field("peso", "number", "Peso (kg) *", default=90,
+              args=(("min_value", 30), ("max_value", 400), ("step", 1), ("format", "%d"),
+                    ("help", "Use as setas ou digite. Avança com Enter."))),
+        Field("tem_comorbidades", "choice", "Possui comorbidades relevantes? (DM2, pressão alta, apneia, colesterol...)",
+              ("sim", "nao"), default="sim"),
+        Field("altura", "number", "Altura (m) *", default=1.70, col=1,
+              args=(("min_value", 1.30), ("max_value", 2.20), ("step", 0.01), ("help", "Ex.: 1.70"))),
+        Field("comorbidades", "textarea", "Se sim, quais comorbidades?", default="", col=1),
+    )),
+    Step("3) Algumas condições importantes ⚠️", (
+        _sn("gravidez", "Está grávida?"),
+        _sn("amamentando", "Está amamentando?"),
+        _sn("tratamento_cancer", "Em tratamento oncológico ativo?"),
+        _sn("gi_grave", "Doença gastrointestinal grave ativa?"),
+        _sn("gastroparesia", "Diagnóstico de gastroparesia (esvaziamento gástrico lento)?"),
+        _sn("pancreatite_previa", "Já teve pancreatite?", 1),
+        _sn("historico_mtc_men2", "História pessoal/familiar de MTC/MEN2?", 1),
+        _sn("colecistite_12m", "Cólica de vesícula/colecistite nos últimos 12 meses?", 1),
+        Field("outras_contra", "textarea", "Outras condições clínicas relevantes?", default="", col=1),
+    )),
+    Step("4) Medicações e alergias 💉", (
+        Field("insuf_renal", "choice", "Como estão seus rins?", GRAUS, default="normal", widget="selectbox"),
+        Field("insuf_hepatica", "choice", "E o fígado?", GRAUS, default="normal", widget="selectbox"),
+        _sn("transtorno_alimentar", "Tem transtorno alimentar ativo (anorexia/bulimia/compulsão)?"),
+        _sn("uso_corticoide", "Usa corticoide todos os dias há mais de 3 meses?"),
+        _sn("antipsicoticos", "Usa antipsicóticos atualmente?"),
+        _sn("alergia_glp1", "Tem alergia conhecida a remédios do tipo GLP-1?", 1),
+        Field("alergias_componentes", "multi", "É alérgico(a) a algum destes componentes comuns?", rules.EXCIPIENTES_COMUNS, default=(), col=1),
+        Field("outros_componentes", "text", "Algum outro componente ao qual você é alérgico(a)?", default="", col=1),
+    )),
+    Step("5) Histórico e objetivo 🎯", (
+        _sn("usou_antes", "Já usou medicação para emagrecer?"),
+        Field("quais", "multi", "Quais?", MEDICACOES, default=()),
+        Field("efeitos", "textarea", "Teve algum efeito colateral? Conte pra gente.", default=""),
+        Field("objetivo", "choice", "Qual seu objetivo principal?", ("Perda de peso", "Controle de comorbidades", "Manutenção"),
+              default="Perda de peso", col=1, widget="selectbox"),
+        Field("pronto_mudar", "slider", "Quão pronto(a) está para mudanças no dia a dia (0-10)?", default=7, col=1,
+              args=(("min_value", 0), ("max_value", 10))),
+    ), submit="Ver meu resultado ✅"),
+)
+
+# ------------------------------
+# Diferenças por versão: campo -> atributos trocados; "_steps" -> títulos/botões.
+# ------------------------------
+_SEL_SN = {"widget": "selectbox", "labels": NAO_SIM_LABELS}
+_GRAU_LABELS = {
+    "options": GRAUS + ("desconhecido",),
+    "labels": ("Normal", "Leve alteração", "Alteração moderada", "Alteração grave", "Não sei informar"),
+}
+
+VARIANTS: Dict[str, Dict[str, Any]] = {
+    "v0.6": {},
+    "v0.4": {
+        "_back_button": True,
+        "_wide": False,
+        "data_nascimento": {"kind": "dmy"},
+    },
+    "v0.9": {
+        "_steps": (
+            ("Sobre você", None), ("Sua saúde", None), ("Condições importantes", None),
+            ("Medicações & alergias", None), ("Histórico & objetivo", "Revisar & confirmar ✅"),
+        ),
+        "nome": {"args": ()},
+        "email": {"args": ()},
+        "data_nascimento": {"kind": "dmy", "args": (("first_year", 1940),)},
+        "sexo": {"name": "identidade", "label": "Como você se identifica? (opcional)",
+                 "options": ("Feminino", "Masculino", "Prefiro não informar"), "default": "Feminino"},
+        "peso": {"args": (("min_value", 30), ("max_value", 400), ("step", 1), ("format", "%d"))},
+        "tem_comorbidades": {
+            "label": "Você tem alguma dessas condições de saúde? (ex.: diabetes tipo 2, pressão alta, apneia do sono, colesterol alto)",
+            "widget": "selectbox", "labels": ("Sim", "Não"),
+        },
+        "altura": {"args": (("min_value", 1.30), ("max_value", 2.20), ("step", 0.01))},
+        "comorbidades": {"label": "Se sim, quais?"},
+        "gravidez": _SEL_SN,
+        "amamentando": _SEL_SN,
+        "tratamento_cancer": {**_SEL_SN, "label": "Está em tratamento contra câncer neste momento?"},
+        "gi_grave": {**_SEL_SN, "label": "Tem alguma doença grave no estômago ou intestino em atividade?"},
+        "gastroparesia": {**_SEL_SN, "label": "Já recebeu diagnóstico de gastroparesia (esvaziamento gástrico lento)?"},
+        "pancreatite_previa": _SEL_SN,
+        "historico_mtc_men2": {**_SEL_SN, "label": "Algum caso seu ou na família de câncer de tireoide?"},
+        "colecistite_12m": {**_SEL_SN, "label": "Teve crise de vesícula ou colecistite nos últimos 12 meses?"},
+        "outras_contra": {"label": "Outras condições relevantes?"},
+        "insuf_renal": {**_GRAU_LABELS, "label": "Saúde dos rins"},
+        "insuf_hepatica": {**_GRAU_LABELS, "label": "Saúde do fígado"},
+        "transtorno_alimentar": {**_SEL_SN, "label": "Tem transtorno alimentar ativo? (anorexia, bulimia, compulsão alimentar)"},
+        "uso_corticoide": _SEL_SN,
+        "antipsicoticos": {**_SEL_SN, "label": "Usa medicamentos antipsicóticos atualmente?"},
+        "alergia_glp1": {**_SEL_SN, "label": "Alergia conhecida a medicamentos do tipo GLP-1?"},
+        "alergias_componentes": {
+            "label": "Alergia a algum destes componentes? (pode marcar mais de um)",
+            "options": rules.EXCIPIENTES["v0.9"] + (rules.NENHUMA_ALERGIA,),
+            "exclusive": rules.NENHUMA_ALERGIA,
+        },
+        "outros_componentes": {"label": "Alguma outra alergia importante?"},
+        "usou_antes": _SEL_SN,
+        "quais": {"label": "Quais? (pode deixar em branco se não lembrar)"},
+        "efeitos": {"label": "Teve algum efeito colateral? (opcional)"},
+        "objetivo": {"options": ("Perda de peso", "Controle de comorbidades", "Manutenção do peso")},
+        "pronto_mudar": {
+            "label": "Numa escala de 0 a 10, o quanto você está pronto(a) para transformar seus hábitos e conquistar seus objetivos?",
+            "default": 6,
+        },
+    },
+}
+
+
+# ------------------------------
+# Compilação (uma vez por versão)
+# ------------------------------
+class CompiledField:
+    __slots__ = ("name", "kind", "label", "options", "index", "label_of", "format", "default", "default_index",
+                 "col", "widget", "required", "exclusive", "kwargs", "key", "target")
+
+    def __init__(self, f: Field):
+        self.name, self.kind, self.label, self.col = f.name, f.kind, f.label, f.col
+        self.widget, self.required, self.exclusive, self.default = f.widget, f.required, f.exclusive, f.default
+        self.options = tuple(f.options)
+        self.index = {v: i for i, v in enumerate(self.options)}
+        self.label_of = dict(zip(self.options, f.labels)) if f.labels else {}
+        # Widget guarda o código; o rótulo só aparece na tela (valor desconhecido passa direto).
+        self.format: Optional[Callable[[Any], str]] = (lambda v, m=self.label_of: m.get(v, v)) if self.label_of else None
+        self.default_index = self.index.get(f.default, 0)
+        self.kwargs = dict(f.args)
+        self.key = "w_" + f.name
+        # Campo de answers gravado pelo widget (as datas sempre vão para data_nascimento).
+        self.target = "data_nascimento" if f.kind in ("date", "dmy") else f.name
+
+    def option_index(self, value) -> int:
+        return self.index.get(value, self.default_index)
+
+    def display(self, value) -> str:
+        return self.label_of.get(value, value) if self.label_of else value
+
+
+class CompiledStep(NamedTuple):
+    title: str
+    submit: str
+    fields: Tuple[CompiledField, ...]
+    columns: Tuple[Tuple[CompiledField, ...], ...]
+    targets: Tuple[str, ...]  # campos de answers gravados pela etapa (entrada de rules.update_mask)
+
+
+class Form(NamedTuple):
+    version: str
+    steps: Tuple[CompiledStep, ...]
+    fields: Dict[str, CompiledField]
+    back_button: bool
+    wide: bool
+
+
+def _variant_field(f: Field, over: Dict[str, Any]) -> Field:
+    return f._replace(**over) if over else f
+
+
+@lru_cache(maxsize=None)
+def compile_form(version: str = rules.DEFAULT_VERSION) -> Form:
+    rules.check_version(version)
+    var = VARIANTS[version]
+    titles = var.get("_steps", ())
+    steps, by_name = [], {}
+    for i, step in enumerate(STEPS):
+        fields = tuple(CompiledField(_variant_field(f, var.get(f.name))) for f in step.fields)
+        ncols = 1 + max(f.col for f in fields)
+        title, submit = titles[i] if i < len(titles) else (None, None)
+        steps.append(CompiledStep(
+            title or step.title, submit or step.submit, fields,
+            tuple(tuple(f for f in fields if f.col == c) for c in range(ncols)),
+            tuple(dict.fromkeys(f.target for f in fields)),
+        ))
+        by_name.update((f.name, f) for f in fields)
+    return Form(version, tuple(steps), by_name, var.get("_back_button", False), var.get("_wide", True))
+
+
+@lru_cache(maxsize=8)
+def years(first: int, last: int) -> Tuple[Tuple[int, ...], Dict[int, int]]:
+    ys = tuple(range(first, last + 1))
+    return ys, {y: i for i, y in enumerate(ys)}
+
+
+DAYS = tuple(range(1, 32))
+MONTHS = tuple(range(1, 13))
+
+
+def dob_default(answers: MutableMapping[str, Any]) -> date:
+    v = answers.get("data_nascimento")
+    if isinstance(v, date):
+        return v
+    try:
+        return date.fromisoformat(v) if v else DOB_DEFAULT
+    except (TypeError, ValueError):
+        return DOB_DEFAULT
+
+
+# ------------------------------
+# Widgets -> answers
+# ------------------------------
+def read_dob(f: CompiledField, ss: MutableMapping[str, Any]) -> Tuple[Optional[date], Optional[str]]:
+    """(data, erro) a partir dos widgets de data do campo."""
+    if f.kind == "dmy":
+        try:
+            dob = date(ss["w_ano"], ss["w_mes"], ss["w_dia"])
+        except (KeyError, TypeError, ValueError):
+            return None, ERRO_DATA
+    else:
+        dob = ss.get(f.key)
+        if not dob:
+            return None, ERRO_DATA
+    return dob, (ERRO_DATA_FUTURA if dob > date.today() else None)
+
+
+def commit(form: Form, step: int, ss: MutableMapping[str, Any]) -> Tuple[str, ...]:
+    """Copia os widgets da etapa para ss["answers"]; devolve os campos gravados."""
+    a = ss["answers"]
+    for f in form.steps[step].fields:
+        if f.kind in ("date", "dmy"):
+            dob, erro = read_dob(f, ss)
+            a["data_nascimento"] = dob.isoformat() if dob and not erro else ""
+            continue
+        v = ss[f.key]
+        if f.kind == "multi":
+            v = list(v)
+            if f.exclusive and f.exclusive in v and len(v) > 1:
+                v = [f.exclusive]
+        a[f.name] = v
+    return form.steps[step].targets
+
+
+def validate(form: Form, step: int, ss: MutableMapping[str, Any]) -> Optional[str]:
+    a = ss["answers"]
+    for f in form.steps[step].fields:
+        if f.required and not str(a.get(f.name, "")).strip():
+            return f.required
+        if f.kind in ("date", "dmy"):
+            erro = read_dob(f, ss)[1]
+            if erro:
+                return erro
+    return None
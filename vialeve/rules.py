@@ -0,0 +1,444 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from vialeve import metrics
+
+# ------------------------------
+# Catálogo de critérios de exclusão
+# ------------------------------
+# Versões de regras publicadas:
+#   v0.9 -> app.py (raiz)
+#   v0.6 -> vialeve-v0_2-cloud/app.py
+#   v0.4 -> vialeve-v0_5-cloud/app.py
+#
+# Sem Streamlit (nem numpy): os apps, o lote, a API e os CLIs importam daqui
+# sem pagar o startup da UI. bench/import_budget.py vigia isso.
+VERSIONS = ("v0.9", "v0.6", "v0.4")
+DEFAULT_VERSION = "v0.9"
+
+STATUS_EXCLUIDO = "excluido"
+STATUS_ELEGIVEL = "potencialmente_elegivel"
+
+NENHUMA_ALERGIA = "Não tenho alergia a esses componentes"
+# Excipientes perguntados no questionário (o látex mudou de texto no v0.9).
+EXCIPIENTES_COMUNS = (
+    "Polietilenoglicol (PEG)",
+    "Metacresol / Fenol",
+    "Fosfatos (fosfato dissódico etc.)",
+    "Látex (agulhas/rolhas)",
+    "Carboximetilcelulose",
+    "Trometamina (TRIS)",
+)
+EXCIPIENTES: Dict[str, Tuple[str, ...]] = {
+    "v0.4": EXCIPIENTES_COMUNS,
+    "v0.6": EXCIPIENTES_COMUNS,
+    "v0.9": tuple(x.replace("Látex (agulhas", "Látex (camisinha/agulhas") for x in EXCIPIENTES_COMUNS),
+}
+GRAUS_EXCLUSAO = ("moderada", "grave")
+
+# Tabela de regras: (código, campo, tipo). A ordem é a mesma em que os
+# motivos aparecem para o paciente; a regra i ocupa o bit i da máscara.
+#   "idade"   -> menor de 18 (idade derivada de data_nascimento)
+#   "sim"     -> resposta == "sim"
+#   "alergia" -> lista de excipientes (semântica depende da versão)
+#   "grau"    -> resposta em GRAUS_EXCLUSAO
+#   "imc"     -> IMC < 27 e tem_comorbidades == "nao"
+RULES = (
+    ("menor_18", "data_nascimento", "idade"),
+    ("gravidez", "gravidez", "sim"),
+    ("amamentando", "amamentando", "sim"),
+    ("tratamento_cancer", "tratamento_cancer", "sim"),
+    ("pancreatite_previa", "pancreatite_previa", "sim"),
+    ("historico_mtc_men2", "historico_mtc_men2", "sim"),
+    ("alergia_glp1", "alergia_glp1", "sim"),
+    ("alergias_componentes", "alergias_componentes", "alergia"),
+    ("gi_grave", "gi_grave", "sim"),
+    ("gastroparesia", "gastroparesia", "sim"),
+    ("colecistite_12m", "colecistite_12m", "sim"),
+    ("insuf_renal", "insuf_renal", "grau"),
+    ("insuf_hepatica", "insuf_hepatica", "grau"),
+    ("transtorno_alimentar", "transtorno_alimentar", "sim"),
+    ("uso_corticoide", "uso_corticoide", "sim"),
+    ("antipsicoticos", "antipsicoticos", "sim"),
+    ("imc_baixo", "peso", "imc"),
+)
+REASON_CODES = tuple(code for code, _, _ in RULES)
+REASON_BIT = {code: i for i, code in enumerate(REASON_CODES)}
+
+_TEXTOS_V04 = {
+    "menor_18": "Menor de 18 anos.",
+    "gravidez": "Gestação em curso.",
+    "amamentando": "Amamentação em curso.",
+    "tratamento_cancer": "Tratamento oncológico ativo.",
+    "pancreatite_previa": "História de pancreatite prévia.",
+    "historico_mtc_men2": "História pessoal/familiar de carcinoma medular de tireoide (MTC) ou MEN2.",
+    "alergia_glp1": "Hipersensibilidade conhecida a análogos de GLP-1.",
+    "alergias_componentes": "Alergia relatada a excipientes comuns de formulações injetáveis (ver detalhes).",
+    "gi_grave": "Doença gastrointestinal grave ativa.",
+    "gastroparesia": "Gastroparesia diagnosticada.",
+    "colecistite_12m": "Colecistite/colelitíase sintomática nos últimos 12 meses.",
+    "insuf_renal": "Insuficiência renal moderada/grave (necessita avaliação médica).",
+    "insuf_hepatica": "Insuficiência hepática moderada/grave (necessita avaliação médica).",
+    "transtorno_alimentar": "Transtorno alimentar ativo.",
+    "uso_corticoide": "Uso crônico de corticoide (requer avaliação).",
+    "antipsicoticos": "Uso de antipsicóticos (requer avaliação).",
+    "imc_baixo": "IMC < 27 sem comorbidades relevantes.",
+}
+
+REASON_TEXTS: Dict[str, Dict[str, str]] = {
+    "v0.4": _TEXTOS_V04,
+    "v0.6": dict(_TEXTOS_V04),
+    "v0.9": {
+        **_TEXTOS_V04,
+        "historico_mtc_men2": "História pessoal/familiar de cancer de tireoide.",
+        "insuf_renal": "Insuficiência renal moderada/grave (necessita avaliação).",
+        "insuf_hepatica": "Insuficiência hepática moderada/grave (necessita avaliação).",
+    },
+}
+
+# v0.9 aceita a opção "Não tenho alergia..." como ausência de alergia;
+# v0.4/v0.6 excluem qualquer lista não vazia.
+ALERGIA_NENHUMA_CONTA = {"v0.9": True, "v0.6": False, "v0.4": False}
+
+# ------------------------------
+# Compilação (uma vez, no import)
+# ------------------------------
+# As respostas sim/não e de grau viram um inteiro: o bit de cada campo é o
+# mesmo bit do motivo correspondente, então as exclusões "duras" saem de um
+# único AND com HARD_MASK. Bits acima das regras guardam flags auxiliares.
+SIM_FIELDS = tuple(field for _, field, kind in RULES if kind == "sim")
+GRAU_FIELDS = tuple(field for _, field, kind in RULES if kind == "grau")
+
+_SIM_BITS = tuple((field, 1 << REASON_BIT[code]) for code, field, kind in RULES if kind == "sim")
+_GRAU_BITS = tuple((field, 1 << REASON_BIT[code]) for code, field, kind in RULES if kind == "grau")
+HARD_MASK = sum(bit for _, bit in _SIM_BITS + _GRAU_BITS)
+
+BIT_MENOR_18 = 1 << REASON_BIT["menor_18"]
+BIT_ALERGIA = 1 << REASON_BIT["alergias_componentes"]
+BIT_IMC = 1 << REASON_BIT["imc_baixo"]
+FLAG_SEM_COMORBIDADES = 1 << len(RULES)
+
+# Campos lidos por cada regra: campo -> bits das regras a reavaliar quando ele muda.
+_RULE_FIELDS = {
+    "idade": ("data_nascimento", "idade"),
+    "alergia": ("alergias_componentes",),
+    "imc": ("peso", "altura", "tem_comorbidades"),
+}
+RULE_DEPS: Dict[str, int] = {}
+for _i, (_code, _field, _kind) in enumerate(RULES):
+    for _f in _RULE_FIELDS.get(_kind, (_field,)):
+        RULE_DEPS[_f] = RULE_DEPS.get(_f, 0) | 1 << _i
+
+_TEXTS_BY_BIT: Dict[str, Tuple[str, ...]] = {
+    v: tuple(textos[code] for code in REASON_CODES) for v, textos in REASON_TEXTS.items()
+}
+_BIT_BY_TEXT: Dict[str, Dict[str, int]] = {
+    v: {t: 1 << i for i, t in enumerate(textos)} for v, textos in _TEXTS_BY_BIT.items()
+}
+
+# Contadores por regra (leitura via rule_hits()). Incremento só nos bits
+# acesos, sem lock: sob concorrência é uma contagem aproximada, de propósito.
+_hits = [0] * len(RULES)
+_evaluations = [0]
+
+
+def check_version(version: str) -> str:
+    if version not in REASON_TEXTS:
+        raise ValueError(f"Versão de regras desconhecida: {version!r} (disponíveis: {', '.join(VERSIONS)})")
+    return version
+
+
+def calc_idade(d: Optional[date], hoje: Optional[date] = None) -> Optional[int]:
+    if not d:
+        return None
+    today = hoje or date.today()
+    return today.year - d.year - ((today.month, today.day) < (d.month, d.day))
+
+
+def idade_from_dob(a: Dict[str, Any], hoje: Optional[date] = None) -> Optional[int]:
+    dob = a.get("data_nascimento")
+    if not dob:
+        return None
+    try:
+        if isinstance(dob, str):
+            dob = date.fromisoformat(dob)
+        return calc_idade(dob, hoje)
+    except Exception:
+        return None
+
+
+def idade_from_answers(a: Dict[str, Any], hoje: Optional[date] = None) -> Optional[int]:
+    # Idade a partir de data_nascimento; se não der, usa "idade" já gravada.
+    idade = idade_from_dob(a, hoje)
+    return idade if idade is not None else a.get("idade")
+
+
+def calc_imc(a: Dict[str, Any]) -> Optional[float]:
+    peso = a.get("peso")
+    altura = a.get("altura")
+    if peso and altura:
+        try:
+            return float(peso) / (float(altura) ** 2)
+        except Exception:
+            pass
+    return None
+
+
+def pack_answers(a: Dict[str, Any]) -> int:
+    bits = 0
+    for field, bit in _SIM_BITS:
+        if a.get(field) == "sim":
+            bits |= bit
+    for field, bit in _GRAU_BITS:
+        if a.get(field) in GRAUS_EXCLUSAO:
+            bits |= bit
+    if a.get("tem_comorbidades") == "nao":
+        bits |= FLAG_SEM_COMORBIDADES
+    return bits
+
+
+def safe_multi(options, current) -> List[str]:
+    """Seleção anterior válida para um multiselect: só opções existentes, sem
+    "nenhuma alergia" misturada a alergias marcadas."""
+    s = list(current or ())
+    if NENHUMA_ALERGIA in s and len(s) > 1:
+        s = [x for x in s if x != NENHUMA_ALERGIA]
+    return [x for x in s if x in options]
+
+
+def alergia_relatada(alergias: Any, version: str = DEFAULT_VERSION) -> bool:
+    if not alergias:
+        return False
+    return not (ALERGIA_NENHUMA_CONTA[version] and list(alergias) == [NENHUMA_ALERGIA])
+
+
+def exclusion_mask(a: Dict[str, Any], version: str = DEFAULT_VERSION, hoje: Optional[date] = None) -> int:
+    """Máscara de motivos (bit i = RULES[i]) para um conjunto de respostas."""
+    return _mask(a, version, idade_from_answers(a, hoje))
+
+
+def _mask(a: Dict[str, Any], version: str, idade: Any) -> int:
+    mask = _pure_mask(a, version, idade)
+    count_hits(mask)
+    return mask
+
+
+def _pure_mask(a: Dict[str, Any], version: str, idade: Any) -> int:
+    packed = pack_answers(a)
+    mask = packed & HARD_MASK
+    if idade is not None and idade < 18:
+        mask |= BIT_MENOR_18
+    if alergia_relatada(a.get("alergias_componentes"), version):
+        mask |= BIT_ALERGIA
+    if packed & FLAG_SEM_COMORBIDADES:
+        imc = calc_imc(a)
+        if imc is not None and imc < 27:
+            mask |= BIT_IMC
+    return mask
+
+
+def count_hits(mask: int):
+    _evaluations[0] += 1
+    while mask:
+        low = mask & -mask
+        _hits[low.bit_length() - 1] += 1
+        mask ^= low
+
+
+def rule_hits() -> Dict[str, int]:
+    hits = dict(zip(REASON_CODES, _hits))
+    hits["_avaliacoes"] = _evaluations[0]
+    return hits
+
+
+def reset_rule_hits():
+    for i in range(len(_hits)):
+        _hits[i] = 0
+    _evaluations[0] = 0
+
+
+def reasons_from_mask(mask: int, version: str = DEFAULT_VERSION) -> List[str]:
+    textos = _TEXTS_BY_BIT[check_version(version)]
+    mask = int(mask)
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(textos[low.bit_length() - 1])
+        mask ^= low
+    return out
+
+
+def mask_from_reasons(reasons: List[str], version: str = DEFAULT_VERSION) -> int:
+    bits = _BIT_BY_TEXT[check_version(version)]
+    mask = 0
+    for r in reasons:
+        mask |= bits[r]
+    return mask
+
+
+def codes_from_mask(mask: int) -> List[str]:
+    mask = int(mask)
+    return [code for i, code in enumerate(REASON_CODES) if mask >> i & 1]
+
+
+def deps_mask(fields) -> int:
+    bits = 0
+    for f in fields:
+        bits |= RULE_DEPS.get(f, 0)
+    return bits
+
+
+def update_mask(a: Dict[str, Any], mask: int, fields, version: str = DEFAULT_VERSION) -> int:
+    """Reavalia só as regras que leem `fields`; os demais bits de `mask` ficam.
+
+    Aplicado a cada etapa enviada, o resultado final é igual ao de
+    evaluate_mask sobre as respostas completas (não conta hits: use
+    count_hits na confirmação).
+    """
+    check_version(version)
+    bits = deps_mask(fields)
+    if not bits:
+        return mask
+    fresh = 0
+    for field, bit in _SIM_BITS:
+        if bit & bits and a.get(field) == "sim":
+            fresh |= bit
+    for field, bit in _GRAU_BITS:
+        if bit & bits and a.get(field) in GRAUS_EXCLUSAO:
+            fresh |= bit
+    if bits & BIT_MENOR_18:
+        idade = idade_from_dob(a)
+        if idade is not None:
+            a["idade"] = idade
+            a["idade_calculada"] = idade
+        idade = a.get("idade")
+        if idade is not None and idade < 18:
+            fresh |= BIT_MENOR_18
+    if bits & BIT_ALERGIA and alergia_relatada(a.get("alergias_componentes"), version):
+        fresh |= BIT_ALERGIA
+    if bits & BIT_IMC and a.get("tem_comorbidades") == "nao":
+        imc = calc_imc(a)
+        if imc is not None and imc < 27:
+            fresh |= BIT_IMC
+    return (mask & ~bits) | fresh
+
+
+def status_from_mask(mask: int) -> str:
+    return STATUS_EXCLUIDO if mask else STATUS_ELEGIVEL
+
+
+def evaluate_mask(a: Dict[str, Any], version: str = DEFAULT_VERSION) -> Tuple[str, int]:
+    """Como evaluate_rules, mas devolve a máscara; os textos ficam para a renderização."""
+    check_version(version)
+    idade = idade_from_dob(a)
+    if idade is not None:
+        a["idade"] = idade
+        a["idade_calculada"] = idade
+    mask = _mask(a, version, a.get("idade"))
+    return status_from_mask(mask), mask
+
+
+def evaluate_rules(a: Dict[str, Any], version: str = DEFAULT_VERSION) -> Tuple[str, List[str]]:
+    status, mask = evaluate_mask(a, version)
+    return status, reasons_from_mask(mask, version)
+
+
+# ------------------------------
+# Avaliação pura e memoizada
+# ------------------------------
+# evaluate() não altera as respostas e guarda o resultado num LRU do processo,
+# compartilhado entre sessões. A chave são só os campos que as regras leem
+# (EVAL_FIELDS), mais a versão e o dia (a idade muda com a data). Como a
+# maioria das pessoas fica nos valores padrão, respostas idênticas são
+# avaliadas uma vez por processo. Para Answers a chave sai dos valores já
+# codificados (inteiros pequenos), sem decodificar texto.
+#
+#   VIALEVE_EVAL_CACHE=4096     entradas do LRU
+EVAL_CACHE_SIZE = int(os.environ.get("VIALEVE_EVAL_CACHE", "4096"))
+EVAL_FIELDS = tuple(RULE_DEPS)
+_LIST_FIELD = EVAL_FIELDS.index("alergias_componentes")
+
+
+class Evaluation(NamedTuple):
+    status: str
+    mask: int
+    idade: Optional[int]
+    imc: Optional[float]
+
+
+def _evaluate(a: Dict[str, Any], version: str, hoje: date) -> Evaluation:
+    idade = idade_from_answers(a, hoje)
+    mask = _pure_mask(a, version, idade)
+    return Evaluation(status_from_mask(mask), mask, idade, calc_imc(a))
+
+
+_eval_cache: "OrderedDict[Tuple[Any, ...], Evaluation]" = OrderedDict()
+_eval_lock = threading.Lock()
+_eval_stats = [0, 0]  # acertos, faltas
+_today = [0.0, 0]  # (válido até, ordinal): date.today() custa mais que a busca no cache
+
+
+def _today_ordinal() -> int:
+    t = time.monotonic()
+    if t >= _today[0]:
+        _today[0], _today[1] = t + 1.0, date.today().toordinal()
+    return _today[1]
+
+
+def evaluate(a: Dict[str, Any], version: str = DEFAULT_VERSION, hoje: Optional[date] = None) -> Evaluation:
+    """Status, máscara, idade e IMC sem tocar em `a` (não conta hits: use count_hits)."""
+    raw = getattr(a, "raw", None)  # Answers: valores codificados, sem decodificar
+    values = list(map(raw or a.get, EVAL_FIELDS))
+    if isinstance(values[_LIST_FIELD], list):
+        values[_LIST_FIELD] = tuple(values[_LIST_FIELD])
+    day = hoje.toordinal() if hoje else _today_ordinal()
+    key = (version, day, raw is not None, *values)
+    try:
+        with _eval_lock:
+            ev = _eval_cache.get(key)
+            if ev is not None:
+                _eval_cache.move_to_end(key)
+                _eval_stats[0] += 1
+                return ev
+    except TypeError:  # valor não hashable (ex.: objeto vindo da API): avalia sem cache
+        return _evaluate(a, check_version(version), date.fromordinal(day))
+    ev = _evaluate(a, check_version(version), date.fromordinal(day))
+    with _eval_lock:
+        _eval_stats[1] += 1
+        _eval_cache[key] = ev
+        if len(_eval_cache) > EVAL_CACHE_SIZE:
+            _eval_cache.popitem(last=False)
+    return ev
+
+
+def evaluation_stats() -> Dict[str, int]:
+    with _eval_lock:
+        return {"hits": _eval_stats[0], "misses": _eval_stats[1], "size": len(_eval_cache), "maxsize": EVAL_CACHE_SIZE}
+
+
+def clear_evaluation_cache():
+    with _eval_lock:
+        _eval_cache.clear()
+        _eval_stats[0] = _eval_stats[1] = 0
+
+
+def rule_hit_metric_lines() -> List[str]:
+    hits = rule_hits()
+    out = ["# TYPE vialeve_rule_evaluations_total counter", f"vialeve_rule_evaluations_total {hits.pop('_avaliacoes')}",
+           "# TYPE vialeve_rule_hits_total counter"]
+    return out + [f'vialeve_rule_hits_total{{rule="{code}"}} {n}' for code, n in hits.items()]
+
+
+def evaluation_metric_lines() -> List[str]:
+    s = evaluation_stats()
+    return ["# TYPE vialeve_eval_cache_hits_total counter", f"vialeve_eval_cache_hits_total {s['hits']}",
+            "# TYPE vialeve_eval_cache_misses_total counter", f"vialeve_eval_cache_misses_total {s['misses']}",
+            "# TYPE vialeve_eval_cache_size gauge", f"vialeve_eval_cache_size {s['size']}"]
+
+
+metrics.register(rule_hit_metric_lines)
+metrics.register(evaluation_metric_lines)
@@ -0,0 +1,351 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import deque
+from datetime import date
+from functools import lru_cache
+from typing import IO, Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from vialeve import answers, questionnaire, rules
+
+# ------------------------------
+# Pontuação em fluxo de arquivos NDJSON (dumps de parceiros)
+# ------------------------------
+# Lê a entrada linha a linha (em bytes, para saber o offset exato), junta
+# blocos de CHUNK linhas e manda cada bloco a um processo: ele normaliza os
+# rótulos para os códigos das regras, avalia com batch.evaluate_rules_batch e
+# devolve as linhas de saída já serializadas. No máximo 2 × workers blocos
+# ficam em voo e a saída sai na ordem da entrada (fila FIFO de futures), então
+# a memória não depende do tamanho do arquivo.
+#
+# Checkpoint: depois de cada bloco gravado, <saída>.ckpt guarda o offset da
+# entrada, o nº de linhas e o tamanho da saída. --resume trunca a saída nesse
+# tamanho e continua do offset — nenhuma linha duplicada ou perdida.
+#
+#   python -m vialeve.score parceiro.ndjson -o resultado.ndjson -w 8
+#   python -m vialeve.score parceiro.ndjson.gz -o resultado.ndjson --resume
+#   zcat dump.gz | python -m vialeve.score - --version v0.6 > resultado.ndjson
+#
+# Saída (uma linha por linha não vazia da entrada):
+#   {"line": 1, "id": ..., "status": ..., "reason_codes": [...], "reasons": [...], "idade": 41, "imc": 31.2, "version": "v0.9"}
+#   {"line": 2, "id": null, "error": "JSON inválido"}
+
+CHUNK = 5000
+CKPT_SUFFIX = ".ckpt"
+ID_FIELDS = ("id", "submission_id", "flow_id", "request_id")
+
+# ------------------------------
+# Normalização: rótulos (de qualquer versão do app) -> códigos das regras
+# ------------------------------
+_SIM = {"sim", "s", "yes", "y", "true", "1"}
+_NAO = {"nao", "n", "no", "false", "0"}
+_DMY = re.compile(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$")
+
+
+@lru_cache(maxsize=4096)
+def _fold(v: str) -> str:
+    # "Não sei informar " -> "nao sei informar"; os valores se repetem muito, daí o cache
+    return "".join(c for c in unicodedata.normalize("NFKD", v.strip().casefold()) if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=None)
+def _tables() -> Tuple[Dict[str, str], Dict[str, str]]:
+    # (grau: rótulo/código dobrado -> código, alergia: rótulo dobrado -> rótulo canônico)
+    grau = {_fold(g): g for g in answers.GRAUS}
+    for v in rules.VERSIONS:
+        fields = questionnaire.compile_form(v).fields
+        for name in rules.GRAU_FIELDS:
+            if name in fields:
+                grau.update({_fold(label): code for code, label in fields[name].label_of.items()})
+    alergia = {_fold(a): a for a in answers.ALERGIAS}
+    return grau, alergia
+
+
+def _sim_nao(v: Any) -> Any:
+    if isinstance(v, bool):
+        return "sim" if v else "nao"
+    if isinstance(v, (int, str)):
+        f = _fold(str(v))
+        if f in _SIM:
+            return "sim"
+        if f in _NAO:
+            return "nao"
+    return v
+
+
+def _number(v: Any) -> Any:
+    if isinstance(v, str):
+        try:
+            return float(v.strip().replace(",", "."))
+        except ValueError:
+            return v
+    return v
+
+
+def _dob(v: Any) -> Any:
+    if not isinstance(v, str):
+        return v
+    m = _DMY.match(v.strip())
+    if m:
+        d, mo, y = map(int, m.groups())
+        try:
+            return date(y, mo, d).isoformat()
+        except ValueError:
+            return v
+    return v.strip()[:10]
+
+
+def normalize(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Respostas no formato de um parceiro -> dict que rules/batch entendem."""
+    a = rec.get("answers", rec)
+    if not isinstance(a, dict):
+        raise ValueError("'answers' deve ser um objeto")
+    grau, alergia = _tables()
+    out = dict(a)
+    for f in rules.SIM_FIELDS + ("tem_comorbidades",):
+        if f in out:
+            out[f] = _sim_nao(out[f])
+    for f in rules.GRAU_FIELDS:
+        v = out.get(f)
+        if isinstance(v, str):
+            out[f] = grau.get(_fold(v), v)
+    if "data_nascimento" in out:
+        out["data_nascimento"] = _dob(out["data_nascimento"])
+    for f in ("peso", "altura", "idade"):
+        if f in out:
+            out[f] = _number(out[f])
+    if isinstance(out.get("idade"), float) and out["idade"].is_integer():
+        out["idade"] = int(out["idade"])
+    alt = out.get("altura")
+    if isinstance(alt, (int, float)) and not isinstance(alt, bool) and alt > 3:
+        out["altura"] = alt / 100  # em centímetros
+    al = out.get("alergias_componentes")
+    if isinstance(al, str):
+        al = [x for x in re.split(r"[;|]", al) if x.strip()]
+    if isinstance(al, list):
+        out["alergias_componentes"] = [alergia.get(_fold(x), x) if isinstance(x, str) else x for x in al]
+    return out
+
+
+# ------------------------------
+# Trabalho de um bloco (roda no processo filho)
+# ------------------------------
+def score_chunk(args: Tuple[int, List[bytes], str, Optional[str]]) -> Tuple[bytes, Dict[str, int]]:
+    import numpy as np  # numpy só nos processos que pontuam
+
+    from vialeve import batch
+
+    first_line, lines, version, hoje_iso = args
+    hoje = date.fromisoformat(hoje_iso) if hoje_iso else None
+    ok: List[Tuple[int, Any, Dict[str, Any]]] = []
+    out: List[Optional[str]] = []
+    counts = {"lines": 0, "blank": 0, "errors": 0, rules.STATUS_EXCLUIDO: 0, rules.STATUS_ELEGIVEL: 0}
+    for i, raw in enumerate(lines):
+        n = first_line + i
+        if not raw.strip():
+            counts["blank"] += 1
+            continue
+        counts["lines"] += 1
+        rec_id = None
+        try:
+            rec = json.loads(raw)
+            if not isinstance(rec, dict):
+                raise ValueError("linha deve ser um objeto JSON")
+            rec_id = next((rec[k] for k in ID_FIELDS if k in rec), None)
+            ok.append((n, rec_id, normalize(rec)))
+            out.append(None)
+        except (ValueError, UnicodeDecodeError) as e:
+            counts["errors"] += 1
+            msg = "JSON inválido" if isinstance(e, json.JSONDecodeError) else str(e)
+            out.append(json.dumps({"line": n, "id": rec_id, "error": msg}, ensure_ascii=False))
+    if ok:
+        cols = batch.columns_from_records([r for _, _, r in ok])
+        _, masks = batch.evaluate_rules_batch(cols, version, hoje)
+        por_dob = batch.ages_from_dob(cols["data_nascimento"], hoje)
+        idade = np.where(np.isnan(por_dob), cols["idade"], por_dob).tolist()  # mesma regra das exclusões
+        imc = batch.bmi(cols["peso"], cols["altura"]).tolist()
+        reasons = batch.explain_batch(masks, version)
+        scored = iter(range(len(ok)))
+        for j, slot in enumerate(out):
+            if slot is not None:
+                continue
+            k = next(scored)
+            n, rec_id, _ = ok[k]
+            m = int(masks[k])
+            status = rules.status_from_mask(m)
+            counts[status] += 1
+            out[j] = json.dumps({
+                "line": n, "id": rec_id, "status": status,
+                "reason_codes": rules.codes_from_mask(m), "reasons": reasons[k],
+                "idade": None if idade[k] != idade[k] else int(idade[k]), "imc": None if imc[k] != imc[k] else round(imc[k], 1), "version": version,
+            }, ensure_ascii=False)
+    return "".join(s + "\n" for s in out if s is not None).encode("utf-8"), counts
+
+
+# ------------------------------
+# Leitura em blocos, checkpoint e execução
+# ------------------------------
+def _open_in(path: str) -> IO[bytes]:
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_chunks(f: IO[bytes], chunk: int, first_line: int = 1, offset: int = 0) -> Iterator[Tuple[int, List[bytes], int]]:
+    """(nº da primeira linha, linhas, offset da entrada após o bloco)."""
+    buf: List[bytes] = []
+    for raw in f:
+        buf.append(raw)
+        offset += len(raw)
+        if len(buf) >= chunk:
+            yield first_line, buf, offset
+            first_line += len(buf)
+            buf = []
+    if buf:
+        yield first_line, buf, offset
+
+
+def read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path: str, state: Dict[str, Any]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run(
+    src: str,
+    dst: str = "-",
+    version: str = rules.DEFAULT_VERSION,
+    workers: Optional[int] = None,
+    chunk: int = CHUNK,
+    hoje: Optional[date] = None,
+    resume: bool = False,
+    checkpoint: bool = True,
+) -> Dict[str, Any]:
+    rules.check_version(version)
+    to_file = dst != "-"
+    ckpt_path = dst + CKPT_SUFFIX if to_file and checkpoint else None
+    state = {"input": src, "version": version, "offset": 0, "lines": 0, "output_bytes": 0}
+    totals: Dict[str, int] = {"lines": 0, "blank": 0, "errors": 0, rules.STATUS_EXCLUIDO: 0, rules.STATUS_ELEGIVEL: 0}
+    resumed_from = 0
+    if resume:
+        if not ckpt_path:
+            raise ValueError("--resume precisa de -o arquivo")
+        saved = read_checkpoint(ckpt_path)
+        if saved:
+            if saved["input"] != src or saved["version"] != version:
+                raise ValueError(f"checkpoint {ckpt_path} é de outra execução ({saved['input']}, {saved['version']})")
+            state, resumed_from = saved, saved["lines"]
+            totals.update(saved.get("totals", {}))
+
+    if state["offset"] and src == "-":
+        raise ValueError("não dá para retomar lendo de stdin")
+    f_in = _open_in(src)
+    if state["offset"]:
+        f_in.seek(state["offset"])
+    if to_file:
+        out: IO[bytes] = open(dst, "r+b" if resume and os.path.exists(dst) else "wb")
+        out.seek(state["output_bytes"])
+        out.truncate()
+    else:
+        out = sys.stdout.buffer
+
+    hoje_iso = hoje.isoformat() if hoje else None
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    bytes_in = 0
+    chunks = 0
+
+    def commit(text: bytes, counts: Dict[str, int], end_offset: int, last_line: int):
+        nonlocal bytes_in, chunks
+        out.write(text)
+        out.flush()
+        for k, v in counts.items():
+            totals[k] += v
+        bytes_in += end_offset - state["offset"]
+        chunks += 1
+        state.update(offset=end_offset, lines=last_line, totals=totals)
+        if ckpt_path:
+            os.fsync(out.fileno())
+            state["output_bytes"] = out.tell()
+            write_checkpoint(ckpt_path, state)
+
+    source = iter_chunks(f_in, chunk, state["lines"] + 1, state["offset"])
+    try:
+        if workers == 1:
+            for first, lines, end in source:
+                text, counts = score_chunk((first, lines, version, hoje_iso))
+                commit(text, counts, end, first + len(lines) - 1)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                inflight: Deque[Any] = deque()
+                for first, lines, end in source:
+                    inflight.append((ex.submit(score_chunk, (first, lines, version, hoje_iso)), end, first + len(lines) - 1))
+                    if len(inflight) >= 2 * workers:
+                        fut, end_, last = inflight.popleft()
+                        commit(*fut.result(), end_, last)
+                while inflight:
+                    fut, end_, last = inflight.popleft()
+                    commit(*fut.result(), end_, last)
+    finally:
+        if f_in is not sys.stdin.buffer:
+            f_in.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    if ckpt_path and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)  # terminou: nada a retomar
+    dt = time.perf_counter() - t0
+    return {
+        **totals, "chunks": chunks, "workers": workers, "resumed_from_line": resumed_from,
+        "seconds": round(dt, 3), "lines_per_s": round((state["lines"] - resumed_from) / dt) if dt else None,
+        "mb_per_s": round(bytes_in / dt / 1e6, 2) if dt else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="vialeve-score", description="Pontua um arquivo NDJSON de respostas em fluxo contínuo.")
+    p.add_argument("input", help="arquivo NDJSON ('-' = stdin; .gz descomprime)")
+    p.add_argument("-o", "--output", default="-", help="arquivo NDJSON de saída ('-' = stdout, sem checkpoint)")
+    p.add_argument("--version", default=rules.DEFAULT_VERSION, choices=rules.VERSIONS)
+    p.add_argument("-w", "--workers", type=int, help="processos (padrão: nº de CPUs)")
+    p.add_argument("--chunk", type=int, default=CHUNK, help="linhas por bloco")
+    p.add_argument("--hoje", type=date.fromisoformat, help="data de referência para a idade (AAAA-MM-DD)")
+    p.add_argument("--resume", action="store_true", help="continua do checkpoint <saída>.ckpt")
+    p.add_argument("--no-checkpoint", action="store_true")
+    args = p.parse_args(argv)
+
+    try:
+        s = run(args.input, args.output, args.version, args.workers, args.chunk, args.hoje, args.resume, not args.no_checkpoint)
+    except (ValueError, OSError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    print(
+        f"{s['lines']} linhas ({s['errors']} com erro) em {s['seconds']} s — {s['lines_per_s']} linhas/s, "
+        f"{s['mb_per_s']} MB/s, {s['chunks']} blocos, {s['workers']} processos"
+        + (f", retomado da linha {s['resumed_from_line']}" if s["resumed_from_line"] else ""),
+        file=sys.stderr,
+    )
+    print(f"  excluídos {s[rules.STATUS_EXCLUIDO]}  elegíveis {s[rules.STATUS_ELEGIVEL]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
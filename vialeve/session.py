@@ -0,0 +1,466 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Mapping, MutableMapping, Optional, Tuple
+
+from vialeve import answers as answers_mod
+from vialeve import emails, store
+
+# ------------------------------
+# Estado da sessão fora do processo (várias réplicas atrás de um balanceador)
+# ------------------------------
+# As chaves que init_state() gerencia (step, answers, eligibility, ...) são
+# espelhadas num backend compartilhado, indexado pelo parâmetro ?sid= da URL.
+# Uma reconexão caída em outra réplica (ou após um restart) restaura o
+# questionário de onde parou.
+#
+# Escrita em write-behind: no fim de cada rerun, flush() serializa as chaves,
+# compara com o que já foi enviado e enfileira só as alteradas; uma thread
+# por processo junta tudo o que estiver pendente (a versão mais recente de
+# cada chave vence) e grava num único lote. O rerun não espera I/O.
+#
+#   VIALEVE_SESSION_BACKEND=sqlite:/var/lib/vialeve/sessions.db   referência (WAL, vários processos)
+#   VIALEVE_SESSION_BACKEND=redis://host:6379/0                   precisa do pacote redis
+#   VIALEVE_SESSION_BACKEND=local                                 stand-in Redis em memória (dev/testes)
+#   VIALEVE_SESSION_TTL=86400                                     expiração (s) desde a última escrita
+#   VIALEVE_SESSION_PURGE_INTERVAL=600                            (s) entre limpezas das expiradas (SQLite)
+#
+# Sem VIALEVE_SESSION_BACKEND, restore()/flush() não fazem nada.
+#
+# Retenção: as linhas guardam as respostas (e-mail, dados de saúde). O TTL
+# vale na leitura e a thread do writer apaga as expiradas a cada
+# PURGE_INTERVAL (no Redis, o EXPIRE já faz isso). Reiniciar o questionário
+# apaga o estado salvo, e a confirmação apaga e para de espelhar aquele fluxo
+# (as respostas já estão em submissions). "python -m vialeve.emails erase"
+# também apaga as sessões com o e-mail.
+#
+# Atenção: o sid da URL é a única credencial. Quem recebe o link (copiado,
+# compartilhado, no histórico de um computador público) abre o questionário
+# com as respostas dentro do TTL. Mantenha o TTL curto onde isso importa.
+
+BACKEND_URL = os.environ.get("VIALEVE_SESSION_BACKEND", "")
+TTL = int(os.environ.get("VIALEVE_SESSION_TTL", "86400"))
+PURGE_INTERVAL = float(os.environ.get("VIALEVE_SESSION_PURGE_INTERVAL", "600"))
+
+# "_funnel": posição do fluxo no funil (vialeve.funnel), para não recontar etapas em outra réplica
+KEYS = ("step", "answers", "eligibility", "exclusion_mask", "consent_ok", "flow_id", "_funnel")
+SID_PARAM = "sid"
+
+
+def encode(key: str, value: Any) -> str:
+    if key == "answers":
+        value = value.to_dict() if hasattr(value, "to_dict") else dict(value)
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def decode(key: str, raw: str) -> Any:
+    value = json.loads(raw)
+    if key == "answers":
+        return answers_mod.Answers(value)
+    return value
+
+
+# ------------------------------
+# Backends: read(sid) -> {chave: json}; write({sid: {chave: json}}); delete(sid);
+# purge() -> expiradas apagadas; erase(email_key) -> sessões com esse e-mail apagadas
+# ------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid        TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (sid, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_sessions_updated ON sessions (updated_at);
+"""
+
+_UPSERT = """
+INSERT INTO sessions (sid, key, value, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (sid, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+"""
+
+
+class SQLiteBackend:
+    """Implementação de referência: uma linha por (sessão, chave), arquivo em WAL."""
+
+    def __init__(self, path: str, ttl: int = TTL):
+        self.path, self.ttl = path, ttl
+        self._conn = store.connect(path)
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # estado de sessão, não submissão
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def read(self, sid: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM sessions WHERE sid = ? AND updated_at >= ?", (sid, time.time() - self.ttl)
+            ).fetchall()
+        return dict(rows)
+
+    def write(self, batch: Mapping[str, Mapping[str, str]]):
+        now = time.time()
+        rows = [(sid, k, v, now) for sid, kv in batch.items() for k, v in kv.items()]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_UPSERT, rows)
+                # toca as demais chaves da sessão: a expiração conta da última escrita
+                self._conn.executemany("UPDATE sessions SET updated_at = ? WHERE sid = ?", [(now, sid) for sid in batch])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def erase(self, email_key: str) -> int:
+        with self._lock:
+            rows = self._conn.execute("SELECT sid, value FROM sessions WHERE key = 'answers'").fetchall()
+            sids = [(sid,) for sid, raw in rows if _email_key(raw) == email_key]
+            self._conn.executemany("DELETE FROM sessions WHERE sid = ?", sids)
+        return len(sids)
+
+    def close(self):
+        self._conn.close()
+
+
+class LocalRedis:
+    """Stand-in em memória com o subconjunto do cliente redis-py usado aqui
+    (hset/hgetall/expire/delete/pipeline). Vale para um processo só."""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, name: str) -> bool:
+        exp = self._expires.get(name)
+        if exp is not None and exp <= time.time():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return name in self._data
+
+    def hset(self, name: str, key: Optional[str] = None, value: Optional[str] = None, mapping: Optional[Mapping[str, str]] = None) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self._lock:
+            self._alive(name)
+            h = self._data.setdefault(name, {})
+            new = sum(1 for k in items if k not in h)
+            h.update((k, str(v)) for k, v in items.items())
+        return new
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._data[name]) if self._alive(name) else {}
+
+    def expire(self, name: str, seconds: int) -> bool:
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expires[name] = time.time() + seconds
+            return True
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data[name].get(key) if self._alive(name) else None
+
+    def scan_iter(self, match: str = "*"):
+        prefix = match.rstrip("*")
+        with self._lock:
+            names = [n for n in self._data if n.startswith(prefix)]
+        return iter(names)
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            n = 0
+            for name in names:
+                n += self._data.pop(name, None) is not None
+                self._expires.pop(name, None)
+            return n
+
+    def pipeline(self, transaction: bool = True) -> "_LocalPipeline":
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    def __init__(self, client: LocalRedis):
+        self._client, self._ops = client, []
+
+    def __getattr__(self, name):
+        def op(*args, **kwargs):
+            self._ops.append((name, args, kwargs))
+            return self
+        return op
+
+    def execute(self):
+        ops, self._ops = self._ops, []
+        return [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in ops]
+
+
+class RedisBackend:
+    """Uma hash por sessão (vialeve:sess:<sid>), EXPIRE renovado a cada escrita."""
+
+    def __init__(self, client, ttl: int = TTL, prefix: str = "vialeve:sess:"):
+        self.client, self.ttl, self.prefix = client, ttl, prefix
+
+    def read(self, sid: str) -> Dict[str, str]:
+        raw = self.client.hgetall(self.prefix + sid)
+        return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v) for k, v in raw.items()}
+
+    def write(self, batch: Mapping[str, Mapping[str, str]]):
+        pipe = self.client.pipeline(transaction=False)
+        for sid, kv in batch.items():
+            pipe.hset(self.prefix + sid, mapping=dict(kv))
+            pipe.expire(self.prefix + sid, self.ttl)
+        pipe.execute()
+
+    def delete(self, sid: str):
+        self.client.delete(self.prefix + sid)
+
+    def purge(self) -> int:
+        return 0  # EXPIRE
+
+    def erase(self, email_key: str) -> int:
+        names = [n for n in self.client.scan_iter(match=self.prefix + "*") if _email_key(self.client.hget(n, "answers")) == email_key]
+        if names:
+            self.client.delete(*names)
+        return len(names)
+
+    def close(self):
+        pass
+
+
+def _email_key(raw: Optional[str]) -> Optional[str]:
+    try:
+        return emails.email_key(json.loads(raw).get("email")) if raw else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def open_backend(url: str = BACKEND_URL):
+    if not url:
+        return None
+    if url == "local":
+        return RedisBackend(LocalRedis())
+    if url.startswith("sqlite:"):
+        return SQLiteBackend(url[len("sqlite:"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("VIALEVE_SESSION_BACKEND=redis:// requer o pacote 'redis'") from e
+        return RedisBackend(redis.Redis.from_url(url, decode_responses=True))
+    raise ValueError(f"VIALEVE_SESSION_BACKEND desconhecido: {url!r}")
+
+
+# ------------------------------
+# Write-behind: pendências coalescidas por sessão, uma thread por processo
+# ------------------------------
+class Writer:
+    def __init__(self, backend, max_wait: float = 0.05, purge_interval: float = PURGE_INTERVAL):
+        self.backend = backend
+        self.max_wait = max_wait
+        self.purge_interval = purge_interval
+        self.batches = 0
+        self.keys_written = 0
+        self.errors = 0
+        self.purged = 0
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._deletes: set = set()
+        self._next_purge = time.monotonic()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, name="vialeve-session-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, sid: str, changed: Mapping[str, str]):
+        with self._cond:
+            self._pending.setdefault(sid, {}).update(changed)
+            self._cond.notify()
+
+    def delete(self, sid: str):
+        """Apaga o estado salvo do sid (na ordem: escritas seguintes do mesmo sid valem depois)."""
+        with self._cond:
+            self._pending.pop(sid, None)
+            self._deletes.add(sid)
+            self._cond.notify()
+
+    def pending(self, sid: str) -> Dict[str, str]:
+        with self._cond:
+            return dict(self._pending.get(sid, {}))
+
+    def _purge(self):
+        self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            self.purged += self.backend.purge()
+        except Exception:
+            self.errors += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._deletes and not self._stop:
+                    wait = self._next_purge - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stop and not self._pending and not self._deletes:
+                    return
+                if self._pending or self._deletes:
+                    # janela curta para juntar reruns de várias sessões num lote
+                    self._cond.wait(self.max_wait)
+                batch, self._pending = self._pending, {}
+                deletes, self._deletes = self._deletes, set()
+                self._busy = True
+            if time.monotonic() >= self._next_purge:
+                self._purge()
+            try:
+                for sid in deletes:
+                    self.backend.delete(sid)
+                deletes = set()
+                if batch:
+                    self.backend.write(batch)
+            except Exception:
+                self.errors += 1
+                with self._cond:
+                    for sid in deletes:  # apagar antes do que chegou depois para o mesmo sid
+                        if sid not in self._pending:
+                            self._deletes.add(sid)
+                    for sid, kv in batch.items():  # devolve sem sobrescrever o que chegou depois
+                        if sid not in self._deletes or sid in self._pending:
+                            self._pending[sid] = {**kv, **self._pending.get(sid, {})}
+                    self._busy = False
+                time.sleep(0.5)
+                continue
+            self.batches += 1
+            self.keys_written += sum(len(kv) for kv in batch.values())
+            with self._cond:
+                self._busy = False
+
+    def flush(self, timeout: float = 5.0):
+        """Espera a fila esvaziar (testes/shutdown)."""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self._cond:
+                if not self._pending and not self._deletes and not self._busy:
+                    break
+                self._cond.notify()
+            time.sleep(0.005)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join(1.0)
+
+
+_writer: Optional[Writer] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> Optional[Writer]:
+    global _writer
+    if _writer is None and BACKEND_URL:
+        with _writer_lock:
+            if _writer is None:
+                _writer = Writer(open_backend(BACKEND_URL))
+                atexit.register(_writer.close)  # não perder o que ainda está pendente
+    return _writer
+
+
+# ------------------------------
+# Integração com st.session_state
+# ------------------------------
+def restore(ss: MutableMapping[str, Any], params: MutableMapping[str, str], writer: Optional[Writer] = None) -> bool:
+    """Liga a sessão ao sid da URL (cria um se faltar) e carrega o estado salvo.
+
+    Chamar antes de init_state(), em todo rerun (só age no primeiro). Devolve
+    True se havia estado salvo para o sid.
+    """
+    writer = writer or get_writer()
+    if writer is None or "_sid" in ss:
+        return False
+    sid = params.get(SID_PARAM) or uuid.uuid4().hex
+    ss["_sid"] = sid
+    if params.get(SID_PARAM) != sid:
+        params[SID_PARAM] = sid
+    saved = {**writer.backend.read(sid), **writer.pending(sid)}
+    for k, raw in saved.items():
+        if k in KEYS:
+            ss[k] = decode(k, raw)
+    # O que veio do backend já está lá: só o que mudar a partir daqui é reenviado.
+    ss["_sess_sent"] = dict(saved)
+    return bool(saved)
+
+
+def forget(ss: MutableMapping[str, Any], stop: bool = False, writer: Optional[Writer] = None):
+    """Apaga o estado salvo da sessão (reiniciar, confirmar).
+
+    stop=True para de espelhar até o próximo reinício: depois da confirmação
+    as respostas ficam só em submissions.
+    """
+    writer = writer or get_writer()
+    if writer is None or "_sid" not in ss:
+        return
+    writer.delete(ss["_sid"])
+    ss["_sess_sent"] = {}  # o que for espelhado de novo vai inteiro
+    ss["_sess_off"] = stop
+
+
+def erase_email(email: Any, url: str = BACKEND_URL) -> int:
+    """Apaga as sessões salvas cujas respostas têm esse e-mail (exclusão LGPD)."""
+    key = emails.email_key(email)
+    if key is None:
+        return 0
+    if _writer is not None and url == BACKEND_URL:
+        return _writer.backend.erase(key)  # mesmo processo (inclui o backend "local")
+    backend = open_backend(url)
+    if backend is None:
+        return 0
+    try:
+        return backend.erase(key)
+    finally:
+        backend.close()
+
+
+def changed_keys(ss: Mapping[str, Any], sent: Mapping[str, str], keys: Iterable[str] = KEYS) -> Dict[str, str]:
+    out = {}
+    for k in keys:
+        if k in ss:
+            raw = encode(k, ss[k])
+            if sent.get(k) != raw:
+                out[k] = raw
+    return out
+
+
+def flush(ss: MutableMapping[str, Any], writer: Optional[Writer] = None) -> int:
+    """Fim do rerun: enfileira só as chaves que mudaram desde o último envio."""
+    writer = writer or get_writer()
+    if writer is None or "_sid" not in ss or ss.get("_sess_off"):
+        return 0
+    sent = ss.get("_sess_sent") or {}
+    changed = changed_keys(ss, sent)
+    if changed:
+        writer.put(ss["_sid"], changed)
+        ss["_sess_sent"] = {**sent, **changed}
+    return len(changed)
+
+
+def stats() -> Tuple[int, int, int]:
+    """(lotes gravados, chaves gravadas, erros) do writer deste processo."""
+    w = _writer
+    return (w.batches, w.keys_written, w.errors) if w else (0, 0, 0)
@@ -0,0 +1,403 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from vialeve import emails
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# ------------------------------
+# Armazenamento durável das submissões (SQLite em WAL + group commit)
+# ------------------------------
+# Uma thread escritora drena a fila e grava tudo o que chegou em uma única
+# transação: N confirmações simultâneas custam um fsync, não N. Quem chama
+# submit() espera o commit do seu lote (durável ao retornar).
+#
+# Idempotência: a chave é o id do fluxo (um por questionário, gerado em
+# init_state). Reexecuções do Streamlit com as mesmas respostas não gravam
+# nada; se o paciente voltar, editar e confirmar de novo, a linha é atualizada.
+#
+# email_key (vialeve/emails.py) é gravado junto, no mesmo UPSERT: o índice
+# ix_submissions_email acompanha cada escrita, sem reconstrução em lote.
+#
+# Outbox transacional: com VIALEVE_OUTBOX_URL, toda linha inserida/alterada
+# com consentimento LGPD (answers["lgpd"]) ganha uma entrada na tabela outbox
+# na MESMA transação (vialeve/outbox.py entrega ao sistema da clínica). Ou as
+# duas gravações acontecem, ou nenhuma. Sem o consentimento nada sai para a
+# clínica: a confirmação grava só a submissão, e "Salvar consentimentos" grava
+# de novo o mesmo flow_id, que então entra no outbox. Uma alteração sem o
+# consentimento (revogado) remove as entradas ainda pendentes.
+
+DEFAULT_PATH = os.environ.get("VIALEVE_DB", "vialeve_submissions.db")
+OUTBOX_URL = os.environ.get("VIALEVE_OUTBOX_URL", "")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id          TEXT PRIMARY KEY,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    app_version TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    reason_mask INTEGER NOT NULL,
+    digest      TEXT NOT NULL,
+    answers     TEXT NOT NULL,
+    email_key   TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_submissions_created ON submissions (created_at);
+CREATE INDEX IF NOT EXISTS ix_submissions_status ON submissions (status, created_at);
+CREATE INDEX IF NOT EXISTS ix_submissions_updated ON submissions (updated_at);
+"""
+
+_OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq             INTEGER PRIMARY KEY,
+    submission_id   TEXT NOT NULL,
+    digest          TEXT NOT NULL,
+    created_at      REAL NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until     REAL NOT NULL DEFAULT 0,
+    dead            INTEGER NOT NULL DEFAULT 0,
+    last_error      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (dead, next_attempt_at);
+"""
+
+_OUTBOX_INSERT = "INSERT INTO outbox (submission_id, digest, created_at, next_attempt_at) VALUES (?, ?, ?, ?)"
+_OUTBOX_DROP = "DELETE FROM outbox WHERE submission_id = ?"
+
+# Depois da migração (bancos antigos não têm a coluna). Índice parcial: só linhas com e-mail.
+_EMAIL_INDEX = "CREATE INDEX IF NOT EXISTS ix_submissions_email ON submissions (email_key) WHERE email_key IS NOT NULL"
+
+_UPSERT = """
+INSERT INTO submissions (id, created_at, updated_at, app_version, status, reason_mask, digest, answers, email_key)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    app_version = excluded.app_version,
+    status = excluded.status,
+    reason_mask = excluded.reason_mask,
+    digest = excluded.digest,
+    answers = excluded.answers,
+    email_key = excluded.email_key
+WHERE excluded.digest != submissions.digest
+"""
+
+BLOOM_CAPACITY = 100_000  # mínimo; cresce para 2 × o nº de e-mails no banco
+BLOOM_REFRESH = 5.0  # s entre leituras das linhas novas/alteradas (gravadas por outras réplicas)
+BLOOM_SLACK = 60.0  # s relidos antes do watermark: relógio de outra réplica, lote que commita depois do carimbo
+
+_STOP = object()
+
+
+def canonical_json(answers: Dict[str, Any]) -> str:
+    # Chaves internas da UI ("_abertura_lida" etc.) não fazem parte da submissão.
+    clean = {k: v for k, v in answers.items() if not k.startswith("_")}
+    return json.dumps(clean, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def connect(path: str, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class SubmissionStore:
+    def __init__(self, path: str = DEFAULT_PATH, max_batch: int = 512, max_wait: float = 0.002, outbox: bool = bool(OUTBOX_URL)):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.outbox = outbox
+        self.on_outbox: Optional[Any] = None  # chamado (sem argumentos) após um commit que enfileirou no outbox
+        self.commits = 0
+        self.rows_written = 0
+        self._q: "queue.Queue[Any]" = queue.Queue()
+        self.bloom_negatives = 0
+        self._bloom: Optional[emails.BloomFilter] = None
+        self._bloom_mark = ""  # maior updated_at já lido
+        self._bloom_checked = 0.0
+        self._bloom_loading = False
+        self._bloom_lock = threading.Lock()
+        conn = connect(path)
+        conn.executescript(_SCHEMA)
+        conn.executescript(_OUTBOX_SCHEMA)
+        _migrate(conn)
+        conn.close()
+        self._writer = threading.Thread(target=self._run, name="vialeve-store-writer", daemon=True)
+        self._writer.start()
+
+    # ---- escrita ----
+    def submit_async(
+        self,
+        submission_id: str,
+        answers: Dict[str, Any],
+        status: str,
+        reason_mask: int,
+        app_version: str,
+    ) -> "Future[bool]":
+        body = canonical_json(answers)
+        digest = hashlib.sha256(f"{status}|{reason_mask}|{body}".encode("utf-8")).hexdigest()
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        from concurrent.futures import Future  # adiado: o import (logging etc.) pesa no startup
+
+        key = emails.email_key(answers.get("email"))
+        if key and self._bloom is not None:
+            self._bloom.add(key)
+        fut: "Future[bool]" = Future()
+        row = (submission_id, now, now, app_version, status, int(reason_mask), digest, body, key)
+        self._q.put((row, fut, bool(answers.get("lgpd"))))
+        return fut
+
+    def submit(self, *args, timeout: Optional[float] = 5.0, **kwargs) -> bool:
+        """Grava e espera o commit. True se inseriu/atualizou, False se já existia igual."""
+        return self.submit_async(*args, **kwargs).result(timeout)
+
+    def _drain(self, first) -> Tuple[List[Any], bool]:
+        batch = [first]
+        stop = False
+        try:
+            while len(batch) < self.max_batch:
+                item = self._q.get(timeout=self.max_wait) if len(batch) == 1 else self._q.get_nowait()
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+        except queue.Empty:
+            pass
+        return batch, stop
+
+    def _run(self):
+        conn = connect(self.path)
+        stop = False
+        while not stop:
+            first = self._q.get()
+            if first is _STOP:
+                break
+            batch, stop = self._drain(first)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                changed = []
+                for row, _, _ in batch:
+                    changed.append(conn.execute(_UPSERT, row).rowcount > 0)
+                if self.outbox:
+                    t = time.time()
+                    conn.executemany(_OUTBOX_INSERT, [(row[0], row[6], t, t) for (row, _, lgpd), ok in zip(batch, changed) if ok and lgpd])
+                    conn.executemany(_OUTBOX_DROP, [(row[0],) for (row, _, lgpd), ok in zip(batch, changed) if ok and not lgpd])
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            self.commits += 1
+            self.rows_written += sum(changed)
+            for (_, fut, _), ok in zip(batch, changed):
+                fut.set_result(ok)
+            if self.outbox and self.on_outbox and any(ok and lgpd for (_, _, lgpd), ok in zip(batch, changed)):
+                self.on_outbox()
+        conn.close()
+
+    def close(self):
+        self._q.put(_STOP)
+        self._writer.join()
+
+    # ---- leitura ----
+    def count(self) -> int:
+        conn = connect(self.path, readonly=True)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        finally:
+            conn.close()
+
+    def get(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        conn = connect(self.path, readonly=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM submissions WHERE id = ?", (submission_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        out = dict(row)
+        out["answers"] = json.loads(out["answers"])
+        return out
+
+    # ---- "já vimos este e-mail?" (etapa 0) ----
+    def seen_email(self, email: Any) -> bool:
+        """Bloom em memória responde "não" sem I/O; "talvez" é confirmado no índice."""
+        key = emails.email_key(email)
+        if key is None:
+            return False
+        bloom = self._bloom_current()
+        if bloom is not None and key not in bloom:
+            self.bloom_negatives += 1
+            return False
+        conn = connect(self.path, readonly=True)
+        try:
+            return conn.execute("SELECT 1 FROM submissions WHERE email_key = ? LIMIT 1", (key,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def _bloom_current(self) -> Optional[emails.BloomFilter]:
+        # Carrega em segundo plano no primeiro uso (até lá, só o índice responde)
+        # e, a cada BLOOM_REFRESH s, acrescenta as linhas inseridas ou alteradas
+        # desde o watermark de updated_at (o UPSERT pode trocar o email_key de uma linha).
+        bloom = self._bloom
+        if bloom is None or bloom.full:
+            with self._bloom_lock:
+                if not self._bloom_loading:
+                    self._bloom_loading = True
+                    threading.Thread(target=self._load_bloom, name="vialeve-bloom", daemon=True).start()
+            return bloom
+        t = time.monotonic()
+        if t - self._bloom_checked >= BLOOM_REFRESH and self._bloom_lock.acquire(blocking=False):
+            try:
+                self._bloom_checked = t
+                self._bloom_mark = self._fill_bloom(bloom, self._bloom_mark)
+            except sqlite3.Error:
+                pass
+            finally:
+                self._bloom_lock.release()
+        return bloom
+
+    def _fill_bloom(self, bloom: emails.BloomFilter, mark: str) -> str:
+        start = ""
+        if mark:
+            start = (datetime.fromisoformat(mark) - timedelta(seconds=BLOOM_SLACK)).isoformat(timespec="milliseconds")
+        conn = connect(self.path, readonly=True)
+        try:
+            for updated_at, key in conn.execute(
+                "SELECT updated_at, email_key FROM submissions WHERE updated_at > ? AND email_key IS NOT NULL", (start,)
+            ):
+                bloom.add(key)  # reler uma linha não muda o filtro
+                mark = max(mark, updated_at)
+        finally:
+            conn.close()
+        return mark
+
+    def _load_bloom(self):
+        try:
+            conn = connect(self.path, readonly=True)
+            try:
+                n = conn.execute("SELECT COUNT(*) FROM submissions WHERE email_key IS NOT NULL").fetchone()[0]
+            finally:
+                conn.close()
+            bloom = emails.BloomFilter(max(BLOOM_CAPACITY, 2 * n))
+            mark = self._fill_bloom(bloom, "")
+            with self._bloom_lock:
+                self._bloom, self._bloom_mark, self._bloom_checked = bloom, mark, time.monotonic()
+        except sqlite3.Error:
+            pass
+        finally:
+            self._bloom_loading = False
+
+
+# ------------------------------
+# Índice de e-mail: migração, busca e exclusão (LGPD)
+# ------------------------------
+def _migrate(conn: sqlite3.Connection):
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(submissions)")}
+    if "email_key" not in cols:
+        conn.execute("ALTER TABLE submissions ADD COLUMN email_key TEXT")
+        _backfill(conn)
+    conn.execute(_EMAIL_INDEX)
+
+
+def _backfill(conn: sqlite3.Connection, force: bool = False, batch: int = 5000) -> int:
+    # Em lotes por rowid: transações curtas, o app continua gravando no meio.
+    where = "" if force else "AND email_key IS NULL"
+    last, total = 0, 0
+    while True:
+        rows = conn.execute(
+            f"SELECT rowid, answers FROM submissions WHERE rowid > ? {where} ORDER BY rowid LIMIT ?", (last, batch)
+        ).fetchall()
+        if not rows:
+            return total
+        upd = [(emails.email_key(json.loads(body).get("email")), rowid) for rowid, body in rows]
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("UPDATE submissions SET email_key = ? WHERE rowid = ?", upd)
+        conn.execute("COMMIT")
+        last, total = rows[-1][0], total + len(rows)
+
+
+def reindex_emails(path: str = DEFAULT_PATH, force: bool = False) -> int:
+    """Preenche email_key (force=True recalcula tudo, ex.: depois de trocar o pepper)."""
+    conn = connect(path)
+    try:
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        return _backfill(conn, force=force)
+    finally:
+        conn.close()
+
+
+def find_by_email(email: Any, path: str = DEFAULT_PATH) -> List[Dict[str, Any]]:
+    key = emails.email_key(email)
+    if key is None:
+        return []
+    conn = connect(path, readonly=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            "SELECT id, created_at, updated_at, app_version, status FROM submissions WHERE email_key = ? ORDER BY created_at",
+            (key,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(r) for r in rows]
+
+
+def erase_email(email: Any, path: str = DEFAULT_PATH) -> int:
+    """Apaga todas as submissões de um e-mail (busca pelo índice).
+
+    secure_delete zera o conteúdo das páginas liberadas e o checkpoint tira as
+    cópias antigas do WAL. O filtro de Bloom não esquece: o "talvez" seguinte
+    é resolvido pelo índice, que já não tem a linha.
+    """
+    key = emails.email_key(email)
+    if key is None:
+        return 0
+    conn = connect(path)
+    try:
+        conn.execute("PRAGMA secure_delete=ON")
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outbox'").fetchone():
+            # nada de entregar à clínica o que acabou de ser apagado
+            conn.execute("DELETE FROM outbox WHERE submission_id IN (SELECT id FROM submissions WHERE email_key = ?)", (key,))
+        n = conn.execute("DELETE FROM submissions WHERE email_key = ?", (key,)).rowcount
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return n
+
+
+_store: Optional[SubmissionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store(path: Optional[str] = None) -> SubmissionStore:
+    # Uma instância por processo: todas as sessões Streamlit dividem a mesma fila.
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SubmissionStore(path or DEFAULT_PATH)
+                if _store.outbox:
+                    from vialeve import outbox  # entrega em segundo plano (asyncio), só se configurada
+
+                    outbox.start_for(_store)
+    return _store
@@ -0,0 +1,294 @@
+import hashlib
+import html
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from vialeve import metrics, questionnaire, rules, store
+
+# ------------------------------
+# Resumo do paciente (documento para imprimir / salvar em PDF)
+# ------------------------------
+# O documento (HTML autocontido com CSS de impressão) é montado num pool de
+# threads, fora do rerun: a tela pede o resumo pela chave (sha256 das
+# respostas + status + máscara + versão) e recebe os bytes se já estiverem
+# prontos, ou None enquanto o trabalho roda. Os prontos ficam num cache LRU
+# do processo; reruns com as mesmas respostas (e outros pacientes idênticos)
+# não montam nada de novo. Pedidos repetidos de uma chave ainda em andamento
+# reaproveitam o mesmo trabalho.
+#
+# Os consentimentos ficam fora da chave e do documento em cache: a confirmação
+# já pede o resumo (consentimentos ainda não marcados) e o download, depois do
+# form de consentimento, acha o mesmo documento. A tabela de consentimentos
+# (4 linhas) é acrescentada a cada pedido.
+#
+#   VIALEVE_SUMMARY_CACHE=256     documentos guardados (LRU)
+#   VIALEVE_SUMMARY_WORKERS=2     threads de geração
+#   VIALEVE_REVIEW_CACHE=1024     blocos de revisão (markdown da tela) guardados (LRU)
+
+CACHE_SIZE = int(os.environ.get("VIALEVE_SUMMARY_CACHE", "256"))
+WORKERS = int(os.environ.get("VIALEVE_SUMMARY_WORKERS", "2"))
+REVIEW_CACHE_SIZE = int(os.environ.get("VIALEVE_REVIEW_CACHE", "1024"))
+
+# Revisão da etapa final: (seção, ((rótulo, campo, tipo), ...)).
+#   text: valor como veio   yn: Sim/Não   label: rótulo do formulário   list: itens ou "—"
+#   opt: só se preenchido   sub: só se preenchido, como subitem da linha anterior
+REVIEW: Tuple[Tuple[str, Tuple[Tuple[str, str, str], ...]], ...] = (
+    ("Sobre você", (
+        ("Nome", "nome", "text"), ("E-mail", "email", "text"),
+        ("Data de nascimento", "data_nascimento", "text"), ("Identidade", "identidade", "text"),
+    )),
+    ("Sua saúde", (
+        ("Peso (kg)", "peso", "text"), ("Altura (m)", "altura", "text"),
+        ("Comorbidades relevantes", "tem_comorbidades", "yn"), ("Quais", "comorbidades", "sub"),
+    )),
+    ("Condições importantes", (
+        ("Grávida", "gravidez", "yn"), ("Amamentando", "amamentando", "yn"),
+        ("Tratamento oncológico", "tratamento_cancer", "yn"), ("Doença GI grave ativa", "gi_grave", "yn"),
+        ("Gastroparesia", "gastroparesia", "yn"), ("Pancreatite prévia", "pancreatite_previa", "yn"),
+        ("MTC/MEN2 (pessoal/família)", "historico_mtc_men2", "yn"),
+        ("Colecistite/cólica vesicular 12m", "colecistite_12m", "yn"), ("Outras", "outras_contra", "sub"),
+    )),
+    ("Medicações & alergias", (
+        ("Rins", "insuf_renal", "label"), ("Fígado", "insuf_hepatica", "label"),
+        ("Transtorno alimentar ativo", "transtorno_alimentar", "yn"), ("Corticoide crônico", "uso_corticoide", "yn"),
+        ("Antipsicóticos", "antipsicoticos", "yn"), ("Alergia GLP-1", "alergia_glp1", "yn"),
+        ("Alergia a componentes", "alergias_componentes", "list"), ("Outras alergias", "outros_componentes", "sub"),
+    )),
+    ("Histórico & objetivo", (
+        ("Uso prévio de medicação", "usou_antes", "yn"), ("Quais", "quais", "list"),
+        ("Efeitos colaterais", "efeitos", "opt"), ("Objetivo", "objetivo", "text"),
+        ("Pronto(a) para mudanças (0–10)", "pronto_mudar", "text"),
+    )),
+)
+
+CONSENTS = (
+    ("aceite_termo", "Termo de Consentimento"), ("autoriza_teleconsulta", "Consulta on-line (telemedicina)"),
+    ("lgpd", "Uso dos dados (LGPD)"), ("veracidade", "Veracidade das informações"),
+)
+
+STATUS_TEXT = {
+    rules.STATUS_ELEGIVEL: "Potencialmente elegível ao tratamento farmacológico",
+    rules.STATUS_EXCLUIDO: "Avaliação individual necessária antes de definir a medicação",
+}
+
+
+def review_rows(a: Dict[str, Any], version: str = rules.DEFAULT_VERSION) -> List[Tuple[str, List[Tuple[bool, str, str]]]]:
+    """Linhas da revisão por seção: (subitem?, rótulo, valor)."""
+    fields = questionnaire.compile_form(version).fields
+    out = []
+    for title, items in REVIEW:
+        rows = []
+        for label, key, kind in items:
+            v = a.get(key, "")
+            if kind in ("opt", "sub"):
+                if v:
+                    rows.append((kind == "sub", label, str(v)))
+                continue
+            if kind == "yn":
+                v = "Sim" if a.get(key, "nao") == "sim" else "Não"
+            elif kind == "label":
+                v = fields[key].display(v) if key in fields else v
+            elif kind == "list":
+                v = ", ".join(v or []) or "—"
+            rows.append((False, label, str(v)))
+        out.append((title, rows))
+    return out
+
+
+# ------------------------------
+# Revisão na tela: um bloco de markdown só
+# ------------------------------
+# A etapa "Revisar & confirmar" manda a revisão inteira num único elemento
+# (uma mensagem no websocket, não uma por linha). O texto sai de review_rows
+# e fica num LRU do processo, com a chave feita dos valores crus (Answers.raw)
+# dos campos da revisão — como rules.evaluate: reruns da etapa final (e
+# respostas iguais de outras sessões) não remontam nada.
+REVIEW_FIELDS = tuple(dict.fromkeys(k for _, items in REVIEW for _, k, _ in items))
+
+_review_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_review_lock = threading.Lock()
+
+
+def _md(v: str) -> str:
+    # Texto livre numa linha de lista: quebras de linha desmontariam o bloco.
+    return " ".join(v.split())
+
+
+def _review_markdown(a: Dict[str, Any], version: str) -> str:
+    parts = []
+    for title, rows in review_rows(a, version):
+        parts.append(f"**{title}**\n\n" + "\n".join(f"{'  ' if sub else ''}- {label}: {_md(value)}" for sub, label, value in rows))
+    return "\n\n".join(parts)
+
+
+def review_markdown(a: Dict[str, Any], version: str = rules.DEFAULT_VERSION) -> str:
+    raw = getattr(a, "raw", None)  # Answers: valores codificados, sem decodificar
+    key = (version, raw is not None, *(tuple(v) if isinstance(v, list) else v for v in map(raw or a.get, REVIEW_FIELDS)))
+    try:
+        with _review_lock:
+            md = _review_cache.get(key)
+            if md is not None:
+                _review_cache.move_to_end(key)
+                return md
+    except TypeError:  # valor não hashable: monta sem cache
+        return _review_markdown(a, version)
+    md = _review_markdown(a, version)
+    with _review_lock:
+        _review_cache[key] = md
+        if len(_review_cache) > REVIEW_CACHE_SIZE:
+            _review_cache.popitem(last=False)
+    return md
+
+
+_CSS = """
+body{font-family:system-ui,-apple-system,"Segoe UI",Roboto,sans-serif;color:#1b1b1b;max-width:46rem;margin:2rem auto;padding:0 1rem;line-height:1.45}
+h1{font-size:1.4rem;margin:0}h2{font-size:1.05rem;border-bottom:1px solid #ccc;padding-bottom:.2rem;margin-top:1.4rem}
+.meta{color:#666;font-size:.85rem}.status{padding:.6rem .8rem;border-radius:.4rem;background:#eef6ee;margin:1rem 0}
+.status.excluido{background:#fff5e6}table{border-collapse:collapse;width:100%}td{padding:.15rem .4rem;vertical-align:top}
+td:first-child{width:45%;color:#444}tr.sub td:first-child{padding-left:1.4rem}
+@media print{body{margin:0;max-width:none}.noprint{display:none}h2{break-after:avoid}table{break-inside:avoid}}
+"""
+
+
+def render_body(a: Dict[str, Any], status: Optional[str], mask: int, version: str, generated_at: Optional[datetime] = None) -> bytes:
+    """Documento até antes dos consentimentos (UTF-8). `a` é um retrato das respostas: não é lido de novo pela sessão."""
+    e = html.escape
+    ts = (generated_at or datetime.now(timezone.utc)).strftime("%d/%m/%Y %H:%M UTC")
+    ev = rules.evaluate(a, version)
+    idade, imc = ev.idade, ev.imc
+    parts = [
+        "<!doctype html><html lang='pt-BR'><head><meta charset='utf-8'>",
+        f"<title>ViaLeve — Resumo de {e(str(a.get('nome', '')))}</title><style>{_CSS}</style></head><body>",
+        "<h1>ViaLeve — Resumo da pré-triagem</h1>",
+        f"<p class='meta'>Gerado em {ts} • questionário {e(version)} • este documento não substitui a consulta médica</p>",
+        f"<p class='noprint'><button onclick='window.print()'>Imprimir / salvar em PDF</button></p>",
+    ]
+    if status:
+        parts.append(f"<div class='status {e(status)}'><strong>{e(STATUS_TEXT.get(status, status))}</strong>")
+        reasons = rules.reasons_from_mask(mask, version)
+        if reasons:
+            parts.append("<ul>" + "".join(f"<li>{e(r)}</li>" for r in reasons) + "</ul>")
+        parts.append("</div>")
+    parts.append("<h2>Indicadores</h2><table>")
+    parts.append(f"<tr><td>Idade</td><td>{idade if idade is not None else '—'}</td></tr>")
+    parts.append(f"<tr><td>IMC</td><td>{f'{imc:.1f} kg/m²' if imc else '—'}</td></tr></table>")
+    for title, rows in review_rows(a, version):
+        parts.append(f"<h2>{e(title)}</h2><table>")
+        parts += [f"<tr{' class=sub' if sub else ''}><td>{e(label)}</td><td>{e(value)}</td></tr>" for sub, label, value in rows]
+        parts.append("</table>")
+    return "".join(parts).encode("utf-8")
+
+
+def consents_html(a: Dict[str, Any]) -> bytes:
+    rows = "".join(f"<tr><td>{html.escape(label)}</td><td>{'Sim' if a.get(k) else 'Não'}</td></tr>" for k, label in CONSENTS)
+    return f"<h2>Consentimentos</h2><table>{rows}</table></body></html>".encode("utf-8")
+
+
+def render_html(a: Dict[str, Any], status: Optional[str], mask: int, version: str, generated_at: Optional[datetime] = None,
+                consents: Optional[Dict[str, Any]] = None) -> bytes:
+    """Documento completo; consentimentos de `consents` (padrão: das próprias respostas)."""
+    return render_body(a, status, mask, version, generated_at) + consents_html(a if consents is None else consents)
+
+
+def summary_key(a: Dict[str, Any], status: Optional[str], mask: int, version: str) -> str:
+    return hashlib.sha256(f"{version}|{status}|{int(mask)}|{store.canonical_json(a)}".encode("utf-8")).hexdigest()
+
+
+# ------------------------------
+# Pool de geração + cache LRU
+# ------------------------------
+class SummaryCache:
+    def __init__(self, capacity: int = CACHE_SIZE, workers: int = WORKERS):
+        self.capacity, self.workers = max(1, capacity), max(1, workers)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._done: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pending: Dict[str, Any] = {}  # chave -> Future
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def request(self, key: str, fn, *args) -> Optional[bytes]:
+        """Bytes prontos da chave, ou None (e agenda fn(*args) se ninguém estiver gerando)."""
+        with self._lock:
+            doc = self._done.get(key)
+            if doc is not None:
+                self._done.move_to_end(key)
+                self.hits += 1
+                return doc
+            if key in self._pending:
+                return None
+            self.misses += 1
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor  # adiado: só quem chega à revisão paga o import
+
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="vialeve-summary")
+            fut = self._pending[key] = self._pool.submit(fn, *args)
+        fut.add_done_callback(lambda f, key=key: self._finish(key, f))
+        return None
+
+    def _finish(self, key: str, fut):
+        with self._lock:
+            self._pending.pop(key, None)
+            if fut.exception() is not None:
+                self.errors += 1  # o próximo pedido tenta de novo
+                return
+            self._done[key] = fut.result()
+            while len(self._done) > self.capacity:
+                self._done.popitem(last=False)
+                self.evictions += 1
+
+    def wait(self, key: str, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Espera uma geração em andamento (CLI/testes; o app não usa)."""
+        with self._lock:
+            fut = self._pending.get(key)
+        if fut is not None:
+            try:
+                fut.result(timeout)
+            except Exception:
+                pass
+        with self._lock:
+            return self._done.get(key)
+
+    def metric_lines(self) -> List[str]:
+        with self._lock:
+            size, pending = len(self._done), len(self._pending)
+        out = ["# TYPE vialeve_summary_cache_size gauge", f"vialeve_summary_cache_size {size}",
+               "# TYPE vialeve_summary_pending gauge", f"vialeve_summary_pending {pending}"]
+        for k, v in (("hits", self.hits), ("misses", self.misses), ("evictions", self.evictions), ("errors", self.errors)):
+            out += [f"# TYPE vialeve_summary_{k}_total counter", f"vialeve_summary_{k}_total {v}"]
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_cache: Optional[SummaryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SummaryCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SummaryCache()
+                metrics.register(_cache.metric_lines)
+    return _cache
+
+
+_CONSENT_KEYS = frozenset(k for k, _ in CONSENTS)
+
+
+def request(answers: Dict[str, Any], status: Optional[str], mask: int, version: str) -> Tuple[str, Optional[bytes]]:
+    """(chave, documento ou None). Não bloqueia: chame de novo num rerun seguinte."""
+    # retrato (a sessão continua mudando), sem os consentimentos
+    snap = {k: v for k, v in answers.items() if not k.startswith("_") and k not in _CONSENT_KEYS}
+    key = summary_key(snap, status, mask, version)
+    body = get_cache().request(key, render_body, snap, status, int(mask), version)
+    return key, None if body is None else body + consents_html(answers)